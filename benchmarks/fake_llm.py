@@ -0,0 +1,74 @@
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import AIMessage
+
+from integuru.util.LLM import LLMSingleton
+from integuru.util.synthetic_har import ACTION_PATH, TOKEN_PATTERN
+
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+_ACTION_URL_RE = re.compile(r"https?://[^'\"\s]*" + re.escape(ACTION_PATH) + r"[^'\"\s]*")
+_INDEXED_CURL_RE = re.compile(r"^\s*\[(\d+)\] (curl .*)$", re.MULTILINE)
+
+
+class FakeChatModel:
+    """
+    Deterministic stand-in for the chat model, for synthetic captures.
+
+    Function calls are answered from the prompt alone: the action URL is the one
+    under ACTION_PATH and the dynamic parts are the syn_ tokens in the cURL.
+    Code generation returns a short placeholder function. latency adds a fixed
+    delay to every call to model a remote API.
+    """
+
+    model_name = "fake"
+    temperature = 1
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _arguments(self, name: str, prompt: str) -> Dict[str, Any]:
+        if name == "identify_end_url":
+            match = _ACTION_URL_RE.search(prompt)
+            return {"url": match.group(0) if match else ""}
+        if name == "identify_dynamic_parts":
+            return {"dynamic_parts": sorted(set(_TOKEN_RE.findall(prompt)))}
+        if name == "identify_dynamic_parts_batch":
+            return {
+                "results": [
+                    {"curl_index": int(index), "dynamic_parts": sorted(set(_TOKEN_RE.findall(curl)))}
+                    for index, curl in _INDEXED_CURL_RE.findall(prompt)
+                ]
+            }
+        if name == "get_simplest_curl_index":
+            return {"index": 0}
+        if name == "identify_input_variables":
+            return {"identified_variables": []}
+        raise ValueError(f"Unexpected function call {name!r}")
+
+    def invoke(self, prompt: Any, functions: Optional[list] = None, function_call: Optional[dict] = None, **kwargs: Any) -> AIMessage:
+        name = (function_call or {}).get("name", "codegen")
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if name == "codegen":
+            return AIMessage(content="def request(params, cookie_string):\n    return {}\n")
+
+        arguments = self._arguments(name, str(prompt))
+        return AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": json.dumps(arguments)}})
+
+
+def install_fake_llm(fake_model: FakeChatModel) -> None:
+    """
+    Makes every LLMSingleton accessor return the fake model.
+    """
+    LLMSingleton._instance = fake_model
+    LLMSingleton.get_instance = classmethod(lambda cls, model=None: fake_model)
+    LLMSingleton.switch_to_alternate_model = classmethod(lambda cls: fake_model)
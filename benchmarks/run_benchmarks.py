@@ -0,0 +1,216 @@
+"""
+Scaling benchmark for the analysis pipeline.
+
+Generates synthetic captures of increasing size and runs build_graph and the
+LangGraph analysis on each of them against a deterministic fake LLM. Every size
+runs in its own subprocess so that peak memory is measured per run.
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --output bench.json
+"""
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import click
+
+from integuru.util.synthetic_har import SyntheticHarConfig, generate_capture
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_pipeline(capture: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the analysis on one capture and returns its timings. Meant to run in a fresh process.
+    """
+    from benchmarks.fake_llm import FakeChatModel, install_fake_llm
+    from integuru.graph_builder import build_graph
+
+    fake_model = FakeChatModel(latency=options["latency"])
+    install_fake_llm(fake_model)
+    baseline_rss = peak_rss_mb()
+    stages: Dict[str, float] = defaultdict(float)
+    stage_counts: Dict[str, int] = defaultdict(int)
+
+    start = time.perf_counter()
+    graph, agent = build_graph(
+        capture["prompt"],
+        har_file_path=capture["har_path"],
+        cookie_path=capture["cookie_path"],
+        to_generate_code=options["generate_code"],
+        analysis_concurrency=options["analysis_concurrency"],
+        dynamic_parts_batch_size=options["dynamic_parts_batch_size"],
+        dynamic_parts_mode=options["dynamic_parts_mode"],
+        spill_threshold=options["spill_threshold"],
+    )
+    stages["build_graph"] = time.perf_counter() - start
+    stage_counts["build_graph"] = 1
+
+    async def analyze() -> None:
+        last = time.perf_counter()
+        event_stream = graph.astream(
+            {
+                "master_node": None,
+                "in_process_nodes": [],
+                "to_be_processed_nodes": [],
+                "in_process_nodes_dynamic_parts": {},
+                "action_url": "",
+                "input_variables": {},
+            },
+            {"recursion_limit": options["max_steps"]},
+        )
+        async for event in event_stream:
+            now = time.perf_counter()
+            for node_name in event:
+                stages[node_name] += now - last
+                stage_counts[node_name] += 1
+            last = now
+
+    analysis_start = time.perf_counter()
+    asyncio.run(analyze())
+    end = time.perf_counter()
+    stages["analysis"] = end - analysis_start
+
+    dag = agent.dag_manager.graph
+    resolved_urls = {
+        attributes["content"]["key"].url
+        for _, attributes in dag.nodes(data=True)
+        if attributes.get("node_type") in ("curl", "master_curl")
+    }
+
+    return {
+        "stages": dict(stages),
+        "stage_counts": dict(stage_counts),
+        "total_seconds": end - start,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "dag_nodes": dag.number_of_nodes(),
+        "dag_edges": dag.number_of_edges(),
+        "llm_calls": dict(fake_model.calls),
+        "resolved_chain": all(url in resolved_urls for url in capture["chain_urls"] + [capture["action_url"]]),
+    }
+
+
+def run_in_subprocess(capture: Dict[str, Any], options: Dict[str, Any], workdir: str) -> Dict[str, Any]:
+    """
+    Runs run_pipeline in a child process, from workdir since the pipeline writes its outputs to the CWD.
+    """
+    repository_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [repository_root, environment.get("PYTHONPATH")]))
+
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run_benchmarks", "--worker", json.dumps({"capture": capture, "options": options})],
+        cwd=workdir,
+        env=environment,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark worker failed:\n{completed.stderr[-4000:]}")
+    # The pipeline prints the DAG, so the result is the last line of stdout
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@click.command()
+@click.option("--sizes", multiple=True, type=int, default=DEFAULT_SIZES, help="Entry counts to benchmark (default is 1000 10000 100000)")
+@click.option("--body-size", default=1024, type=int, help="Approximate size of response bodies in bytes (default is 1024)")
+@click.option("--chain-length", default=5, type=int, help="Number of requests in the token dependency chain (default is 5)")
+@click.option("--cookies", default=20, type=int, help="Number of cookies in the cookie file (default is 20)")
+@click.option("--third-party-ratio", default=0.5, type=float, help="Share of noise going to analytics and CDN hosts (default is 0.5)")
+@click.option("--seed", default=0, type=int, help="Seed for the synthetic captures (default is 0)")
+@click.option("--latency", default=0.0, type=float, help="Seconds the fake LLM waits per call (default is 0)")
+@click.option("--analysis-concurrency", default=8, type=int, help="Passed to build_graph (default is 8)")
+@click.option("--dynamic-parts-batch-size", default=1, type=int, help="Passed to build_graph (default is 1)")
+@click.option("--dynamic-parts-mode", default="llm", type=click.Choice(["llm", "hybrid", "heuristic"]), help="Passed to build_graph (default is llm)")
+@click.option("--spill-threshold", default=None, type=int, help="Passed to build_graph (disabled by default)")
+@click.option("--generate-code", is_flag=True, default=False, help="Also run code generation")
+@click.option("--workdir", default=None, help="Directory for captures and outputs (default is a temporary directory)")
+@click.option("--output", default="benchmark_results.json", help="Where to write the JSON results (default is ./benchmark_results.json)")
+@click.option("--worker", default=None, hidden=True)
+def main(
+    sizes, body_size, chain_length, cookies, third_party_ratio, seed, latency,
+    analysis_concurrency, dynamic_parts_batch_size, dynamic_parts_mode, spill_threshold,
+    generate_code, workdir, output, worker,
+):
+    if worker:
+        job = json.loads(worker)
+        result = run_pipeline(job["capture"], job["options"])
+        print(json.dumps(result))
+        return
+
+    options = {
+        "latency": latency,
+        "analysis_concurrency": analysis_concurrency,
+        "dynamic_parts_batch_size": dynamic_parts_batch_size,
+        "dynamic_parts_mode": dynamic_parts_mode,
+        "spill_threshold": spill_threshold,
+        "generate_code": generate_code,
+        "max_steps": 4 * chain_length + 20,
+    }
+
+    workdir = workdir or tempfile.mkdtemp(prefix="integuru-bench-")
+    results: List[Dict[str, Any]] = []
+    for size in sizes:
+        config = SyntheticHarConfig(
+            entries=size,
+            body_size=body_size,
+            chain_length=chain_length,
+            cookies=cookies,
+            third_party_ratio=third_party_ratio,
+            seed=seed,
+        )
+        capture_dir = os.path.join(workdir, f"capture_{size}")
+        start = time.perf_counter()
+        capture = generate_capture(capture_dir, config)._asdict()
+        generation_seconds = time.perf_counter() - start
+
+        print(f"Benchmarking {size} entries ({os.path.getsize(capture['har_path']) / (1024 * 1024):.1f} MiB)", flush=True)
+        result = run_in_subprocess(capture, options, capture_dir)
+        result.update(
+            {
+                "entries": size,
+                "har_bytes": os.path.getsize(capture["har_path"]),
+                "generation_seconds": generation_seconds,
+                "config": config._asdict(),
+            }
+        )
+        results.append(result)
+
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result["stages"].items())
+        print(
+            f"  total {result['total_seconds']:.2f}s, peak {result['peak_rss_mb']:.0f} MiB, "
+            f"chain resolved: {result['resolved_chain']}\n  {stages}",
+            flush=True,
+        )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "results": results,
+    }
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,21 @@ import time  # Add this import
 
 load_dotenv()
 
-from integuru.main import call_agent
+from integuru.main import call_agent, generate_code_from_graph
+from integuru.runtime import run
+from integuru.util.LLM import llm
+from integuru.util.tracing import tracer
 import asyncio
 import click
 
 if __name__ == "__main__":
 
-    @click.command()
+    @click.group(invoke_without_command=True)
+    @click.pass_context
     @click.option(
         "--model", default="gpt-4o", help="The LLM model to use (default is gpt-4o)"
     )
-    @click.option("--prompt", required=True, help="The prompt for the model")
+    @click.option("--prompt", default=None, help="The prompt for the model")
     @click.option(
         "--har-path",
         default="./network_requests.har",
@@ -39,20 +43,219 @@ if __name__ == "__main__":
         default=False,
         help="Whether to generate the full integration code",
     )
+    @click.option(
+        "--analysis-concurrency",
+        default=8,
+        type=int,
+        help="Max number of frontier nodes to analyze at once (default is 8)",
+    )
+    @click.option(
+        "--dynamic-parts-batch-size",
+        default=1,
+        type=int,
+        help="Number of cURLs sent per dynamic part identification call (default is 1)",
+    )
+    @click.option(
+        "--dynamic-parts-mode",
+        default="llm",
+        type=click.Choice(["llm", "hybrid", "heuristic"]),
+        help="Identify dynamic parts with the LLM, a local classifier, or the classifier with LLM fallback (default is llm)",
+    )
+    @click.option(
+        "--codegen-concurrency",
+        default=4,
+        type=int,
+        help="Max number of nodes to generate code for at once (default is 4)",
+    )
+    @click.option(
+        "--url-shortlist-size",
+        default=50,
+        type=int,
+        help="Number of best matching URLs sent to the LLM to find the action URL, 0 sends all (default is 50)",
+    )
+    @click.option(
+        "--spill-threshold",
+        default=None,
+        type=int,
+        help="Keep response bodies of at least this many bytes on disk instead of in memory (disabled by default)",
+    )
+    @click.option(
+        "--substring-scan",
+        default="miss",
+        type=click.Choice(["miss", "always", "never"]),
+        help="When to scan response bodies for values inside larger tokens: when the token index finds nothing, on every lookup, or never (default is miss)",
+    )
+    @click.option(
+        "--llm-base-url",
+        default=None,
+        help="Base URL of an OpenAI-compatible API (default is $OPENAI_BASE_URL or the OpenAI API)",
+    )
+    @click.option(
+        "--llm-timeout",
+        default=600.0,
+        type=float,
+        help="Seconds before an LLM request times out (default is 600)",
+    )
+    @click.option(
+        "--llm-max-connections",
+        default=64,
+        type=int,
+        help="Size of the shared HTTP connection pool for LLM requests (default is 64)",
+    )
+    @click.option(
+        "--llm-rpm",
+        default=None,
+        type=float,
+        help="Maximum LLM requests per minute (unlimited by default)",
+    )
+    @click.option(
+        "--llm-tpm",
+        default=None,
+        type=float,
+        help="Maximum LLM tokens per minute, estimated before each call (unlimited by default)",
+    )
+    @click.option(
+        "--llm-max-concurrency",
+        default=None,
+        type=int,
+        help="Maximum number of LLM requests in flight (unlimited by default)",
+    )
+    @click.option(
+        "--llm-max-retries",
+        default=5,
+        type=int,
+        help="Retries with jittered exponential backoff for rate limited (429) and failed (5xx) LLM requests (default is 5)",
+    )
+    @click.option(
+        "--llm-cache",
+        default=None,
+        help="Path of an on-disk cache for LLM responses (disabled by default)",
+    )
+    @click.option(
+        "--llm-cache-ttl",
+        default=None,
+        type=float,
+        help="Seconds after which cached LLM responses expire",
+    )
+    @click.option(
+        "--llm-cache-max-entries",
+        default=None,
+        type=int,
+        help="Evict least recently used LLM responses beyond this many entries",
+    )
+    @click.option(
+        "--llm-cache-max-bytes",
+        default=None,
+        type=int,
+        help="Evict least recently used LLM responses beyond this many bytes",
+    )
+    @click.option(
+        "--llm-cache-read-only",
+        is_flag=True,
+        default=False,
+        help="Read from the LLM cache without storing new responses",
+    )
+    @click.option(
+        "--trace-file",
+        default=None,
+        help="Write a Chrome trace-event JSON file of pipeline stages and LLM calls",
+    )
+    @click.option(
+        "--metrics-file",
+        default=None,
+        help="Append one JSON line per pipeline stage and LLM call to this file",
+    )
+    @click.option(
+        "--output-dir",
+        default=".",
+        help="Directory for generated_code.py and dag_visualization.png (default is the current directory)",
+    )
+    @click.option(
+        "--har-cache",
+        default=None,
+        help="Directory of prebuilt HAR indexes, built on first use and rebuilt when the HAR changes",
+    )
+    @click.option(
+        "--checkpoint",
+        default=None,
+        help="Save the analysis state to this file after every step",
+    )
+    @click.option(
+        "--resume",
+        default=None,
+        help="Resume the analysis from a checkpoint file",
+    )
+    @click.option(
+        "--from-graph",
+        default=None,
+        help="Only generate code for the DAG saved in a checkpoint file",
+    )
     def cli(
-        model, prompt, har_path, cookie_path, max_steps, input_variables, generate_code
+        ctx, model, prompt, har_path, cookie_path, max_steps, input_variables, generate_code,
+        analysis_concurrency, dynamic_parts_batch_size, dynamic_parts_mode, codegen_concurrency, url_shortlist_size, spill_threshold,
+        substring_scan, llm_base_url, llm_timeout, llm_max_connections, llm_rpm, llm_tpm, llm_max_concurrency, llm_max_retries, llm_cache, llm_cache_ttl, llm_cache_max_entries, llm_cache_max_bytes, llm_cache_read_only,
+        trace_file, metrics_file, output_dir, har_cache, checkpoint, resume, from_graph,
     ):
+        """
+        Analyzes a HAR capture and generates integration code, or runs an execution plan with `run`.
+        """
+        if ctx.invoked_subcommand is not None:
+            return
+        if prompt is None and not (resume or from_graph):
+            raise click.UsageError("Missing option '--prompt'.")
+
         input_vars = dict(input_variables)
-        asyncio.run(
-            call_agent(
-                model,
-                prompt,
-                har_path,
-                cookie_path,
-                input_variables=input_vars,
-                max_steps=max_steps,
-                to_generate_code=generate_code,
-            )
+        llm.configure_backend(base_url=llm_base_url, timeout=llm_timeout, max_connections=llm_max_connections)
+        llm.configure_scheduler(
+            requests_per_minute=llm_rpm,
+            tokens_per_minute=llm_tpm,
+            max_concurrency=llm_max_concurrency,
+            max_retries=llm_max_retries,
         )
+        if llm_cache:
+            llm.configure_cache(
+                llm_cache,
+                ttl=llm_cache_ttl,
+                max_entries=llm_cache_max_entries,
+                max_bytes=llm_cache_max_bytes,
+                read_only=llm_cache_read_only,
+            )
+
+        if trace_file or metrics_file:
+            tracer.configure(trace_file=trace_file, metrics_file=metrics_file)
+
+        try:
+            if from_graph:
+                generate_code_from_graph(
+                    model, from_graph, codegen_concurrency=codegen_concurrency, output_dir=output_dir, har_file_path=har_path
+                )
+                return
+
+            asyncio.run(
+                call_agent(
+                    model,
+                    prompt,
+                    har_path,
+                    cookie_path,
+                    input_variables=input_vars,
+                    max_steps=max_steps,
+                    to_generate_code=generate_code,
+                    codegen_concurrency=codegen_concurrency,
+                    analysis_concurrency=analysis_concurrency,
+                    dynamic_parts_batch_size=dynamic_parts_batch_size,
+                    dynamic_parts_mode=dynamic_parts_mode,
+                    spill_threshold=spill_threshold,
+                    url_shortlist_size=url_shortlist_size,
+                    checkpoint_path=checkpoint,
+                    resume_from=resume,
+                    har_cache_dir=har_cache,
+                    output_dir=output_dir,
+                    substring_scan=substring_scan,
+                )
+            )
+        finally:
+            # Write the trace even when the run fails, that is when it is most useful
+            tracer.close()
 
+    cli.add_command(run)
     cli()
@@ -1,40 +1,103 @@
+import asyncio
 import json
-import urllib
 import os
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Set
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
+
+from openai import APIError
 
 from integuru.util.LLM import llm
 from integuru.models.DAGManager import DAGManager
 from integuru.util.har_processing import *
+from integuru.util.value_index import ValueIndex
+from integuru.util.cookie_store import CookieKey, CookieStore
+from integuru.util.response_store import ResponseStore
+from integuru.util.har_index import HarIndex
+from integuru.util.dynamic_value_classifier import DynamicValueClassifier
+from integuru.util.request_ranking import get_tied_requests, rank_requests
+from integuru.util.url_ranking import UrlRanker
+from integuru.util.url_clustering import UrlClusterIndex, related_response_texts
 from integuru.models.request import Request
 from integuru.models.agent_state import AgentState
 
 class IntegrationAgent:
     ACTION_URL_KEY: str = "action_url"
-    IN_PROCESS_NODE_KEY: str = "in_process_node"
+    IN_PROCESS_NODES_KEY: str = "in_process_nodes"
     TO_BE_PROCESSED_NODES_KEY: str = "to_be_processed_nodes"
-    IN_PROCESS_NODE_DYNAMIC_PARTS_KEY: str = "in_process_node_dynamic_parts"
+    IN_PROCESS_NODES_DYNAMIC_PARTS_KEY: str = "in_process_nodes_dynamic_parts"
     MASTER_NODE_KEY: str = "master_node"
     INPUT_VARIABLES_KEY: str = "input_variables"
+    DYNAMIC_PARTS_MODES: Tuple[str, ...] = ("llm", "hybrid", "heuristic")
 
     def __init__(
         self,
         prompt: str,
         har_file_path: str,
         cookie_path: str,
+        max_concurrency: int = 8,
+        dynamic_parts_batch_size: int = 1,
+        dynamic_parts_mode: str = "llm",
+        ranking_top_k: int = 5,
+        spill_threshold: Optional[int] = None,
+        url_shortlist_size: int = 50,
+        har_cache_dir: Optional[str] = None,
+        substring_scan: str = "miss",
     ):  
+        if dynamic_parts_mode not in self.DYNAMIC_PARTS_MODES:
+            raise ValueError(f"dynamic_parts_mode must be one of {self.DYNAMIC_PARTS_MODES}, got {dynamic_parts_mode!r}")
         self.prompt: str = prompt
+        self.har_file_path: str = har_file_path
+        self.max_concurrency: int = max_concurrency
+        self.dynamic_parts_batch_size: int = dynamic_parts_batch_size
+        self.dynamic_parts_mode: str = dynamic_parts_mode
+        self.ranking_top_k: int = ranking_top_k
+        self.url_shortlist_size: int = url_shortlist_size
         self.duplicate_part_set: Set[str] = set()
         self.global_master_node: Optional[str] = None
-        self.req_to_res_map: Dict[Request, str] = parse_har_file(har_file_path)
-        self.url_to_res_req_dict: Dict[str, Dict[str, Any]] = build_url_to_req_res_map(self.req_to_res_map)
-        self.har_urls: List[Tuple[str, str, str, str]] = get_har_urls(har_file_path)
-        self.cookie_dict: Dict[str, Dict[str, Any]] = parse_cookie_file_to_dict(cookie_path)
-        self.curl_to_id_dict: Dict[str, str] = {}
-        self.cookie_to_id_dict: Dict[str, str] = {}
+        self.response_store: Optional[ResponseStore] = None
+        if spill_threshold is not None:
+            self.response_store = ResponseStore(spill_threshold=spill_threshold)
+        self.har_index: Optional[HarIndex] = None
+        if har_cache_dir is not None:
+            # Bodies stay in the index's blob, so spill_threshold does not apply
+            self.har_index = HarIndex.open(har_file_path, cache_dir=har_cache_dir)
+            har_data = self.har_index.load()
+        else:
+            har_data = load_har(har_file_path, response_store=self.response_store)
+        self.req_to_res_map: Dict[Request, str] = har_data.req_to_res_map
+        self.url_to_res_req_dict: Dict[str, Dict[str, Any]] = har_data.url_to_req_res_map
+        self.har_urls: List[Tuple[str, str, str, str]] = har_data.har_urls
+        self.url_clusters: UrlClusterIndex = UrlClusterIndex(self.har_urls)
+        self.url_ranker: UrlRanker = UrlRanker(self.url_clusters.prompt_entries())
+        self.value_index: ValueIndex = ValueIndex(
+            self.req_to_res_map,
+            postings=self.har_index.postings if self.har_index is not None else None,
+            substring_scan=substring_scan,
+        )
+        self.cookie_store: CookieStore = CookieStore.from_file(cookie_path)
+        self.value_classifier: Optional[DynamicValueClassifier] = None
+        if dynamic_parts_mode != "llm":
+            self.value_classifier = DynamicValueClassifier(
+                self.value_index,
+                session_values=self.cookie_store.session_values(),
+            )
+        self.curl_to_id_dict: Dict[Request, str] = {}
+        self.cookie_to_id_dict: Dict[CookieKey, str] = {}
         self.dag_manager: DAGManager = DAGManager()
 
+    async def _run_concurrently(self, function: Callable[..., Any], items: List[Any], *args: Any) -> List[Any]:
+        """
+        Runs function(item, *args) for every item (usually a node id) on worker threads,
+        at most max_concurrency at a time, and returns the results in item order
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def run(item: Any) -> Any:
+            async with semaphore:
+                return await asyncio.to_thread(function, item, *args)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
     def end_url_identify_agent(self, state: AgentState) -> AgentState:
         """
         Identify the URL responsible for a specific action
@@ -54,35 +117,66 @@ class IntegrationAgent:
             }
         }
 
-        prompt = f"""
-        {self.har_urls}
+        # Repeated calls to a URL template are sent once, with their count and samples. Only the
+        # templates that best match the prompt are sent; the shortlist doubles until
+        # the model finds the action
+        cluster_entries = self.url_ranker.har_urls
+        total = len(cluster_entries)
+        k = self.url_shortlist_size if self.url_shortlist_size and self.url_shortlist_size > 0 else total
+        while True:
+            k = min(k, total)
+            is_partial = k < total
+            candidate_urls = self.url_ranker.shortlist(self.prompt, k) if is_partial else cluster_entries
+
+            prompt = f"""
+        {candidate_urls}
         Task:
         Given the above list of URLs, request types, and response formats, find the URL responsible for the action below:
         {self.prompt}
+        """
+            if is_partial:
+                prompt += """
+        If none of the URLs above is responsible for the action, return an empty string as the URL.
         """
 
-        response = llm.get_instance().invoke(
-            prompt,
-            functions=[function_def],
-            function_call={"name": "identify_end_url"}
-        )
-        
-        function_call = response.additional_kwargs['function_call']
-        end_url = json.loads(function_call['arguments'])['url']
+            response = llm.get_instance().invoke(
+                prompt,
+                functions=[function_def],
+                function_call={"name": "identify_end_url"}
+            )
+            
+            function_call = response.additional_kwargs['function_call']
+            end_url = json.loads(function_call['arguments'])['url']
+            # The model may answer with a template rather than one of its calls
+            end_url = self.url_clusters.resolve(end_url) or end_url
+
+            if not is_partial or (end_url and end_url in self.url_to_res_req_dict):
+                break
+            print(f"No action URL among the top {k} of {total} URLs, widening the shortlist", flush=True)
+            k *= 2
 
         state[self.ACTION_URL_KEY] = end_url
         return state
 
-    def input_variables_identifying_agent(self, state: AgentState) -> AgentState:
+    async def input_variables_identifying_agent(self, state: AgentState) -> AgentState:
         """
-        Identify input variables present in the cURL command
+        Identify input variables present in the cURL commands of the in-process nodes
         """
-        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
-        curl = self.dag_manager.graph.nodes[in_process_node_id]["content"]["key"].to_curl_command()
         input_variables = state[self.INPUT_VARIABLES_KEY]
         if not input_variables:
             return state
-        
+
+        await self._run_concurrently(
+            self.identify_input_variables, state[self.IN_PROCESS_NODES_KEY], input_variables
+        )
+        return state
+
+    def identify_input_variables(self, in_process_node_id: str, input_variables: Dict[str, str]) -> None:
+        """
+        Identify input variables present in the cURL command
+        """
+        curl = self.dag_manager.get_node(in_process_node_id)["content"]["key"].to_curl_command()
+
         function_def = {
             "name": "identify_input_variables",
             "description": "Identify input variables present in the cURL command.",
@@ -139,27 +233,181 @@ class IntegrationAgent:
             # Convert the identified_variables format
             converted_variables = {item['variable_name']: item['variable_value'] for item in identified_variables}
             
-            current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
-            updated_dynamic_parts = [part for part in current_dynamic_parts if part not in converted_variables.values()]
-            self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts, input_variables=converted_variables)
+            with self.dag_manager.lock:
+                current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
+                updated_dynamic_parts = [part for part in current_dynamic_parts if part not in converted_variables.values()]
+                self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts, input_variables=converted_variables)
+
+    async def dynamic_part_identifying_agent(self, state: AgentState) -> AgentState:
+        """
+        Identify dynamic parts present in the cURL commands of every node waiting to be processed.
+        The nodes of one frontier do not depend on each other, so they are processed concurrently.
+        """
+        in_process_node_ids = state[self.TO_BE_PROCESSED_NODES_KEY][::-1]
+        state[self.TO_BE_PROCESSED_NODES_KEY] = []
+        input_variables = state[self.INPUT_VARIABLES_KEY]
 
+        if self.dynamic_parts_batch_size > 1:
+            batches = [
+                in_process_node_ids[i:i + self.dynamic_parts_batch_size]
+                for i in range(0, len(in_process_node_ids), self.dynamic_parts_batch_size)
+            ]
+            dynamic_parts_by_node = {}
+            for batch_result in await self._run_concurrently(
+                self.identify_dynamic_parts_batch, batches, input_variables
+            ):
+                dynamic_parts_by_node.update(batch_result)
+        else:
+            dynamic_parts_list = await self._run_concurrently(
+                self.identify_dynamic_parts, in_process_node_ids, input_variables
+            )
+            dynamic_parts_by_node = dict(zip(in_process_node_ids, dynamic_parts_list))
+
+        state[self.IN_PROCESS_NODES_KEY] = in_process_node_ids
+        state[self.IN_PROCESS_NODES_DYNAMIC_PARTS_KEY] = {
+            node_id: dynamic_parts_by_node[node_id] for node_id in in_process_node_ids
+        }
         return state
 
-    def dynamic_part_identifying_agent(self, state: AgentState) -> AgentState:
+    def identify_dynamic_parts_batch(self, in_process_node_ids: List[str], input_variables: Dict[str, str]) -> Dict[str, List[str]]:
         """
-        Identify dynamic parts present in the cURL command
+        Identify dynamic parts of several cURL commands with a single LLM call.
+        Items the model does not answer properly fall back to one call per cURL.
         """
-        in_process_node_id = state[self.TO_BE_PROCESSED_NODES_KEY].pop()
-        request = self.dag_manager.graph.nodes[in_process_node_id]["content"]["key"]
+        curls = {}
+        dynamic_parts_by_node = {}
+        for node_id in in_process_node_ids:
+            request = self.dag_manager.get_node(node_id)["content"]["key"]
+            curl = request.to_minified_curl_command()
+            if curl.endswith(".js'"):
+                dynamic_parts_by_node[node_id] = self.identify_dynamic_parts(node_id, input_variables)
+                continue
+            local_dynamic_parts = self._classify_dynamic_parts(request, curl)
+            if local_dynamic_parts is not None:
+                dynamic_parts_by_node[node_id] = self._record_dynamic_parts(
+                    node_id, curl, local_dynamic_parts, input_variables
+                )
+            else:
+                curls[node_id] = curl
+
+        # The classifier has already passed on the remaining cURLs
+        if len(curls) <= 1:
+            for node_id in curls:
+                dynamic_parts_by_node[node_id] = self.identify_dynamic_parts(node_id, input_variables, classify=False)
+            return dynamic_parts_by_node
+
+        node_ids = list(curls)
+
+        function_def = {
+            "name": "identify_dynamic_parts_batch",
+            "description": (
+                "Given the above cURL commands, identify for each one which parts are dynamic and validated by the server "
+                "for correctness (e.g., IDs, tokens, session variables). Exclude any parameters that represent "
+                "arbitrary user input or general data that can be hardcoded (e.g., amounts, notes, messages)."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "curl_index": {
+                                    "type": "integer",
+                                    "description": "The 0-based index of the cURL command in the list",
+                                },
+                                "dynamic_parts": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": (
+                                        "List of dynamic parts identified in the cURL command. Do not include duplicates. "
+                                        "Only strictly include the dynamic values (not the keys or any not extra part in front and after the value) of parts that are unique to a user or session "
+                                        "and, if incorrect, will cause the request to fail."
+                                        "Do not include the keys, only the values."
+                                    ),
+                                },
+                            },
+                            "required": ["curl_index", "dynamic_parts"],
+                        },
+                        "description": "One result per cURL command in the list.",
+                    }
+                },
+                "required": ["results"],
+            },
+        }
+
+        curl_list = "\n".join(f"[{index}] {curls[node_id]}" for index, node_id in enumerate(node_ids))
+
+        prompt = f"""
+        URLs:
+        {curl_list}
+
+        Task:
+
+        For each cURL command above, use your best judgment to identify which parts are dynamic, specific to a user or session, and are checked by the server for validity. These include tokens, IDs, session variables, or any other values that are unique to a user or session and, if incorrect, will cause the request to fail.
+
+        Important:
+            - Return exactly one result per cURL command, using its index from the list.
+            - IGNORE THE COOKIE HEADER
+            - Ignore common headers like user-agent, sec-ch-ua, accept-encoding, referer, etc.
+            - Exclude parameters that represent arbitrary user input or general data that can be hardcoded, such as amounts, notes, messages, actions, etc.
+            - Only output the variable values and not the keys.
+            - Only include dynamic parts that are unique identifiers, tokens, or session variables.
+
+        """
+
+        results = []
+        try:
+            response = llm.get_instance().invoke(
+                prompt,
+                functions=[function_def],
+                function_call={"name": "identify_dynamic_parts_batch"}
+            )
+            function_call = response.additional_kwargs['function_call']
+            results = json.loads(function_call['arguments'])['results']
+        except (KeyError, TypeError, json.JSONDecodeError, APIError) as e:
+            # APIError covers a batch too long for the context window and errors left after the scheduler's retries
+            print(f"Batched dynamic part identification failed, falling back to single calls: {e}", flush=True)
+
+        answered = {}
+        for result in results if isinstance(results, list) else []:
+            if not isinstance(result, dict):
+                continue
+            index = result.get("curl_index")
+            dynamic_parts = result.get("dynamic_parts")
+            if (
+                isinstance(index, int)
+                and 0 <= index < len(node_ids)
+                and isinstance(dynamic_parts, list)
+                and all(isinstance(part, str) for part in dynamic_parts)
+            ):
+                answered.setdefault(node_ids[index], dynamic_parts)
+
+        for node_id in node_ids:
+            if node_id in answered:
+                dynamic_parts_by_node[node_id] = self._record_dynamic_parts(
+                    node_id, curls[node_id], answered[node_id], input_variables
+                )
+            else:
+                dynamic_parts_by_node[node_id] = self.identify_dynamic_parts(node_id, input_variables, classify=False)
+
+        return dynamic_parts_by_node
+
+    def identify_dynamic_parts(self, in_process_node_id: str, input_variables: Dict[str, str], classify: bool = True) -> List[str]:
+        """
+        Identify dynamic parts present in the cURL command. With classify=False
+        the local classifier, which has already passed on the cURL, is skipped.
+        """
+        request = self.dag_manager.get_node(in_process_node_id)["content"]["key"]
         curl = request.to_minified_curl_command()
         if curl.endswith(".js'"):
             self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
-            state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = [] 
-            state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
-            return state
-        
+            return []
 
-        input_variables = state[self.INPUT_VARIABLES_KEY]            
+        local_dynamic_parts = self._classify_dynamic_parts(request, curl) if classify else None
+        if local_dynamic_parts is not None:
+            return self._record_dynamic_parts(in_process_node_id, curl, local_dynamic_parts, input_variables)
 
         function_def = {
             "name": "identify_dynamic_parts",
@@ -211,45 +459,92 @@ class IntegrationAgent:
         function_call = response.additional_kwargs['function_call']
         dynamic_parts = json.loads(function_call['arguments'])['dynamic_parts']
 
+        return self._record_dynamic_parts(in_process_node_id, curl, dynamic_parts, input_variables)
+
+    def _classify_dynamic_parts(self, request: Request, curl: str) -> Optional[List[str]]:
+        """
+        Returns the dynamic parts found by the local classifier, or None if the LLM should decide.
+        In hybrid mode only requests without ambiguous values are decided locally.
+        """
+        if self.value_classifier is None:
+            return None
+
+        if self.dynamic_parts_mode == "heuristic":
+            dynamic_parts = self.value_classifier.guess_dynamic_values(request)
+        else:
+            classification = self.value_classifier.classify(request)
+            if not classification.confident:
+                return None
+            dynamic_parts = classification.dynamic_values
+
+        return [part for part in dynamic_parts if part in curl]
+
+    def _record_dynamic_parts(
+        self,
+        in_process_node_id: str,
+        curl: str,
+        dynamic_parts: List[str],
+        input_variables: Dict[str, str],
+    ) -> List[str]:
+        """
+        Store the dynamic parts on the node and move input variables out of them
+        """
         self.dag_manager.update_node(in_process_node_id, dynamic_parts=dynamic_parts)
 
-        # to detect if input_variables are in the request
-        present_variables = [variable for variable in input_variables if variable in curl]
+        # to detect if input_variables are in the request, recorded by name like identify_input_variables does
+        present_variables = {name: value for name, value in input_variables.items() if value and value in curl}
         if present_variables:
-            for variable in present_variables:
-                if variable in dynamic_parts:
-                    dynamic_parts.remove(variable)
+            for value in present_variables.values():
+                if value in dynamic_parts:
+                    dynamic_parts.remove(value)
             self.dag_manager.update_node(in_process_node_id, input_variables=present_variables)
 
-
-        state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = dynamic_parts
-        state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
-        return state
+        return dynamic_parts
 
     def url_to_curl(self, state: AgentState) -> AgentState:
         """
         Identify the master cURL command responsible for the action
         """
         request = self.url_to_res_req_dict[state["action_url"]]["request"]
-        curl = request.to_curl_command()
-        if curl in self.curl_to_id_dict:
-            master_node_id = self.curl_to_id_dict[curl]
-        else:
-            master_node_id = self.dag_manager.add_node(
-                node_type="master_curl",  # Specify node type
-                content={
-                    "key": request,
-                    "value": self.req_to_res_map[request]
-                },
-                dynamic_parts=["None"],
-                extracted_parts=["None"]
-            )
-            self.curl_to_id_dict[curl] = master_node_id
+        with self.dag_manager.lock:
+            if request in self.curl_to_id_dict:
+                master_node_id = self.curl_to_id_dict[request]
+            else:
+                master_node_id = self.dag_manager.add_node(
+                    node_type="master_curl",  # Specify node type
+                    content={
+                        "key": request,
+                        "value": self.req_to_res_map[request]
+                    },
+                    dynamic_parts=["None"],
+                    extracted_parts=["None"]
+                )
+                self.curl_to_id_dict[request] = master_node_id
         state[self.MASTER_NODE_KEY] = master_node_id
         state[self.TO_BE_PROCESSED_NODES_KEY].append(master_node_id)
         self.global_master_node_id = master_node_id
         return state
 
+    def select_simplest_request(self, request_list: List[Request]) -> Tuple[Request, str]:
+        """
+        Rank the candidate requests locally and only ask the LLM to break a tie among the top few.
+        Returns the chosen request and how it was chosen ("ranked" or "llm_tie_break").
+        """
+        ranked = rank_requests(request_list, self.req_to_res_map, self.value_index.positions)
+        tied_requests = get_tied_requests(ranked, self.ranking_top_k)
+        if len(tied_requests) > 1:
+            return self.get_simplest_request(tied_requests), "llm_tie_break"
+        return ranked[0][1], "ranked"
+
+    def _record_selection(self, in_process_node_id: str, search_string: str, method: str, candidates: int) -> None:
+        """
+        Record on the node how the source of one of its dynamic parts was chosen
+        """
+        with self.dag_manager.lock:
+            selections = dict(self.dag_manager.get_node(in_process_node_id).get("candidate_selection") or {})
+            selections[search_string] = {"method": method, "candidates": candidates}
+            self.dag_manager.update_node(in_process_node_id, candidate_selection=selections)
+
     def get_simplest_request(self, request_list: List[Request]) -> Request:
         """
         Find the index of the simplest cURL command from a list
@@ -291,124 +586,141 @@ class IntegrationAgent:
         simplest_curl = request_list[simplest_curl_index]
         return simplest_curl
 
-    def find_curl_from_content(self, state: AgentState) -> AgentState:
+    async def find_curl_from_content(self, state: AgentState) -> AgentState:
         """
-        Find the cURL command that contains the dynamic parts
+        Find the cURL commands that contain the dynamic parts of every in-process node
         """
-        search_string_list = state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY]
-        search_string_list_leftovers = search_string_list.copy()
+        in_process_node_ids = state[self.IN_PROCESS_NODES_KEY]
+        dynamic_parts_by_node = state[self.IN_PROCESS_NODES_DYNAMIC_PARTS_KEY]
 
-        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
+        new_nodes_list = await self._run_concurrently(
+            lambda node_id: self.find_curls_for_node(node_id, dynamic_parts_by_node.get(node_id, [])),
+            in_process_node_ids,
+        )
+
+        for new_nodes in new_nodes_list:
+            state[self.TO_BE_PROCESSED_NODES_KEY].extend(new_nodes)
+        state[self.IN_PROCESS_NODES_DYNAMIC_PARTS_KEY] = {}
+        return state
+
+    def find_curls_for_node(self, in_process_node_id: str, search_string_list: List[str]) -> List[str]:
+        """
+        Find the cURL command that contains the dynamic parts and return the ids of the new nodes to process
+        """
+        search_string_list_leftovers = search_string_list.copy()
         new_to_be_processed_nodes = []
 
-        # Handle cookies
+        # Handle cookies, preferring the ones this request would actually send
+        request_url = self.dag_manager.get_node(in_process_node_id)["content"]["key"].url
         for search_string in search_string_list_leftovers[:]:
-            cookie_key = self.find_key_by_string_in_value(
-                self.cookie_dict, search_string
-            )
+            cookie_key = self.cookie_store.find(search_string, request_url)
             if cookie_key:
                 search_string_list_leftovers.remove(search_string)
-                if cookie_key in self.cookie_to_id_dict:
-                    cookie_node_id = self.cookie_to_id_dict[cookie_key]
-                else:
-                    cookie_node_id = self.dag_manager.add_node(
-                        node_type="cookie",  # Specify node type
-                        content={
-                            "key": cookie_key,
-                            "value": search_string
-                        }, 
-                        extracted_parts=[search_string]
-                    )
-                    self.cookie_to_id_dict[cookie_key] = cookie_node_id
-                    #dont need to add node to to_be_processed_nodes because cookies dont need further processing
-                self.dag_manager.add_edge(in_process_node_id, cookie_node_id)
+                self._record_selection(in_process_node_id, search_string, "cookie", 1)
+                with self.dag_manager.lock:
+                    if cookie_key in self.cookie_to_id_dict:
+                        cookie_node_id = self.cookie_to_id_dict[cookie_key]
+                    else:
+                        cookie_node_id = self.dag_manager.add_node(
+                            node_type="cookie",  # Specify node type
+                            content={
+                                "key": cookie_key[0],
+                                "value": search_string,
+                                "domain": cookie_key[1],
+                                "path": cookie_key[2],
+                            }, 
+                            extracted_parts=[search_string]
+                        )
+                        self.cookie_to_id_dict[cookie_key] = cookie_node_id
+                        #dont need to add node to to_be_processed_nodes because cookies dont need further processing
+                    self.dag_manager.add_edge(in_process_node_id, cookie_node_id)
 
         # Handle curls
         if search_string_list_leftovers:
             for search_string in search_string_list_leftovers[:]:
+                search_string_lower = search_string.lower()
                 requests_with_search_string = []
-
-                for request, response in self.req_to_res_map.items():
-                    curl = str(request)
-                    if (
-                        (
-                            isinstance(curl, str)
-                            and search_string.lower() in response["text"].lower()
-                        )
-                        and (search_string.lower() not in curl.lower())
-                    ) or (
-                        urllib.parse.unquote(search_string) in curl
-                        and (urllib.parse.unquote(search_string) not in curl)
-                    ):
+                seen_calls = set()
+                for request in self.value_index.find_requests(search_string):
+                    if search_string_lower in str(request).lower():
+                        continue
+                    # Keep only the earliest call of each URL template and body, e.g. one of many polling
+                    # calls; calls with other bodies (GraphQL, RPC endpoints) stay separate candidates
+                    call = (self.url_clusters.template(request.method, request.url), request.fingerprint[3])
+                    if call not in seen_calls:
+                        seen_calls.add(call)
                         requests_with_search_string.append(request)
                 simplest_request = ""
 
                 # Get simplest curl to reduce number of dependencies
                 if len(requests_with_search_string) > 1:
-                    simplest_request = self.get_simplest_request(requests_with_search_string)
+                    simplest_request, selection_method = self.select_simplest_request(requests_with_search_string)
+                    self._record_selection(in_process_node_id, search_string, selection_method, len(requests_with_search_string))
                 elif len(requests_with_search_string) == 1:
                     simplest_request = requests_with_search_string[0]
+                    self._record_selection(in_process_node_id, search_string, "single", 1)
                 else:
                     print(f"Could not find curl with search string: {search_string} in response")
-                    not_found_node_id = self.dag_manager.add_node(
-                        node_type="not found",
-                        content={
-                            "key": search_string
-                        },
-                    )
-                    self.dag_manager.add_edge(in_process_node_id, not_found_node_id)
+                    self._record_selection(in_process_node_id, search_string, "not_found", 0)
+                    with self.dag_manager.lock:
+                        not_found_node_id = self.dag_manager.add_node(
+                            node_type="not found",
+                            content={
+                                "key": search_string
+                            },
+                        )
+                        self.dag_manager.add_edge(in_process_node_id, not_found_node_id)
                     search_string_list_leftovers.remove(search_string)
 
                     continue
         
                         
                 if simplest_request.url.endswith(".js") or "text/html" in self.req_to_res_map[simplest_request]["type"]:
-                    current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
-                    updated_dynamic_parts = [part for part in current_dynamic_parts if part != search_string]
-                    self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts)
+                    with self.dag_manager.lock:
+                        current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
+                        updated_dynamic_parts = [part for part in current_dynamic_parts if part != search_string]
+                        self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts)
                     search_string_list_leftovers.remove(search_string)
                     continue    
                 
       
 
+                with self.dag_manager.lock:
+                    if simplest_request not in self.curl_to_id_dict:
+                        if simplest_request.url.endswith(".js"):
+                            self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
+                            continue    
 
-                if simplest_request not in self.curl_to_id_dict:
-                    if simplest_request.url.endswith(".js"):
-                        self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
-                        continue    
-
-                    curl_node_id = self.dag_manager.add_node(
-                        node_type="curl",  # Specify node type
-                    content={
-                        "key": simplest_request,
-                        "value": self.req_to_res_map[simplest_request]
-                    },
-                    extracted_parts=[search_string]
-                    )
-                    self.curl_to_id_dict[simplest_request] = curl_node_id
-                    new_to_be_processed_nodes.append(curl_node_id)
-                else:
-                    # append new extracted part to existing curl node
-                    curl_node_id = self.curl_to_id_dict[simplest_request]
-                    node = self.dag_manager.get_node(curl_node_id)
-                    new_extracted_parts = node.get("extracted_parts", [])
-                    new_extracted_parts.append(search_string)
-                    # Remove duplicates from new_extracted_parts
-                    new_extracted_parts = list(dict.fromkeys(new_extracted_parts))
-
-                    self.dag_manager.update_node(curl_node_id, extracted_parts=new_extracted_parts)
-
-                self.dag_manager.add_edge(in_process_node_id, curl_node_id)
+                        curl_node_id = self.dag_manager.add_node(
+                            node_type="curl",  # Specify node type
+                        content={
+                            "key": simplest_request,
+                            "value": self.req_to_res_map[simplest_request]
+                        },
+                        extracted_parts=[search_string]
+                        )
+                        self.curl_to_id_dict[simplest_request] = curl_node_id
+                        new_to_be_processed_nodes.append(curl_node_id)
+                    else:
+                        # append new extracted part to existing curl node
+                        curl_node_id = self.curl_to_id_dict[simplest_request]
+                        node = self.dag_manager.get_node(curl_node_id)
+                        new_extracted_parts = node.get("extracted_parts", [])
+                        new_extracted_parts.append(search_string)
+                        # Remove duplicates from new_extracted_parts
+                        new_extracted_parts = list(dict.fromkeys(new_extracted_parts))
+
+                        self.dag_manager.update_node(curl_node_id, extracted_parts=new_extracted_parts)
+
+                    self.dag_manager.add_edge(in_process_node_id, curl_node_id)
                 
-        state[self.TO_BE_PROCESSED_NODES_KEY].extend(new_to_be_processed_nodes)
-        state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = []
-        return state
+        return new_to_be_processed_nodes
 
-    @staticmethod
-    def find_key_by_string_in_value(dictionary: Dict[str, Dict[str, Any]], search_string: str) -> Optional[str]:
-        for key, value in dictionary.items():
-            if search_string in value.get("value", ""):
-                return key
-        return None
+    def related_response_texts(self, request: Request, limit: int = 5) -> List[str]:
+        """
+        Returns the bodies of up to limit other captured calls to the request's URL
+        template, used to check that generated extractors are not tied to one response.
+        """
+        return related_response_texts(self.url_clusters, self.req_to_res_map, self.url_to_res_req_dict, request, limit)
     
 
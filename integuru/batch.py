@@ -0,0 +1,252 @@
+"""
+Runs Integuru over many captures on a process pool.
+
+The manifest is a JSON list of jobs (or {"defaults": {...}, "jobs": [...]}, or
+one job per line in a .jsonl file):
+
+    [
+        {"name": "acme", "har_path": "acme/network_requests.har", "cookie_path": "acme/cookies.json",
+         "prompt": "download the latest invoice", "input_variables": {"year": "2024"}},
+        {"har_path": "globex.har", "prompt": "list all orders", "generate_code": true}
+    ]
+
+Relative paths are resolved against the manifest's directory. Each job writes its
+generated code, DAG image, checkpoint and log to <output-dir>/<name>/, and a
+summary of every job is written to <output-dir>/summary.json. Jobs share the
+HAR indexes (see integuru.util.har_index) and the LLM response cache in the
+output directory.
+
+    python -m integuru.batch manifest.json --output-dir runs --workers 4
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import click
+from dotenv import load_dotenv
+
+from integuru.main import call_agent
+from integuru.util.LLM import llm
+
+JOB_FIELDS = ("name", "har_path", "cookie_path", "prompt", "input_variables", "model", "max_steps", "generate_code")
+
+
+class BatchJob(NamedTuple):
+    name: str
+    har_path: str
+    cookie_path: str
+    prompt: str
+    input_variables: Dict[str, str]
+    model: str
+    max_steps: int
+    generate_code: bool
+
+
+def load_manifest(path: str, defaults: Optional[Dict[str, Any]] = None) -> List[BatchJob]:
+    """
+    Reads the jobs of a manifest. Fields missing from a job come from the manifest's
+    "defaults", then from defaults. Job names are made unique.
+    """
+    with open(path, "r") as file:
+        if path.endswith(".jsonl"):
+            manifest: Any = [json.loads(line) for line in file if line.strip()]
+        else:
+            manifest = json.load(file)
+
+    if isinstance(manifest, dict):
+        entries = manifest.get("jobs", [])
+        defaults = {**(defaults or {}), **manifest.get("defaults", {})}
+    else:
+        entries = manifest
+    defaults = {"cookie_path": "cookies.json", "input_variables": {}, **(defaults or {})}
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs: List[BatchJob] = []
+    names = set()
+    for index, entry in enumerate(entries):
+        unknown = set(entry) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Job {index} in {path} has unknown fields: {sorted(unknown)}")
+        fields = {**defaults, **entry}
+        for required in ("har_path", "prompt"):
+            if not fields.get(required):
+                raise ValueError(f"Job {index} in {path} is missing {required!r}")
+
+        name = fields.get("name") or os.path.splitext(os.path.basename(fields["har_path"]))[0]
+        unique_name, suffix = name, 2
+        while unique_name in names:
+            unique_name, suffix = f"{name}-{suffix}", suffix + 1
+        names.add(unique_name)
+
+        jobs.append(
+            BatchJob(
+                name=unique_name,
+                har_path=os.path.join(base_dir, fields["har_path"]),
+                cookie_path=os.path.join(base_dir, fields["cookie_path"]),
+                prompt=fields["prompt"],
+                input_variables=dict(fields["input_variables"]),
+                model=fields["model"],
+                max_steps=int(fields["max_steps"]),
+                generate_code=bool(fields["generate_code"]),
+            )
+        )
+    return jobs
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    load_dotenv()
+    llm.configure_backend(base_url=options["llm_base_url"], timeout=options["llm_timeout"])
+    if options["llm_cache"]:
+        llm.configure_cache(options["llm_cache"])
+
+
+def run_job(job: BatchJob, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one job in the current process, logging to <output_dir>/<name>/run.log, and returns its summary.
+    """
+    job_dir = os.path.join(options["output_dir"], job.name)
+    os.makedirs(job_dir, exist_ok=True)
+    # Limits in the manifest options are for the whole batch, split evenly across workers
+    llm.configure_scheduler(
+        requests_per_minute=options["llm_rpm"] / options["workers"] if options["llm_rpm"] else None,
+        tokens_per_minute=options["llm_tpm"] / options["workers"] if options["llm_tpm"] else None,
+        max_concurrency=options["llm_max_concurrency"],
+    )
+    cache = llm.get_cache()
+    cache_before = cache.stats() if cache is not None else None
+
+    status, error = "ok", None
+    start = time.perf_counter()
+    with open(os.path.join(job_dir, "run.log"), "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            asyncio.run(
+                call_agent(
+                    job.model,
+                    job.prompt,
+                    job.har_path,
+                    job.cookie_path,
+                    input_variables=job.input_variables,
+                    max_steps=job.max_steps,
+                    to_generate_code=job.generate_code,
+                    codegen_concurrency=options["codegen_concurrency"],
+                    analysis_concurrency=options["analysis_concurrency"],
+                    dynamic_parts_mode=options["dynamic_parts_mode"],
+                    checkpoint_path=os.path.join(job_dir, "checkpoint.pkl.gz"),
+                    har_cache_dir=options["har_cache"],
+                    output_dir=job_dir,
+                )
+            )
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+
+    summary: Dict[str, Any] = {
+        "name": job.name,
+        "status": status,
+        "error": error,
+        "seconds": round(time.perf_counter() - start, 3),
+        "output_dir": job_dir,
+        "outputs": sorted(os.listdir(job_dir)),
+        "worker_pid": os.getpid(),
+        "llm": llm.get_scheduler().stats(),
+    }
+    if cache is not None:
+        cache_after = cache.stats()
+        summary["llm_cache"] = {key: cache_after[key] - cache_before[key] for key in ("hits", "misses", "coalesced")}
+    return summary
+
+
+def run_batch(jobs: List[BatchJob], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the jobs on options["workers"] processes and writes <output_dir>/summary.json.
+    """
+    os.makedirs(options["output_dir"], exist_ok=True)
+    started_at = time.time()
+    start = time.perf_counter()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker, initargs=(options,)) as executor:
+        futures = {executor.submit(run_job, job, options): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. out of memory); the job's log may be incomplete
+                result = {"name": job.name, "status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": None}
+            results[job.name] = result
+            print(f"[{done}/{len(jobs)}] {job.name}: {result['status']} ({result['seconds']}s)"
+                  + (f" {result['error']}" if result["error"] else ""), flush=True)
+
+    summary = {
+        "started_at": started_at,
+        "seconds": round(time.perf_counter() - start, 3),
+        "workers": options["workers"],
+        "succeeded": sum(result["status"] == "ok" for result in results.values()),
+        "failed": sum(result["status"] != "ok" for result in results.values()),
+        # Keep manifest order rather than completion order
+        "jobs": [results[job.name] for job in jobs],
+    }
+    with open(os.path.join(options["output_dir"], "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+@click.command()
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output-dir", default="./batch_output", help="Directory for the job outputs and summary.json (default is ./batch_output)")
+@click.option("--workers", default=4, type=int, help="Number of jobs to run at once, one process each (default is 4)")
+@click.option("--model", default="gpt-4o", help="The LLM model for jobs that do not set one (default is gpt-4o)")
+@click.option("--max_steps", default=20, type=int, help="The max_steps for jobs that do not set one (default is 20)")
+@click.option("--generate-code", is_flag=True, default=False, help="Generate code for jobs that do not set generate_code")
+@click.option("--analysis-concurrency", default=8, type=int, help="Analysis concurrency within each job (default is 8)")
+@click.option("--codegen-concurrency", default=4, type=int, help="Code generation concurrency within each job (default is 4)")
+@click.option(
+    "--dynamic-parts-mode",
+    default="llm",
+    type=click.Choice(["llm", "hybrid", "heuristic"]),
+    help="How dynamic parts are identified (default is llm)",
+)
+@click.option("--llm-base-url", default=None, help="Base URL of an OpenAI-compatible API")
+@click.option("--llm-timeout", default=600.0, type=float, help="Seconds before an LLM request times out (default is 600)")
+@click.option("--llm-rpm", default=None, type=float, help="Maximum LLM requests per minute across all workers")
+@click.option("--llm-tpm", default=None, type=float, help="Maximum LLM tokens per minute across all workers")
+@click.option("--llm-max-concurrency", default=None, type=int, help="Maximum LLM requests in flight per worker")
+@click.option("--llm-cache", default=None, help="LLM response cache shared by the jobs (default is <output-dir>/llm_cache.sqlite)")
+@click.option("--har-cache", default=None, help="Directory of HAR indexes shared by the jobs (default is <output-dir>/har_cache)")
+def main(manifest, output_dir, workers, model, max_steps, generate_code, analysis_concurrency, codegen_concurrency,
+         dynamic_parts_mode, llm_base_url, llm_timeout, llm_rpm, llm_tpm, llm_max_concurrency, llm_cache, har_cache):
+    output_dir = os.path.abspath(output_dir)
+    jobs = load_manifest(manifest, {"model": model, "max_steps": max_steps, "generate_code": generate_code})
+    options = {
+        "output_dir": output_dir,
+        "workers": max(1, min(workers, len(jobs) or 1)),
+        "analysis_concurrency": analysis_concurrency,
+        "codegen_concurrency": codegen_concurrency,
+        "dynamic_parts_mode": dynamic_parts_mode,
+        "llm_base_url": llm_base_url,
+        "llm_timeout": llm_timeout,
+        "llm_rpm": llm_rpm,
+        "llm_tpm": llm_tpm,
+        "llm_max_concurrency": llm_max_concurrency,
+        "llm_cache": os.path.abspath(llm_cache or os.path.join(output_dir, "llm_cache.sqlite")),
+        "har_cache": os.path.abspath(har_cache or os.path.join(output_dir, "har_cache")),
+    }
+
+    summary = run_batch(jobs, options)
+    print(
+        f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['seconds']}s; "
+        f"summary in {os.path.join(output_dir, 'summary.json')}",
+        flush=True,
+    )
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
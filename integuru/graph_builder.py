@@ -1,50 +1,111 @@
+import os
 from langgraph.graph import END, StateGraph
 from integuru.models.agent_state import AgentState
 from integuru.agent import IntegrationAgent
 from functools import partial  # To pass extra arguments to functions
 from integuru.util.print import print_dag, visualize_dag, print_dag_in_reverse
+from integuru.util.checkpoint import save_checkpoint
+from integuru.util.tracing import traced, tracer
 
-def check_end_condition(state, agent, to_generate_code):
+def finish_analysis(agent, to_generate_code, codegen_concurrency=4, output_dir="."):
+    with tracer.span("finishAnalysis", dag_nodes=agent.dag_manager.graph.number_of_nodes()):
+        print_dag(agent.dag_manager.graph, agent.global_master_node_id)
+        visualize_dag(agent.dag_manager.graph, os.path.join(output_dir, "dag_visualization.png"))
+        print("------------------------Successfully analyzed!!!-------------------------------", flush=True)
+        print_dag_in_reverse(
+            agent.dag_manager.graph,
+            to_generate_code=to_generate_code,
+            codegen_concurrency=codegen_concurrency,
+            output_dir=output_dir,
+            related_responses=agent.related_response_texts,
+            cookie_string=agent.cookie_store.cookie_string(),
+        )
+
+
+def check_end_condition(state, agent, to_generate_code, codegen_concurrency=4, checkpoint_path=None, output_dir="."):
     agent.dag_manager.detect_cycles()
 
     if len(state.get("to_be_processed_nodes", [])) == 0:
-        print_dag(agent.dag_manager.graph, agent.global_master_node_id)
-        visualize_dag(agent.dag_manager.graph)
-        print("------------------------Successfully analyzed!!!-------------------------------", flush=True)
-        print_dag_in_reverse(agent.dag_manager.graph, to_generate_code=to_generate_code)
+        # Save the finished analysis before codegen so a failed codegen can be rerun with --from-graph
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, agent, state, END)
+        finish_analysis(agent, to_generate_code, codegen_concurrency, output_dir)
         return "end"
     else:
         print("Continuing execution", flush=True)
         return "continue"
 
 
-def build_graph(prompt, har_file_path="network_requests.har", cookie_path="cookies.json", to_generate_code=False):
-    agent = IntegrationAgent(prompt, har_file_path, cookie_path)
+def build_graph(
+    prompt,
+    har_file_path="network_requests.har",
+    cookie_path="cookies.json",
+    to_generate_code=False,
+    codegen_concurrency=4,
+    analysis_concurrency=8,
+    dynamic_parts_batch_size=1,
+    dynamic_parts_mode="llm",
+    spill_threshold=None,
+    url_shortlist_size=50,
+    entry_point="IntegrationAgent",
+    checkpoint_path=None,
+    har_cache_dir=None,
+    output_dir=".",
+    substring_scan="miss",
+):
+    agent = IntegrationAgent(
+        prompt,
+        har_file_path,
+        cookie_path,
+        max_concurrency=analysis_concurrency,
+        dynamic_parts_batch_size=dynamic_parts_batch_size,
+        dynamic_parts_mode=dynamic_parts_mode,
+        spill_threshold=spill_threshold,
+        url_shortlist_size=url_shortlist_size,
+        har_cache_dir=har_cache_dir,
+        substring_scan=substring_scan,
+    )
 
     graph_builder = StateGraph(AgentState)
 
+    def dag_size():
+        return {
+            "dag_nodes": agent.dag_manager.graph.number_of_nodes(),
+            "dag_edges": agent.dag_manager.graph.number_of_edges(),
+        }
+
+    def node(name, function):
+        return traced(name, function, describe=dag_size)
+
     # Add nodes using the agent's methods
-    graph_builder.add_node("IntegrationAgent", agent.end_url_identify_agent)
-    graph_builder.set_entry_point("IntegrationAgent")
+    graph_builder.add_node("IntegrationAgent", node("IntegrationAgent", agent.end_url_identify_agent))
+    graph_builder.set_entry_point(entry_point)
 
-    graph_builder.add_node("urlTocurl", agent.url_to_curl)
+    graph_builder.add_node("urlTocurl", node("urlTocurl", agent.url_to_curl))
     graph_builder.add_edge("IntegrationAgent", "urlTocurl")
 
     graph_builder.add_node(
-        "dynamicurlDataIdentifyingAgent", agent.dynamic_part_identifying_agent
+        "dynamicurlDataIdentifyingAgent", node("dynamicurlDataIdentifyingAgent", agent.dynamic_part_identifying_agent)
     )
     graph_builder.add_edge("urlTocurl", "dynamicurlDataIdentifyingAgent")
 
-    graph_builder.add_node("inputVariablesIdentifyingAgent", agent.input_variables_identifying_agent)
+    graph_builder.add_node("inputVariablesIdentifyingAgent", node("inputVariablesIdentifyingAgent", agent.input_variables_identifying_agent))
     graph_builder.add_edge("dynamicurlDataIdentifyingAgent", "inputVariablesIdentifyingAgent")
 
-    graph_builder.add_node("findcurlFromContent", agent.find_curl_from_content)
+    graph_builder.add_node("findcurlFromContent", node("findcurlFromContent", agent.find_curl_from_content))
     graph_builder.add_edge("inputVariablesIdentifyingAgent", "findcurlFromContent")
 
     # Add conditional edges 
     graph_builder.add_conditional_edges(                
         "findcurlFromContent",
-        partial(check_end_condition, agent=agent, to_generate_code=to_generate_code),
+        partial(
+            check_end_condition,
+            agent=agent,
+            to_generate_code=to_generate_code,
+            codegen_concurrency=codegen_concurrency,
+            checkpoint_path=checkpoint_path,
+            output_dir=output_dir,
+        ),
         {"end": END, "continue": "dynamicurlDataIdentifyingAgent"},
     )
 
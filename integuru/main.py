@@ -1,6 +1,11 @@
-from typing import List
-from integuru.graph_builder import build_graph
+import os
+from functools import partial
+from integuru.graph_builder import build_graph, finish_analysis
 from integuru.util.LLM import llm
+from integuru.util.checkpoint import END_NODE, get_next_node, load_checkpoint, restore_agent, save_checkpoint
+from integuru.util.har_processing import load_har
+from integuru.util.print import print_dag_in_reverse
+from integuru.util.url_clustering import UrlClusterIndex, related_response_texts
 
 agent = None
 
@@ -12,25 +17,120 @@ async def call_agent(
     input_variables: dict = None,
     max_steps: int = 15,
     to_generate_code: bool = False,
+    codegen_concurrency: int = 4,
+    analysis_concurrency: int = 8,
+    dynamic_parts_batch_size: int = 1,
+    dynamic_parts_mode: str = "llm",
+    spill_threshold: int = None,
+    url_shortlist_size: int = 50,
+    checkpoint_path: str = None,
+    resume_from: str = None,
+    har_cache_dir: str = None,
+    output_dir: str = ".",
+    substring_scan: str = "miss",
 ):  
     
     llm.set_default_model(model)
+    os.makedirs(output_dir, exist_ok=True)
+
+    checkpoint = load_checkpoint(resume_from) if resume_from else None
+    if checkpoint is not None:
+        prompt = prompt or checkpoint["prompt"]
+        print(f"Resuming from {resume_from} at {checkpoint['next_node']}", flush=True)
 
     global agent
-    graph, agent = build_graph(prompt, har_file_path, cookie_path, to_generate_code)
-    event_stream = graph.astream(
-        {
+    graph, agent = build_graph(
+        prompt,
+        har_file_path,
+        cookie_path,
+        to_generate_code,
+        codegen_concurrency=codegen_concurrency,
+        analysis_concurrency=analysis_concurrency,
+        dynamic_parts_batch_size=dynamic_parts_batch_size,
+        dynamic_parts_mode=dynamic_parts_mode,
+        spill_threshold=spill_threshold,
+        url_shortlist_size=url_shortlist_size,
+        entry_point=checkpoint["next_node"] if checkpoint and checkpoint["next_node"] != END_NODE else "IntegrationAgent",
+        checkpoint_path=checkpoint_path,
+        har_cache_dir=har_cache_dir,
+        output_dir=output_dir,
+        substring_scan=substring_scan,
+    )
+
+    if checkpoint is None:
+        initial_state = {
             "master_node": None,
-            "in_process_node": None,
+            "in_process_nodes": [],
             "to_be_processed_nodes": [],
-            "in_process_node_dynamic_parts": [],
+            "in_process_nodes_dynamic_parts": {},
             "action_url": "",
             "input_variables": input_variables or {},  
-        },
-        {
-            "recursion_limit": max_steps,
-        },
+        }
+    else:
+        restore_agent(agent, checkpoint)
+        initial_state = checkpoint["state"]
+        if input_variables:
+            initial_state["input_variables"] = input_variables
+
+    if checkpoint is not None and checkpoint["next_node"] == END_NODE:
+        finish_analysis(agent, to_generate_code, codegen_concurrency, output_dir)
+    else:
+        event_stream = graph.astream(
+            initial_state,
+            {
+                "recursion_limit": max_steps,
+            },
+        )
+        async for event in event_stream:
+            # print("+++", event)
+            if checkpoint_path:
+                for node_name, state in event.items():
+                    save_checkpoint(checkpoint_path, agent, state, get_next_node(node_name, state))
+
+    cache = llm.get_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}", flush=True)
+    print(f"LLM scheduler: {llm.get_scheduler().stats()}", flush=True)
+
+
+
+def generate_code_from_graph(
+    model: str,
+    checkpoint_path: str,
+    codegen_concurrency: int = 4,
+    output_dir: str = ".",
+    har_file_path: str = None,
+):
+    """
+    Runs only code generation against the DAG saved in a checkpoint, without re-analyzing the HAR.
+    The HAR is only read for the other calls of each endpoint that generated extractors are
+    checked against; har_file_path is used when the one recorded in the checkpoint has moved.
+    """
+    llm.set_default_model(model)
+    os.makedirs(output_dir, exist_ok=True)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    related_responses = None
+    har_file_path = next(
+        (path for path in (checkpoint["har_file_path"], har_file_path) if path and os.path.exists(path)), None
+    )
+    if har_file_path is not None:
+        har_data = load_har(har_file_path)
+        related_responses = partial(
+            related_response_texts,
+            UrlClusterIndex(har_data.har_urls),
+            har_data.req_to_res_map,
+            har_data.url_to_req_res_map,
+        )
+    else:
+        print(f"{checkpoint['har_file_path']} not found, extractors are not checked against other calls", flush=True)
+
+    print_dag_in_reverse(
+        checkpoint["graph"],
+        to_generate_code=True,
+        codegen_concurrency=codegen_concurrency,
+        output_dir=output_dir,
+        related_responses=related_responses,
+        cookie_string=checkpoint["cookie_string"],
     )
-    async for event in event_stream:
-        # print("+++", event)
-        pass
+    print(f"LLM scheduler: {llm.get_scheduler().stats()}", flush=True)
@@ -1,5 +1,6 @@
 from typing import List, Optional, Literal, Dict # Import Literal for type enforcement
 import networkx as nx
+import threading
 import uuid
 
 
@@ -9,6 +10,9 @@ class DAGManager:
     def __init__(self):
         self.graph = nx.DiGraph()
         self.root_id = None 
+        # Reentrant so callers can hold it across several DAG operations
+        self.lock = threading.RLock()
+
     def add_node(
         self,
         node_type: Literal["cookie", "master", "cURL", "not found"],  
@@ -18,7 +22,8 @@ class DAGManager:
         input_variables: Optional[Dict[str, str]] = None,
     ):
         node_id = str(uuid.uuid4())
-        self.graph.add_node(node_id, node_type=node_type, content=content, dynamic_parts=dynamic_parts, extracted_parts=extracted_parts, input_variables=input_variables)
+        with self.lock:
+            self.graph.add_node(node_id, node_type=node_type, content=content, dynamic_parts=dynamic_parts, extracted_parts=extracted_parts, input_variables=input_variables)
         return node_id
     
     def update_node(
@@ -26,9 +31,10 @@ class DAGManager:
         node_id: str, 
         **attributes: Optional[List[str]]):
         
-        for attr, value in attributes.items():
-            if value is not None:
-                self.graph.nodes[node_id][attr] = value
+        with self.lock:
+            for attr, value in attributes.items():
+                if value is not None:
+                    self.graph.nodes[node_id][attr] = value
 
     def detect_cycles(self):
         """
@@ -56,7 +62,8 @@ class DAGManager:
         return self.graph.nodes.get(node_id, None)
     
     def add_edge(self, from_node_id: str, to_node_id: str):
-        self.graph.add_edge(from_node_id, to_node_id)
+        with self.lock:
+            self.graph.add_edge(from_node_id, to_node_id)
 
     def __str__(self):
         nodes_info = []
@@ -1,9 +1,9 @@
-from typing import List, Optional, TypedDict, Dict
+from typing import List, TypedDict, Dict
 
 class AgentState(TypedDict):
     master_node: str 
-    in_process_node: str
+    in_process_nodes: List[str]
     to_be_processed_nodes: List[str]
-    in_process_node_dynamic_parts: List[str]
+    in_process_nodes_dynamic_parts: Dict[str, List[str]]
     action_url: str
     input_variables: Dict[str, str]
@@ -1,24 +1,112 @@
-from typing import List, Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
+from types import MappingProxyType
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+import hashlib
 import json
 
-class Request:
-    def __init__(self, method: str, url: str, headers: Dict[str, str], 
-                 query_params: Optional[Dict[str, str]] = None, body: Optional[Any] = None):
-        self.method = method
-        self.url = url
-        self.headers = headers  
-        self.query_params = query_params
-        self.body = body
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
-    def to_curl_command(self) -> str:
+class Request:
+    """
+    An immutable HTTP request captured from a HAR file.
+
+    Requests compare and hash by their fingerprint (method, normalized URL, sorted
+    query parameters and body hash), so repeated identical calls share one key. The
+    full and minified cURL renderings are built on first use and cached. A fingerprint
+    computed earlier (e.g. stored in a HarIndex) can be passed in to skip recomputing it.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "headers",
+        "query_params",
+        "body",
+        "_fingerprint",
+        "_hash",
+        "_curl",
+        "_minified_curl",
+    )
+
+    def __init__(self, method: str, url: str, headers: Dict[str, str],
+                 query_params: Optional[Dict[str, str]] = None, body: Optional[Any] = None,
+                 fingerprint: Optional[Tuple[str, str, Tuple[Tuple[str, str], ...], str]] = None):
+        object.__setattr__(self, "method", method)
+        object.__setattr__(self, "url", url)
+        object.__setattr__(self, "headers", MappingProxyType(dict(headers)))
+        object.__setattr__(self, "query_params", MappingProxyType(dict(query_params)) if query_params is not None else None)
+        object.__setattr__(self, "body", body)
+        object.__setattr__(self, "_fingerprint", fingerprint)
+        object.__setattr__(self, "_hash", None)
+        object.__setattr__(self, "_curl", None)
+        object.__setattr__(self, "_minified_curl", None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Request is immutable; cannot set {name!r}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Request is immutable; cannot delete {name!r}")
+
+    def __reduce__(self):
+        query_params = dict(self.query_params) if self.query_params is not None else None
+        return (Request, (self.method, self.url, dict(self.headers), query_params, self.body))
+
+    @property
+    def fingerprint(self) -> Tuple[str, str, Tuple[Tuple[str, str], ...], str]:
+        """
+        The canonical identity of the request: method, normalized URL without the
+        query, sorted query parameters and a hash of the body.
+        """
+        if self._fingerprint is None:
+            parts = urlsplit(self.url)
+            scheme = parts.scheme.lower()
+            host = (parts.hostname or "").lower()
+            if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+                host = f"{host}:{parts.port}"
+            normalized_url = urlunsplit((scheme, host, parts.path or "/", "", ""))
+
+            if parts.query:
+                params = parse_qsl(parts.query, keep_blank_values=True)
+            else:
+                params = list((self.query_params or {}).items())
+
+            if self.body is None:
+                body_hash = ""
+            else:
+                body_text = self.body if isinstance(self.body, str) else json.dumps(self.body, sort_keys=True)
+                body_hash = hashlib.sha256(body_text.encode("utf-8")).hexdigest()
+
+            object.__setattr__(
+                self,
+                "_fingerprint",
+                (self.method.upper(), normalized_url, tuple(sorted(params)), body_hash),
+            )
+        return self._fingerprint
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(self.fingerprint))
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Request):
+            return NotImplemented
+        return hash(self) == hash(other) and self.fingerprint == other.fingerprint
+
+    def _render_curl(self, excluded_headers: Tuple[str, ...] = ()) -> str:
         curl_parts = [f"curl -X {self.method}"]
 
         for name, value in self.headers.items():
-            curl_parts.append(f"-H '{name}: {value}'")
+            if name.lower() not in excluded_headers:
+                curl_parts.append(f"-H '{name}: {value}'")
 
-        if self.query_params:
+        url = self.url
+        # HAR URLs usually already carry the query string that queryString repeats
+        if self.query_params and not urlsplit(url).query:
             query_string = "&".join([f"{k}={v}" for k, v in self.query_params.items()])
-            self.url += f"?{query_string}"
+            url += f"?{query_string}"
 
         if self.body:
             content_type = None
@@ -35,42 +123,26 @@ class Request:
             elif isinstance(self.body, str):
                 curl_parts.append(f"--data '{self.body}'")
 
-        curl_parts.append(f"'{self.url}'")
+        curl_parts.append(f"'{url}'")
 
         return " ".join(curl_parts)
 
+    def to_curl_command(self) -> str:
+        if self._curl is None:
+            object.__setattr__(self, "_curl", self._render_curl())
+        return self._curl
+
     def to_minified_curl_command(self) -> str:
         """
         Minifies the curl command by removing referer and cookie headers.
         This is done to reduce LLM hallucinations.
         """
-        curl_parts = [f"curl -X {self.method}"]
-
-        for name, value in self.headers.items():
-            if name.lower() not in ['referer', 'cookie']:
-                curl_parts.append(f"-H '{name}: {value}'")
-
-        if self.query_params:
-            query_string = "&".join([f"{k}={v}" for k, v in self.query_params.items()])
-            self.url += f"?{query_string}"
-
-        if self.body:
-            content_type = None
-            for k in self.headers:
-                if k.lower() == 'content-type':
-                    content_type = self.headers[k]
-                    break
-
-            if isinstance(self.body, dict):
-                if not content_type:
-                    curl_parts.append(f"-H 'Content-Type: application/json'")
-                curl_parts.append(f"--data '{json.dumps(self.body)}'")
-            elif isinstance(self.body, str):
-                curl_parts.append(f"--data '{self.body}'")
-
-        curl_parts.append(f"'{self.url}'")
-
-        return " ".join(curl_parts)
+        if self._minified_curl is None:
+            object.__setattr__(self, "_minified_curl", self._render_curl(excluded_headers=('referer', 'cookie')))
+        return self._minified_curl
 
     def __str__(self) -> str:
         return self.to_curl_command()
+
+    def __repr__(self) -> str:
+        return f"Request({self.method!r}, {self.url!r})"
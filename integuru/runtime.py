@@ -0,0 +1,352 @@
+"""
+Executes an execution plan (see integuru.util.plan) directly, without generated code.
+
+Requests go through one pooled HTTP client and each step starts as soon as the
+steps it depends on are done, so independent branches of the DAG run
+concurrently. When a plan is run for many sets of input variables, the steps
+that do not depend on any input variable (logins, account lookups and the
+like) run once and are shared by every set.
+
+Plans hold no cookies: they are read from a cookie file, or else from the
+COOKIE_STRING environment variable (name=value;name=value).
+
+    python -m integuru run execution_plan.json --input year 2024
+    python -m integuru run execution_plan.json --inputs-file years.jsonl --concurrency 16 --async
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set
+
+import click
+import httpx
+
+from integuru.util.cookie_store import CookieStore
+from integuru.util.plan import fill, load_plan, parse_cookie_string
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_CONCURRENCY = 8
+
+
+class StepError(Exception):
+    """
+    A step of a plan failed: its request returned an error status, a value could not
+    be extracted or a cookie it needs is missing.
+    """
+
+    def __init__(self, step_id: str, message: str):
+        super().__init__(f"{step_id}: {message}")
+        self.step_id = step_id
+
+
+class PlanRunner:
+    """
+    Runs a plan with a pooled HTTP client, synchronously (run, run_many) or on an
+    event loop (arun, arun_many). origins maps recorded origins such as
+    "https://example.com" to the ones to call instead, e.g. a local test server,
+    and transport (e.g. an httpx.MockTransport) replaces the network altogether.
+    cookie_string is sent with every request and supplies the plan's cookie steps.
+    """
+
+    def __init__(
+        self,
+        plan: Dict[str, Any],
+        cookie_string: Optional[str] = None,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        output_dir: str = ".",
+        origins: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.plan = plan
+        self.steps: Dict[str, Dict[str, Any]] = {step["id"]: step for step in plan["steps"]}
+        self.cookie_string = cookie_string or ""
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self.origins = {origin.rstrip("/"): target.rstrip("/") for origin, target in (origins or {}).items()}
+        self.transport = transport
+        self.input_steps = self._input_dependent_steps()
+
+    def _input_dependent_steps(self) -> Set[str]:
+        # Steps are in dependency order, so one pass sees every dependency first
+        dependent: Set[str] = set()
+        for step in self.plan["steps"]:
+            if any("input" in binding for binding in step.get("bindings", {}).values()) or dependent.intersection(
+                step["depends_on"]
+            ):
+                dependent.add(step["id"])
+        return dependent
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+
+    def _rewrite(self, url: str) -> str:
+        for origin, target in self.origins.items():
+            if url == origin or url.startswith(origin + "/") or url.startswith(origin + "?"):
+                return target + url[len(origin):]
+        return url
+
+    def _request_arguments(self, step: Dict[str, Any], values: Dict[str, Any], inputs: Dict[str, str]) -> Dict[str, Any]:
+        params = {}
+        for name, binding in step["bindings"].items():
+            if "input" in binding:
+                params[name] = inputs[binding["input"]]
+            elif name in values:
+                params[name] = values[name]
+        request = step["request"]
+        headers = fill(request["headers"], params)
+        headers["Cookie"] = self.cookie_string
+        arguments = {"method": request["method"], "url": self._rewrite(fill(request["url"], params)), "headers": headers}
+        if "json" in request:
+            arguments["json"] = fill(request["json"], params)
+        elif "data" in request:
+            arguments["content"] = fill(request["data"], params)
+        return arguments
+
+    def _output_path(self, step: Dict[str, Any], run_index: Optional[int]) -> str:
+        suffix = "" if run_index is None else f"-{run_index}"
+        return os.path.join(self.output_dir, f"output{suffix}{step['output']['extension']}")
+
+    def _parse(self, step: Dict[str, Any], response: httpx.Response, run_index: Optional[int]) -> Dict[str, Any]:
+        """
+        Returns the values a step produces: its extracted values, or its output under the step id for the result step.
+        """
+        if response.is_error:
+            raise StepError(step["id"], f"{response.request.method} {response.request.url} returned {response.status_code}")
+
+        output = step.get("output")
+        if output is not None:
+            if output["type"] == "file":
+                path = self._output_path(step, run_index)
+                with open(path, "wb") as file:
+                    file.write(response.content)
+                return {step["id"]: path}
+            return {step["id"]: response.json() if output["type"] == "json" else response.text}
+
+        values: Dict[str, Any] = {}
+        data = response.json() if step["extract"] and "json_path" in step["extract"][0] else None
+        for rule in step["extract"]:
+            try:
+                if "json_path" in rule:
+                    value = data
+                    for key in rule["json_path"]:
+                        value = value[key]
+                    values[rule["name"]] = value
+                else:
+                    values[rule["name"]] = re.search(rule["regex"], response.text).group(1)
+            except (KeyError, IndexError, TypeError, AttributeError):
+                raise StepError(step["id"], f"could not extract {rule['name']!r} from the response")
+        return values
+
+    def _cookie_values(self) -> Dict[str, Any]:
+        cookies = parse_cookie_string(self.cookie_string)
+        values = {}
+        for step in self.plan["steps"]:
+            if step["type"] != "cookie":
+                continue
+            if step["cookie"] not in cookies:
+                raise StepError(step["id"], f"the cookie {step['cookie']!r} is missing")
+            values[step["name"]] = cookies[step["cookie"]]
+        return values
+
+    def _step_ids(self, shared: bool) -> List[str]:
+        """
+        Returns the request steps that do not depend on input variables, or those that do.
+        """
+        return [
+            step["id"]
+            for step in self.plan["steps"]
+            if step["type"] == "request" and (step["id"] not in self.input_steps) == shared
+        ]
+
+    @staticmethod
+    def _run_indexes(inputs_list: List[Dict[str, str]]) -> List[Optional[int]]:
+        # Downloaded files are numbered by input set, unless there is only one
+        return list(range(len(inputs_list))) if len(inputs_list) > 1 else [None]
+
+    def _inputs(self, inputs: Optional[Dict[str, str]]) -> Dict[str, str]:
+        return {**self.plan.get("input_variables", {}), **(inputs or {})}
+
+    # Synchronous execution
+
+    def _run_step(
+        self, client: httpx.Client, step: Dict[str, Any], values: Dict[str, Any], inputs: Dict[str, str], run_index: Optional[int]
+    ) -> Dict[str, Any]:
+        response = client.request(**self._request_arguments(step, values, inputs))
+        return self._parse(step, response, run_index)
+
+    def _run_steps(
+        self,
+        client: httpx.Client,
+        executor: ThreadPoolExecutor,
+        step_ids: List[str],
+        values: Dict[str, Any],
+        inputs: Dict[str, str],
+        run_index: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs the steps on executor, each as soon as its dependencies are done, and returns values with their outputs added.
+        """
+        values = dict(values)
+        done = {step["id"] for step in self.plan["steps"] if step["id"] not in step_ids}
+        remaining = list(step_ids)
+        running = {}
+        while remaining or running:
+            for step_id in [step_id for step_id in remaining if done.issuperset(self.steps[step_id]["depends_on"])]:
+                remaining.remove(step_id)
+                future = executor.submit(self._run_step, client, self.steps[step_id], dict(values), inputs, run_index)
+                running[future] = step_id
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                values.update(future.result())
+                done.add(running.pop(future))
+        return values
+
+    def _client(self) -> httpx.Client:
+        return httpx.Client(limits=self._limits(), timeout=self.timeout, transport=self.transport)
+
+    def run(self, inputs: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Runs the plan once and returns the output of its result step.
+        """
+        with self._client() as client, ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            values = self._run_steps(client, executor, self._step_ids(True), self._cookie_values(), {})
+            values = self._run_steps(client, executor, self._step_ids(False), values, self._inputs(inputs))
+        return values.get(self.plan["result"])
+
+    def run_many(self, inputs_list: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Runs the plan for each set of input variables and returns {"inputs", "result"}
+        or {"inputs", "error"} for each, in order. The shared steps run once; if
+        one of them fails, so does every set.
+        """
+        with self._client() as client, ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            shared = self._run_steps(client, executor, self._step_ids(True), self._cookie_values(), {})
+
+            def run_inputs(run_index: Optional[int], inputs: Dict[str, str]) -> Dict[str, Any]:
+                try:
+                    values = self._run_steps(client, executor, self._step_ids(False), shared, inputs, run_index)
+                except (StepError, httpx.HTTPError) as e:
+                    return {"inputs": inputs, "error": str(e)}
+                return {"inputs": inputs, "result": values.get(self.plan["result"])}
+
+            # These threads only wait on the steps they submit to executor, so they cannot starve it
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as runs:
+                return list(runs.map(run_inputs, self._run_indexes(inputs_list), map(self._inputs, inputs_list)))
+
+    # Asynchronous execution
+
+    async def _arun_steps(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        step_ids: List[str],
+        values: Dict[str, Any],
+        inputs: Dict[str, str],
+        run_index: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        values = dict(values)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Dict[str, Any]) -> None:
+            await asyncio.gather(*(tasks[step_id] for step_id in step["depends_on"] if step_id in tasks))
+            async with semaphore:
+                response = await client.request(**self._request_arguments(step, values, inputs))
+            values.update(self._parse(step, response, run_index))
+
+        # Steps are in dependency order, so the tasks of a step's dependencies exist before its own
+        for step_id in step_ids:
+            tasks[step_id] = asyncio.ensure_future(run_step(self.steps[step_id]))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return values
+
+    def _async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self._limits(), timeout=self.timeout, transport=self.transport)
+
+    async def arun(self, inputs: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Runs the plan once on the event loop and returns the output of its result step.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_client() as client:
+            values = await self._arun_steps(client, semaphore, self._step_ids(True), self._cookie_values(), {})
+            values = await self._arun_steps(client, semaphore, self._step_ids(False), values, self._inputs(inputs))
+        return values.get(self.plan["result"])
+
+    async def arun_many(self, inputs_list: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Like run_many, on the event loop.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_client() as client:
+            shared = await self._arun_steps(client, semaphore, self._step_ids(True), self._cookie_values(), {})
+
+            async def run_inputs(run_index: Optional[int], inputs: Dict[str, str]) -> Dict[str, Any]:
+                try:
+                    values = await self._arun_steps(client, semaphore, self._step_ids(False), shared, inputs, run_index)
+                except (StepError, httpx.HTTPError) as e:
+                    return {"inputs": inputs, "error": str(e)}
+                return {"inputs": inputs, "result": values.get(self.plan["result"])}
+
+            return list(
+                await asyncio.gather(
+                    *(run_inputs(index, self._inputs(inputs)) for index, inputs in zip(self._run_indexes(inputs_list), inputs_list))
+                )
+            )
+
+
+def read_inputs_file(path: str) -> List[Dict[str, str]]:
+    """
+    Reads one JSON object of input variables per line.
+    """
+    with open(path, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+@click.command("run")
+@click.argument("plan_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--cookie-path", default="./cookies.json", type=click.Path(dir_okay=False), help="Cookie file to send (default is ./cookies.json, or $COOKIE_STRING if it does not exist)")
+@click.option("--input", "input_variables", multiple=True, type=(str, str), help="Input variable in the format key value")
+@click.option("--inputs-file", default=None, type=click.Path(exists=True, dir_okay=False), help="Run once per line of JSON input variables")
+@click.option("--concurrency", default=DEFAULT_CONCURRENCY, type=int, help=f"Max requests in flight (default is {DEFAULT_CONCURRENCY})")
+@click.option("--async", "use_async", is_flag=True, default=False, help="Run on an asyncio event loop instead of a thread pool")
+@click.option("--timeout", default=DEFAULT_TIMEOUT, type=float, help=f"Seconds before a request times out (default is {DEFAULT_TIMEOUT:g})")
+@click.option("--output-dir", default=".", help="Directory for downloaded files (default is the current directory)")
+@click.option("--origin", "origins", multiple=True, type=(str, str), help="Send requests for a recorded origin to another one, e.g. https://example.com http://127.0.0.1:8000")
+def run(plan_path, cookie_path, input_variables, inputs_file, concurrency, use_async, timeout, output_dir, origins):
+    """
+    Runs an execution plan and prints one JSON line per set of input variables.
+    """
+    plan = load_plan(plan_path)
+    if os.path.exists(cookie_path):
+        cookie_string = CookieStore.from_file(cookie_path).cookie_string()
+    else:
+        cookie_string = os.environ.get("COOKIE_STRING", "")
+    os.makedirs(output_dir, exist_ok=True)
+    runner = PlanRunner(
+        plan, cookie_string=cookie_string, max_concurrency=concurrency, timeout=timeout, output_dir=output_dir, origins=dict(origins)
+    )
+
+    inputs_list: List[Dict[str, str]] = read_inputs_file(inputs_file) if inputs_file else [{}]
+    inputs_list = [{**inputs, **dict(input_variables)} for inputs in inputs_list]
+    try:
+        results = asyncio.run(runner.arun_many(inputs_list)) if use_async else runner.run_many(inputs_list)
+    except (StepError, httpx.HTTPError) as e:
+        # A step shared by every set of inputs failed
+        raise click.ClickException(str(e))
+
+    for result in results:
+        print(json.dumps(result, default=str), flush=True)
+    sys.exit(1 if any("error" in result for result in results) else 0)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,33 @@
-from langchain_openai import ChatOpenAI
+from typing import Any, Dict, Optional
+
+from integuru.util.llm_backend import LLMBackend, OpenAIBackend
+from integuru.util.llm_cache import CachedChatModel, LLMCache
+from integuru.util.llm_scheduler import LLMScheduler, ScheduledChatModel
+from integuru.util.tracing import TracedChatModel
 
 class LLMSingleton:
     _instance = None
     _default_model = "gpt-4o"  
     _alternate_model = "o1-preview"
+    _cache: Optional[LLMCache] = None
+    _backend: Optional[LLMBackend] = None
+    _models: Dict[str, Any] = {}
+    _scheduler: LLMScheduler = LLMScheduler()
+
+    @classmethod
+    def _wrap(cls, model):
+        # Cache hits skip the scheduler, so they never wait for or use up rate limit budget
+        model = ScheduledChatModel(model, cls._scheduler)
+        if cls._cache is not None:
+            model = CachedChatModel(model, cls._cache)
+        return TracedChatModel(model)
+
+    @classmethod
+    def _get_model(cls, model: str):
+        # One wrapped chat model per model name, sharing the backend's HTTP clients
+        if model not in cls._models:
+            cls._models[model] = cls._wrap(cls.get_backend().chat_model(model))
+        return cls._models[model]
 
     @classmethod
     def get_instance(cls, model: str = None):
@@ -11,7 +35,7 @@ class LLMSingleton:
             model = cls._default_model
             
         if cls._instance is None:
-            cls._instance = ChatOpenAI(model=model, temperature=1)
+            cls._instance = cls._get_model(model)
         return cls._instance
 
     @classmethod
@@ -30,9 +54,55 @@ class LLMSingleton:
     def switch_to_alternate_model(cls):
         """Returns a ChatOpenAI instance configured for o1-miniss"""
         # Create a new instance only if we don't have one yet
-        cls._instance = ChatOpenAI(model=cls._alternate_model, temperature=1)
+        cls._instance = cls._get_model(cls._alternate_model)
 
         return cls._instance
 
-llm = LLMSingleton()
+    @classmethod
+    def configure_cache(
+        cls,
+        path: str,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        read_only: bool = False,
+    ) -> LLMCache:
+        """Route every LLM call through a persistent response cache at the given path"""
+        cls._cache = LLMCache(path, ttl=ttl, max_entries=max_entries, max_bytes=max_bytes, read_only=read_only)
+        cls._models = {}
+        cls._instance = None
+        return cls._cache
+
+    @classmethod
+    def get_cache(cls) -> Optional[LLMCache]:
+        return cls._cache
+
+    @classmethod
+    def configure_backend(cls, backend: Optional[LLMBackend] = None, **options) -> LLMBackend:
+        """Use the given backend, or an OpenAIBackend built from options (base_url, timeout, max_connections, ...)"""
+        if cls._backend is not None:
+            cls._backend.close()
+        cls._backend = backend or OpenAIBackend(**options)
+        cls._models = {}
+        cls._instance = None
+        return cls._backend
+
+    @classmethod
+    def get_backend(cls) -> LLMBackend:
+        if cls._backend is None:
+            cls._backend = OpenAIBackend()
+        return cls._backend
+
+    @classmethod
+    def configure_scheduler(cls, **options) -> LLMScheduler:
+        """Replace the LLM scheduler with one built from options (requests_per_minute, tokens_per_minute, max_concurrency, ...)"""
+        cls._scheduler = LLMScheduler(**options)
+        cls._models = {}
+        cls._instance = None
+        return cls._scheduler
+
+    @classmethod
+    def get_scheduler(cls) -> LLMScheduler:
+        return cls._scheduler
 
+llm = LLMSingleton()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import gzip
+import os
+import pickle
+from typing import Any, Dict
+
+CHECKPOINT_VERSION = 3
+
+END_NODE = "__end__"
+
+# The LangGraph node that runs after each node; findcurlFromContent is resolved from the state
+NEXT_NODE = {
+    "IntegrationAgent": "urlTocurl",
+    "urlTocurl": "dynamicurlDataIdentifyingAgent",
+    "dynamicurlDataIdentifyingAgent": "inputVariablesIdentifyingAgent",
+    "inputVariablesIdentifyingAgent": "findcurlFromContent",
+}
+
+
+def get_next_node(node_name: str, state: Dict[str, Any]) -> str:
+    """
+    Returns the LangGraph node that follows node_name for the given state.
+    """
+    if node_name == "findcurlFromContent":
+        return "dynamicurlDataIdentifyingAgent" if state.get("to_be_processed_nodes") else END_NODE
+    return NEXT_NODE[node_name]
+
+
+def save_checkpoint(path: str, agent: Any, state: Dict[str, Any], next_node: str) -> None:
+    """
+    Writes the DAG, the agent's lookup dicts and the LangGraph state to a gzipped pickle.
+    The file is replaced atomically so a crash never leaves a truncated checkpoint.
+    """
+    with agent.dag_manager.lock:
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "prompt": agent.prompt,
+            # Lets --from-graph generate the same code as the run that wrote the checkpoint
+            "har_file_path": os.path.abspath(agent.har_file_path),
+            "cookie_string": agent.cookie_store.cookie_string(),
+            "next_node": next_node,
+            "state": dict(state),
+            "graph": agent.dag_manager.graph,
+            "curl_to_id_dict": agent.curl_to_id_dict,
+            "cookie_to_id_dict": agent.cookie_to_id_dict,
+            "global_master_node_id": getattr(agent, "global_master_node_id", None),
+        }
+        data = pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with gzip.open(temporary_path, "wb", compresslevel=6) as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    Reads a checkpoint written by save_checkpoint.
+    """
+    with gzip.open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+
+    version = checkpoint.get("version")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {version} in {path}")
+    return checkpoint
+
+
+def restore_agent(agent: Any, checkpoint: Dict[str, Any]) -> None:
+    """
+    Loads the DAG and lookup dicts of a checkpoint into a freshly built agent.
+    """
+    with agent.dag_manager.lock:
+        agent.dag_manager.graph = checkpoint["graph"]
+        agent.curl_to_id_dict = checkpoint["curl_to_id_dict"]
+        agent.cookie_to_id_dict = checkpoint["cookie_to_id_dict"]
+        agent.global_master_node_id = checkpoint["global_master_node_id"]
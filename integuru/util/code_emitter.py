@@ -0,0 +1,266 @@
+"""
+Template-based code generation for DAG nodes that need no judgement.
+
+The DAG is first turned into an execution plan (see integuru.util.plan). Each
+request step of the plan is rendered directly as a Python function that
+replays the captured request with its dynamic parts filled in and parses the
+values later requests need out of the response, by JSON key path or by a
+regex verified against the capture. When the plan covers every node, a driver
+calling the functions in dependency order completes the program and no LLM
+call is needed; otherwise only the remaining nodes are left to the LLM.
+
+The driver caches what each upstream function returns (tokens, CSRF values,
+account IDs) for as long as the plan says it stays valid, or until the exp of
+a JWT among the values, and starts over without the cache when a request is
+rejected with 401 or 403.
+"""
+import inspect
+import pprint
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import networkx as nx
+
+from integuru.models.request import Request
+from integuru.util.plan import PARAM_KEY, PLACEHOLDER_PATTERN, build_plan, fill, parse_cookie_string
+
+LITERAL_WIDTH = 100
+
+PREAMBLE = '''import base64
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict
+
+import requests
+
+session = requests.Session()
+
+# Cookies are read from this file, as exported with the capture, or else from the
+# COOKIE_STRING environment variable (name=value;name=value)
+COOKIE_PATH = "cookies.json"
+
+# Cached values are refreshed this many seconds before they expire
+CACHE_EXPIRY_MARGIN = 30
+# Set to a file path to keep cached values between runs of this script
+CACHE_PATH = None
+
+_cache = {}
+_cache_hits = 0
+
+
+def _load_cookie_string():
+    if os.path.exists(COOKIE_PATH):
+        with open(COOKIE_PATH) as file:
+            return ";".join(f"{cookie['name']}={cookie.get('value') or ''}" for cookie in json.load(file))
+    return os.environ.get("COOKIE_STRING", "")
+
+
+def _jwt_expiry(value):
+    """
+    Returns the exp claim of a JWT, or None if value is not one.
+    """
+    if not isinstance(value, str) or value.count(".") != 2:
+        return None
+    payload = value.split(".")[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
+    expiry = claims.get("exp") if isinstance(claims, dict) else None
+    return expiry if isinstance(expiry, (int, float)) else None
+
+
+def _cached(function, ttl, params, cookie_string):
+    """
+    Returns what function(params, cookie_string) returned last time while it is
+    still valid: until the earliest exp of the JWTs among the values, else for
+    ttl seconds. Values without either are not cached.
+    """
+    global _cache_hits
+    if CACHE_PATH and not _cache and os.path.exists(CACHE_PATH):
+        with open(CACHE_PATH) as file:
+            _cache.update(json.load(file))
+    key = hashlib.sha256(json.dumps([function.__name__, params, cookie_string], sort_keys=True).encode()).hexdigest()
+    entry = _cache.get(key)
+    if entry is not None and entry["expires_at"] > time.time():
+        _cache_hits += 1
+        return entry["values"]
+
+    values = function(params, cookie_string)
+    expiries = [expiry for expiry in map(_jwt_expiry, values.values()) if expiry is not None]
+    expires_at = min(expiries) if expiries else (time.time() + ttl if ttl else None)
+    if expires_at is not None and expires_at - CACHE_EXPIRY_MARGIN > time.time():
+        _cache[key] = {"values": values, "expires_at": expires_at - CACHE_EXPIRY_MARGIN}
+        if CACHE_PATH:
+            with open(CACHE_PATH, "w") as file:
+                json.dump(_cache, file)
+    return values
+
+
+def _clear_cache():
+    _cache.clear()
+    if CACHE_PATH and os.path.exists(CACHE_PATH):
+        os.remove(CACHE_PATH)
+
+
+''' + f"""PLACEHOLDER_PATTERN = re.compile({PLACEHOLDER_PATTERN.pattern!r})
+PARAM_KEY = {PARAM_KEY!r}
+
+
+{inspect.getsource(fill)}
+
+{inspect.getsource(parse_cookie_string)}"""
+
+
+MAIN = '''def main(cookie_string=None, inputs=None):
+    if cookie_string is None:
+        cookie_string = _load_cookie_string()
+    hits = _cache_hits
+    try:
+        return _run(cookie_string, inputs)
+    except requests.HTTPError as error:
+        # A cached value was rejected before it expired (e.g. a revoked token): fetch everything again
+        if error.response is None or error.response.status_code not in (401, 403) or _cache_hits == hits:
+            raise
+        _clear_cache()
+        return _run(cookie_string, inputs)
+
+
+if __name__ == "__main__":
+    print(main())
+'''
+
+
+class EmittedCode(NamedTuple):
+    """
+    functions maps the ids of the cURL nodes the emitter could express to their
+    function definitions; program is the complete runnable code, or None when
+    some node was left for the LLM; plan is the execution plan both come from.
+    """
+
+    functions: Dict[str, str]
+    program: Optional[str]
+    plan: Dict[str, Any]
+
+
+def literal(value: Any, indent: int) -> str:
+    text = pprint.pformat(value, width=LITERAL_WIDTH - indent, sort_dicts=False)
+    return text.replace("\n", "\n" + " " * indent)
+
+
+def parse_lines(step: Dict[str, Any]) -> List[str]:
+    """
+    Returns the lines that turn the response of a request step into its return value.
+    """
+    output = step.get("output")
+    if output is not None:
+        if output["type"] == "file":
+            return [
+                f"output_path = 'output{output['extension']}'",
+                "with open(output_path, 'wb') as file:",
+                "    file.write(response.content)",
+                "return output_path",
+            ]
+        return ["return response.json()" if output["type"] == "json" else "return response.text"]
+
+    if not step["extract"]:
+        return ["return {}"]
+    if "json_path" in step["extract"][0]:
+        lines = ["data = response.json()", "return {"]
+        lines.extend(
+            f"    {rule['name']!r}: data{''.join(f'[{key!r}]' for key in rule['json_path'])},"
+            for rule in step["extract"]
+        )
+    else:
+        lines = ["text = response.text", "return {"]
+        lines.extend(f"    {rule['name']!r}: re.search({rule['regex']!r}, text).group(1)," for rule in step["extract"])
+    lines.append("}")
+    return lines
+
+
+def emit_function(step: Dict[str, Any]) -> str:
+    """
+    Returns the definition of a function step_id(params, cookie_string) replaying a request step.
+    """
+    request = step["request"]
+    lines = []
+    if step.get("ttl"):
+        lines.append(f"# cache_ttl: {step['ttl']:g} ({step['ttl_source']})")
+    lines += [
+        f"def {step['id']}(params, cookie_string):",
+        f"    # {request['method']} {request['url'].split('?')[0]}",
+    ]
+    if step["bindings"]:
+        lines.append(f"    # params: {', '.join(step['bindings'])}")
+    lines += [
+        f"    headers = fill({literal(request['headers'], 20)}, params)",
+        "    headers['Cookie'] = cookie_string",
+        "    response = session.request(",
+        f"        {request['method']!r},",
+        f"        fill({literal(request['url'], 13)}, params),",
+        "        headers=headers,",
+    ]
+    for body_kind in ("json", "data"):
+        if body_kind in request:
+            lines.append(f"        {body_kind}=fill({literal(request[body_kind], 18)}, params),")
+    lines.extend(["    )", "    response.raise_for_status()"])
+    lines.extend(f"    {line}" for line in parse_lines(step))
+    return "\n".join(lines)
+
+
+def emit_program(plan: Dict[str, Any]) -> str:
+    """
+    Renders a plan without unsupported nodes as a runnable script.
+    """
+    driver: List[str] = []
+    functions: List[str] = []
+    for step in plan["steps"]:
+        if step["type"] == "cookie":
+            driver.append(f"values[{step['name']!r}] = cookies[{step['cookie']!r}]")
+            continue
+        functions.extend([emit_function(step), "", ""])
+        params = [
+            f"{name!r}: values[{name!r}]" if "step" in binding else f"{name!r}: inputs[{binding['input']!r}]"
+            for name, binding in step["bindings"].items()
+        ]
+        if step["id"] == plan["result"]:
+            driver.append(f"result = {step['id']}({{{', '.join(params)}}}, cookie_string)")
+        else:
+            ttl = f"{step['ttl']:g}" if step.get("ttl") else "None"
+            driver.append(f"values.update(_cached({step['id']}, {ttl}, {{{', '.join(params)}}}, cookie_string))")
+
+    program = [PREAMBLE, "", f"INPUT_VARIABLES = {literal(plan['input_variables'], 18)}", "", ""]
+    program.extend(functions)
+    program.extend(
+        [
+            "def _run(cookie_string, inputs):",
+            "    inputs = {**INPUT_VARIABLES, **(inputs or {})}",
+            "    cookies = parse_cookie_string(cookie_string)",
+            "    values = {}",
+            "    result = None",
+        ]
+    )
+    program.extend(f"    {line}" for line in driver)
+    program.extend(["    return result", "", ""])
+    program.extend(MAIN.splitlines())
+    return "\n".join(program)
+
+
+def emit_code(
+    graph: nx.DiGraph,
+    node_order: List[str],
+    cookie_string: str = "",
+    related_responses: Optional[Callable[[Request], List[str]]] = None,
+    external_names: Optional[Dict[str, str]] = None,
+) -> EmittedCode:
+    """
+    Renders the nodes of node_order (dependencies first) that need no LLM and,
+    when that is all of them, the whole program. external_names names the params
+    of values produced by nodes left to the LLM (see build_plan).
+    """
+    plan = build_plan(graph, node_order, cookie_string, related_responses, external_names)
+    functions = {step["node_id"]: emit_function(step) for step in plan["steps"] if step["type"] == "request"}
+    program = emit_program(plan) if not plan["unsupported"] else None
+    return EmittedCode(functions, program, plan)
@@ -0,0 +1,150 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+# Length of the substrings cookie values are indexed by. Search strings
+# shorter than this are answered with a scan over the cookies.
+GRAM_LENGTH = 3
+
+CookieKey = Tuple[str, str, str]
+
+
+def domain_matches(host: str, domain: str) -> bool:
+    """
+    Returns whether a cookie set for domain is sent to host (RFC 6265 5.1.3).
+    """
+    host = host.lower()
+    domain = domain.lower().lstrip(".")
+    return host == domain or host.endswith(f".{domain}")
+
+
+def path_matches(request_path: str, cookie_path: str) -> bool:
+    """
+    Returns whether a cookie set for cookie_path is sent to request_path (RFC 6265 5.1.4).
+    """
+    request_path = request_path or "/"
+    cookie_path = cookie_path or "/"
+    if request_path == cookie_path:
+        return True
+    if not request_path.startswith(cookie_path):
+        return False
+    return cookie_path.endswith("/") or request_path[len(cookie_path)] == "/"
+
+
+def cookie_key(cookie: Dict[str, Any]) -> CookieKey:
+    """
+    Returns the identity of a cookie: same-named cookies on different domains or paths are distinct.
+    """
+    return (cookie["name"], cookie.get("domain") or "", cookie.get("path") or "/")
+
+
+class CookieStore:
+    """
+    Cookies from a cookie file, indexed by exact value and by every
+    GRAM_LENGTH-character substring of their values.
+
+    Looking up which cookie contains a dynamic value intersects the posting
+    lists of the value's substrings instead of testing every cookie, and the
+    matches are scoped to the domain and path of the request that sent them.
+    """
+
+    def __init__(self, cookies: Iterable[Dict[str, Any]]):
+        self.cookies: Dict[CookieKey, Dict[str, Any]] = {}
+        for cookie in cookies:
+            if cookie.get("name"):
+                # Later entries for the same name, domain and path replace earlier ones, like a browser jar
+                self.cookies[cookie_key(cookie)] = cookie
+
+        self.keys: List[CookieKey] = list(self.cookies.keys())
+        self.values: List[str] = [self.cookies[key].get("value") or "" for key in self.keys]
+        self.by_value: Dict[str, List[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+
+        for position, value in enumerate(self.values):
+            self.by_value.setdefault(value, []).append(position)
+            for start in range(len(value) - GRAM_LENGTH + 1):
+                self.grams.setdefault(value[start:start + GRAM_LENGTH], set()).add(position)
+
+    @classmethod
+    def from_file(cls, cookie_file_path: str) -> "CookieStore":
+        """
+        Loads a JSON cookie file as exported by the browser.
+        """
+        with open(cookie_file_path, "r") as file:
+            cookies = json.load(file)
+
+        return cls(
+            {
+                "name": cookie.get("name"),
+                "value": cookie.get("value"),
+                "domain": cookie.get("domain"),
+                "path": cookie.get("path"),
+                "expires": cookie.get("expires"),
+                "httpOnly": cookie.get("httpOnly"),
+                "secure": cookie.get("secure"),
+                "sameSite": cookie.get("sameSite"),
+            }
+            for cookie in cookies
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _positions_containing(self, search_string: str) -> List[int]:
+        exact = self.by_value.get(search_string)
+        if exact:
+            return exact
+
+        if len(search_string) < GRAM_LENGTH:
+            return [position for position, value in enumerate(self.values) if search_string in value]
+
+        candidates: Optional[Set[int]] = None
+        grams = {search_string[start:start + GRAM_LENGTH] for start in range(len(search_string) - GRAM_LENGTH + 1)}
+        for gram in sorted(grams, key=lambda gram: len(self.grams.get(gram, ()))):
+            positions = self.grams.get(gram)
+            if not positions:
+                return []
+            candidates = set(positions) if candidates is None else candidates & positions
+            if not candidates:
+                return []
+
+        return sorted(position for position in candidates if search_string in self.values[position])
+
+    def find(self, search_string: str, url: Optional[str] = None) -> Optional[CookieKey]:
+        """
+        Returns the key of the cookie whose value contains search_string.
+
+        With a url, cookies that would be sent to its host and path are preferred,
+        the most specific domain and path first; cookies scoped elsewhere are only
+        returned when none of them match.
+        """
+        positions = self._positions_containing(search_string)
+        if not positions:
+            return None
+
+        if url:
+            parts = urlsplit(url)
+            host = parts.hostname or ""
+            scoped = [
+                position for position in positions
+                if domain_matches(host, self.keys[position][1]) and path_matches(parts.path, self.keys[position][2])
+            ]
+            if scoped:
+                return self.keys[max(
+                    scoped,
+                    key=lambda position: (len(self.keys[position][1].lstrip(".")), len(self.keys[position][2])),
+                )]
+
+        return self.keys[positions[0]]
+
+    def get(self, key: CookieKey) -> Dict[str, Any]:
+        return self.cookies[key]
+
+    def cookie_string(self) -> str:
+        """
+        Returns the cookies as a Cookie header value, key=value;key=value.
+        """
+        return ";".join(f"{key[0]}={self.cookies[key].get('value') or ''}" for key in self.keys)
+
+    def session_values(self) -> List[str]:
+        return [value for value in self.values if value]
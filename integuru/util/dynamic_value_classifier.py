@@ -0,0 +1,287 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+
+from integuru.models.request import Request
+from integuru.util.value_index import MIN_TOKEN_LENGTH, ValueIndex
+
+UUID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+JWT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]*$")
+HEX_PATTERN = re.compile(r"^[0-9a-fA-F]{16,}$")
+OPAQUE_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9+/_\-.~%]{20,}={0,2}$")
+NUMERIC_ID_PATTERN = re.compile(r"^\d{4,}$")
+PLAIN_WORD_PATTERN = re.compile(r"^[A-Za-z]{1,12}$")
+SENSITIVE_KEY_PATTERN = re.compile(r"csrf|xsrf|token|auth|session|nonce|signature|sig$|key$|id$|_id|Id$", re.IGNORECASE)
+AUTH_SCHEME_PATTERN = re.compile(r"^(Bearer|Basic|Token|JWT)\s+", re.IGNORECASE)
+
+LITERAL_VALUES = {"true", "false", "null", "none", "undefined", "yes", "no"}
+
+# Headers that carry transport or browser metadata rather than session state
+COMMON_HEADER_NAMES = {
+    "accept",
+    "accept-encoding",
+    "accept-language",
+    "cache-control",
+    "connection",
+    "content-length",
+    "content-type",
+    "dnt",
+    "host",
+    "origin",
+    "pragma",
+    "priority",
+    "te",
+    "upgrade-insecure-requests",
+    "x-requested-with",
+}
+
+# Value features come first, then the features that depend on where the value is sent
+FEATURE_NAMES = (
+    "bias",
+    "uuid",
+    "jwt",
+    "hex",
+    "opaque_token",
+    "excess_entropy",
+    "numeric_id",
+    "short",
+    "plain_word",
+    "literal",
+    "free_text",
+    "produced_earlier",
+    "session_value",
+    "sensitive_key",
+    "recurring",
+)
+
+# Log-odds contribution of each feature, in FEATURE_NAMES order
+FEATURE_WEIGHTS = np.array([
+    -2.0,  # bias
+    5.0,   # uuid
+    5.0,   # jwt
+    3.5,   # hex
+    2.5,   # opaque_token
+    1.5,   # excess_entropy
+    0.5,   # numeric_id
+    -3.0,  # short
+    -2.5,  # plain_word
+    -4.0,  # literal
+    -2.0,  # free_text
+    3.5,   # produced_earlier
+    3.5,   # session_value
+    2.0,   # sensitive_key
+    1.0,   # recurring
+])
+
+
+class RequestValue(NamedTuple):
+    location: str
+    key: str
+    value: str
+
+
+class Classification(NamedTuple):
+    dynamic_values: List[str]
+    ambiguous_values: List[str]
+    scores: Dict[str, float]
+
+    @property
+    def confident(self) -> bool:
+        return not self.ambiguous_values
+
+
+def shannon_entropy(value: str) -> float:
+    """
+    Returns the Shannon entropy of the value in bits per character.
+    """
+    if not value:
+        return 0.0
+    counts = Counter(value)
+    length = len(value)
+    return -sum(count / length * math.log2(count / length) for count in counts.values())
+
+
+def _flatten_body(body, prefix: str = "") -> List[Tuple[str, str]]:
+    if isinstance(body, dict):
+        items = []
+        for key, value in body.items():
+            items.extend(_flatten_body(value, f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(body, list):
+        items = []
+        for index, value in enumerate(body):
+            items.extend(_flatten_body(value, f"{prefix}[{index}]"))
+        return items
+    if isinstance(body, bool) or body is None:
+        return []
+    return [(prefix, str(body))]
+
+
+def extract_request_values(request: Request) -> List[RequestValue]:
+    """
+    Lists the header, path, query and body values of a request that could be dynamic.
+    """
+    values = []
+
+    for name, value in request.headers.items():
+        if name.startswith(":") or name.lower() in COMMON_HEADER_NAMES or not value:
+            continue
+        values.append(RequestValue("header", name, AUTH_SCHEME_PATTERN.sub("", value)))
+
+    parsed_url = urlparse(request.url)
+    for segment in parsed_url.path.split("/"):
+        if segment:
+            values.append(RequestValue("path", "", segment))
+
+    query_params = request.query_params or dict(parse_qsl(parsed_url.query, keep_blank_values=True))
+    for name, value in query_params.items():
+        if value:
+            values.append(RequestValue("query", name, value))
+
+    body = request.body
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            pairs = parse_qsl(body, keep_blank_values=True)
+            body = dict(pairs) if pairs else {}
+    for key, value in _flatten_body(body):
+        if value:
+            values.append(RequestValue("body", key, value))
+
+    return values
+
+
+class DynamicValueClassifier:
+    """
+    Scores every header, path, query and body value in a HAR for how likely it is
+    to be a dynamic, server-validated value (token, ID, session variable).
+
+    Features are extracted for all values of the capture when the classifier is
+    built and scored in one matrix product, so classifying a request afterwards is
+    a lookup.
+    """
+
+    DYNAMIC_THRESHOLD = 0.85
+    STATIC_THRESHOLD = 0.15
+
+    def __init__(self, value_index: ValueIndex, session_values: Iterable[str] = ()):
+        """
+        session_values are values known to belong to the session, such as cookie values.
+        """
+        self.value_index = value_index
+        session_values = [session_value for session_value in session_values if session_value]
+
+        values_by_position = [extract_request_values(request) for request in value_index.requests]
+
+        # Number of requests each value is sent in
+        recurrence = Counter()
+        for request_values in values_by_position:
+            recurrence.update({request_value.value for request_value in request_values})
+
+        value_features: Dict[str, List[float]] = {}
+        first_producer: Dict[str, Optional[int]] = {}
+        in_session: Dict[str, bool] = {}
+        rows = []
+        row_owners = []
+
+        for position, request_values in enumerate(values_by_position):
+            for request_value in request_values:
+                value = request_value.value
+                if value not in value_features:
+                    value_features[value] = self._value_features(value)
+                    producers = (
+                        self.value_index.find_positions(value, substring_scan="never")
+                        if len(value) >= MIN_TOKEN_LENGTH
+                        else []
+                    )
+                    first_producer[value] = producers[0] if producers else None
+                    in_session[value] = len(value) >= MIN_TOKEN_LENGTH and any(
+                        value in session_value for session_value in session_values
+                    )
+
+                producer = first_producer[value]
+                rows.append(
+                    value_features[value]
+                    + [
+                        float(producer is not None and producer < position),
+                        float(in_session[value]),
+                        float(bool(request_value.key) and bool(SENSITIVE_KEY_PATTERN.search(request_value.key))),
+                        float(recurrence[value] > 1),
+                    ]
+                )
+                row_owners.append((position, request_value))
+
+        scores = self.score(np.array(rows, dtype=float)) if rows else np.zeros(0)
+
+        self._scores_by_position: List[List[Tuple[RequestValue, float]]] = [[] for _ in values_by_position]
+        for (position, request_value), score in zip(row_owners, scores):
+            self._scores_by_position[position].append((request_value, float(score)))
+
+    @staticmethod
+    def _value_features(value: str) -> List[float]:
+        """
+        Returns the features that depend only on the value, in FEATURE_NAMES order.
+        """
+        return [
+            1.0,
+            float(bool(UUID_PATTERN.match(value))),
+            float(bool(JWT_PATTERN.match(value))),
+            float(bool(HEX_PATTERN.match(value))),
+            float(
+                bool(OPAQUE_TOKEN_PATTERN.match(value))
+                and any(c.isdigit() for c in value)
+                and any(c.isalpha() for c in value)
+            ),
+            max(shannon_entropy(value) - 3.0, 0.0),
+            float(bool(NUMERIC_ID_PATTERN.match(value))),
+            float(len(value) < MIN_TOKEN_LENGTH),
+            float(bool(PLAIN_WORD_PATTERN.match(value))),
+            float(value.lower() in LITERAL_VALUES),
+            float(" " in value or "/" in value and not OPAQUE_TOKEN_PATTERN.match(value)),
+        ]
+
+    @staticmethod
+    def score(features: np.ndarray) -> np.ndarray:
+        """
+        Turns a (values x features) matrix into probabilities of being dynamic.
+        """
+        return 1.0 / (1.0 + np.exp(-(features @ FEATURE_WEIGHTS)))
+
+    def classify(self, request: Request) -> Classification:
+        """
+        Splits the values of a request into dynamic and ambiguous ones. A request whose
+        values all score outside the ambiguous band is classified with confidence.
+        """
+        position = self.value_index.positions.get(request)
+        if position is None:
+            scored_values = []
+        else:
+            scored_values = self._scores_by_position[position]
+
+        dynamic_values = []
+        ambiguous_values = []
+        scores = {}
+        for request_value, score in scored_values:
+            value = request_value.value
+            if value in scores:
+                continue
+            scores[value] = score
+            if score >= self.DYNAMIC_THRESHOLD:
+                dynamic_values.append(value)
+            elif score > self.STATIC_THRESHOLD:
+                ambiguous_values.append(value)
+
+        return Classification(dynamic_values, ambiguous_values, scores)
+
+    def guess_dynamic_values(self, request: Request) -> List[str]:
+        """
+        Returns the values of a request that are more likely dynamic than not.
+        """
+        classification = self.classify(request)
+        return [value for value, score in classification.scores.items() if score >= 0.5]
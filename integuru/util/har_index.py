@@ -0,0 +1,297 @@
+"""
+Prebuilt on-disk index of a HAR file.
+
+A HAR is compiled once into a SQLite file holding the formatted requests, the
+URL list shown to the LLM and the ValueIndex postings, plus a body blob with
+every distinct response body stored once. Later runs open the index instead of
+re-parsing the HAR: requests are read without their response bodies, bodies are
+read from the blob through a read-only ResponseStore on access, and postings are
+looked up per token.
+
+The index records the size, mtime and SHA-256 of the HAR it was built from and is
+rebuilt automatically when the HAR changes.
+
+    python -m integuru.util.har_index network_requests.har --cache-dir .har_cache
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+import click
+
+from integuru.models.request import Request
+from integuru.util.har_processing import HarData, format_har_url, format_request, format_response, iter_har_entries
+from integuru.util.response_store import ResponseStore, StoredResponse
+from integuru.util.value_index import ValueIndex
+
+# Bump when the schema, or the request/response formatting in har_processing, changes
+HAR_INDEX_VERSION = 2
+
+HASH_CHUNK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE entries (
+    position INTEGER PRIMARY KEY,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    request TEXT NOT NULL,
+    response_offset INTEGER NOT NULL,
+    response_length INTEGER NOT NULL,
+    response_type TEXT NOT NULL,
+    response_headers TEXT NOT NULL
+);
+CREATE TABLE har_urls (position INTEGER PRIMARY KEY, har_url TEXT NOT NULL);
+CREATE TABLE postings (token TEXT PRIMARY KEY, positions BLOB NOT NULL) WITHOUT ROWID;
+"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_index_path(har_file_path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Returns <har>.index next to the HAR, or a file in cache_dir named after the HAR's absolute path.
+    """
+    if cache_dir is None:
+        return f"{har_file_path}.index"
+    path_key = hashlib.sha256(os.path.abspath(har_file_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(har_file_path)}.{path_key}.index")
+
+
+class IndexPostings(Mapping):
+    """
+    ValueIndex postings read from the index one token at a time.
+    """
+
+    def __init__(self, index: "HarIndex"):
+        self.index = index
+        self._cache: Dict[str, List[int]] = {}
+
+    def __getitem__(self, token: str) -> List[int]:
+        positions = self._cache.get(token)
+        if positions is None:
+            row = self.index.query_one("SELECT positions FROM postings WHERE token = ?", (token,))
+            if row is None:
+                raise KeyError(token)
+            positions = array("I", row[0]).tolist()
+            self._cache[token] = positions
+        return positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([row[0] for row in self.index.query_all("SELECT token FROM postings")])
+
+    def __len__(self) -> int:
+        return self.index.query_one("SELECT COUNT(*) FROM postings")[0]
+
+
+class HarIndex:
+    """
+    An open HAR index. Use HarIndex.open() to get an up to date index for a HAR
+    file, building or rebuilding it as needed.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(f"file:{os.path.abspath(index_path)}?mode=ro", uri=True, check_same_thread=False)
+        self.meta: Dict[str, str] = dict(self._connection.execute("SELECT key, value FROM meta"))
+        blob_path = os.path.join(os.path.dirname(os.path.abspath(index_path)), self.meta["blob"])
+        self.store = ResponseStore(blob_path, read_only=True)
+        self.postings = IndexPostings(self)
+
+    def query_one(self, sql: str, parameters: Tuple = ()) -> Optional[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchone()
+
+    def query_all(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def is_current(self, har_file_path: str) -> bool:
+        """
+        Returns whether the index was built from the HAR as it is now. The content
+        hash is only computed when the size matches but the mtime does not.
+        """
+        if self.meta.get("version") != str(HAR_INDEX_VERSION):
+            return False
+        stat = os.stat(har_file_path)
+        if str(stat.st_size) != self.meta["source_size"]:
+            return False
+        if str(stat.st_mtime_ns) == self.meta["source_mtime_ns"]:
+            return True
+        return file_sha256(har_file_path) == self.meta["source_sha256"]
+
+    def load(self) -> HarData:
+        """
+        Returns the same HarData as load_har, with every response body left in the blob.
+        """
+        req_res_dict = {}
+        url_to_req_res_dict = {}
+        rows = self.query_all(
+            "SELECT method, url, request, response_offset, response_length, response_type, response_headers "
+            "FROM entries ORDER BY position"
+        )
+        for method, url, request_fields, offset, length, mime_type, response_headers in rows:
+            headers, query_params, body, (fingerprint_method, normalized_url, params, body_hash) = json.loads(request_fields)
+            fingerprint = (fingerprint_method, normalized_url, tuple(map(tuple, params)), body_hash)
+            request = Request(method, url, headers, query_params, body, fingerprint=fingerprint)
+            response = StoredResponse(self.store, offset, length, mime_type, json.loads(response_headers))
+            # As in load_har, the first of repeated identical calls keeps its response
+            response = req_res_dict.setdefault(request, response)
+            url_to_req_res_dict[request.url] = {"request": request, "response": response}
+
+        har_urls = [tuple(json.loads(row[0])) for row in self.query_all("SELECT har_url FROM har_urls ORDER BY position")]
+        return HarData(req_res_dict, url_to_req_res_dict, har_urls)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+        self.store.close()
+
+    @classmethod
+    def build(cls, har_file_path: str, index_path: str) -> "HarIndex":
+        """
+        Compiles the HAR into index_path and a body blob next to it, replacing any previous index.
+        """
+        start = time.perf_counter()
+        source_sha256 = file_sha256(har_file_path)
+        stat = os.stat(har_file_path)
+        directory = os.path.dirname(os.path.abspath(index_path))
+        os.makedirs(directory, exist_ok=True)
+
+        # The blob is named after the HAR content, so a concurrent build of the same HAR writes identical bytes
+        blob_name = f"{os.path.basename(index_path)}.{source_sha256[:16]}.bodies"
+        temporary_blob = os.path.join(directory, f"{blob_name}.{os.getpid()}.tmp")
+        temporary_index = f"{index_path}.{os.getpid()}.tmp"
+
+        store = ResponseStore(temporary_blob, spill_threshold=0)
+        bodies: Dict[bytes, StoredResponse] = {}
+        entries = []
+        har_urls = []
+        req_res_dict = {}
+        for entry in iter_har_entries(har_file_path):
+            request = format_request(entry.get("request", {}))
+            response = format_response(entry.get("response", {}))
+            text = response["text"] or ""
+            digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+            stored = bodies.get(digest)
+            if stored is None:
+                stored = bodies[digest] = store.add(text, response["type"])
+            stored = StoredResponse(store, stored.offset, stored.length, response["type"], response["headers"])
+            req_res_dict.setdefault(request, stored)
+            entries.append(
+                (
+                    len(entries),
+                    request.method,
+                    request.url,
+                    json.dumps(
+                        [
+                            dict(request.headers),
+                            dict(request.query_params) if request.query_params is not None else None,
+                            request.body,
+                            request.fingerprint,
+                        ]
+                    ),
+                    stored.offset,
+                    stored.length,
+                    stored.type,
+                    json.dumps(stored.headers),
+                )
+            )
+            har_url = format_har_url(entry)
+            if har_url:
+                har_urls.append((len(har_urls), json.dumps(har_url)))
+
+        postings = ValueIndex(req_res_dict).postings
+        store.close()
+
+        if os.path.exists(temporary_index):
+            os.remove(temporary_index)
+        connection = sqlite3.connect(temporary_index)
+        try:
+            connection.executescript(SCHEMA)
+            meta = {
+                "version": str(HAR_INDEX_VERSION),
+                "source_path": os.path.abspath(har_file_path),
+                "source_size": str(stat.st_size),
+                "source_mtime_ns": str(stat.st_mtime_ns),
+                "source_sha256": source_sha256,
+                "blob": blob_name,
+                "entries": str(len(entries)),
+                "bodies": str(len(bodies)),
+            }
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+            connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entries)
+            connection.executemany("INSERT INTO har_urls VALUES (?, ?)", har_urls)
+            connection.executemany(
+                "INSERT INTO postings VALUES (?, ?)",
+                ((token, array("I", positions).tobytes()) for token, positions in postings.items()),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(temporary_blob, os.path.join(directory, blob_name))
+        os.replace(temporary_index, index_path)
+        cls._remove_stale_blobs(index_path, blob_name)
+        print(
+            f"Indexed {har_file_path}: {len(entries)} entries, {len(bodies)} distinct bodies "
+            f"in {time.perf_counter() - start:.2f}s",
+            flush=True,
+        )
+        return cls(index_path)
+
+    @staticmethod
+    def _remove_stale_blobs(index_path: str, blob_name: str) -> None:
+        directory = os.path.dirname(os.path.abspath(index_path))
+        prefix = f"{os.path.basename(index_path)}."
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith(".bodies") and name != blob_name:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    @classmethod
+    def open(cls, har_file_path: str, index_path: Optional[str] = None, cache_dir: Optional[str] = None) -> "HarIndex":
+        """
+        Opens the index of the HAR, building it first if it is missing or out of date.
+        """
+        index_path = index_path or default_index_path(har_file_path, cache_dir)
+        if os.path.exists(index_path):
+            try:
+                index = cls(index_path)
+            except (sqlite3.Error, KeyError, OSError):
+                index = None
+            if index is not None:
+                if index.is_current(har_file_path):
+                    return index
+                index.close()
+        return cls.build(har_file_path, index_path)
+
+
+@click.command()
+@click.argument("har_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--index", "index_path", default=None, help="Index file to write (default is <har>.index, or a file in --cache-dir)")
+@click.option("--cache-dir", default=None, help="Directory of HAR indexes, as passed to --har-cache")
+@click.option("--force", is_flag=True, default=False, help="Rebuild even if the index is up to date")
+def main(har_path, index_path, cache_dir, force):
+    index_path = index_path or default_index_path(har_path, cache_dir)
+    index = HarIndex.build(har_path, index_path) if force else HarIndex.open(har_path, index_path)
+    print(f"{index_path}: {index.meta['entries']} entries, {index.meta['bodies']} distinct bodies", flush=True)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
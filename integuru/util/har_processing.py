@@ -1,8 +1,12 @@
+import gzip
+import io
 import json
 import os
+import re
 from urllib.parse import urlparse
 from integuru.models.request import Request
-from typing import Tuple, Dict, Optional, Any, List
+from integuru.util.response_store import ResponseStore
+from typing import IO, Iterator, NamedTuple, Tuple, Dict, Optional, Any, List
 
 excluded_keywords = (
     "google",
@@ -78,36 +82,272 @@ def format_request(har_request: Dict[str, Any]) -> Request:
     )
 
 
-def format_response(har_response: Dict[str, Any]) -> Dict[str, str]:
+# Response headers that tell how long the values in a response stay valid
+LIFETIME_HEADERS = ("cache-control", "expires", "date", "age", "set-cookie")
+
+def format_response(har_response: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Extracts and returns the content text and content type from a HAR response.
+    Extracts and returns the content text and content type from a HAR response,
+    with its LIFETIME_HEADERS (lower-cased, repeated headers joined by newlines).
     """
     content = har_response.get("content", {})
+    headers: Dict[str, str] = {}
+    for header in har_response.get("headers", []):
+        name = header.get("name", "").lower()
+        if name in LIFETIME_HEADERS:
+            headers[name] = f"{headers[name]}\n{header.get('value', '')}" if name in headers else header.get("value", "")
+
+    if "set-cookie" not in headers:
+        # Browsers often leave Set-Cookie out of HAR headers but still list the cookies it set
+        set_cookies = [
+            f"{cookie['name']}={cookie.get('value', '')}; Expires={cookie['expires']}"
+            for cookie in har_response.get("cookies", [])
+            if cookie.get("name") and cookie.get("expires")
+        ]
+        if set_cookies:
+            headers["set-cookie"] = "\n".join(set_cookies)
+
     return {
         "text": content.get("text", ""),
-        "type": content.get("mimeType", "")
+        "type": content.get("mimeType", ""),
+        "headers": headers,
     }
 
 
-def parse_har_file(har_file_path: str) -> Dict[Request, Dict[str, str]]:
+excluded_extensions = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".svg",
+    ".ico",  # Image files
+    ".css",  # Stylesheets
+    # ".js",
+    # ".map",  # JavaScript files
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".otf",
+    ".eot",  # Font files
+    ".mp3",
+    ".mp4",
+    ".wav",
+    ".avi",
+    ".mov",
+    ".flv",
+    ".wmv",
+    ".webm",  # Media files
+    # ".pdf",
+    # ".zip",
+    ".rar",
+    ".7z",
+    ".tar",
+    ".gz",
+    ".exe",
+    ".dmg",  # Other non-text files
+)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Tokens needed to walk the HAR structure up to log.entries
+_STRUCTURE_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}\[\]:,])|\s+|[^"{}\[\]:,\s]+')
+_ENTRY_SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+
+
+class HarData(NamedTuple):
+    req_to_res_map: Dict[Request, Dict[str, str]]
+    url_to_req_res_map: Dict[str, Dict[str, Any]]
+    har_urls: List[Tuple[str, str, str, str]]
+
+
+def open_har_file(har_file_path: str) -> IO[str]:
     """
-    Parses the HAR file and returns a dictionary mapping Request objects to response dictionaries.
+    Opens a plain, gzip- or zstd-compressed HAR file as a text stream.
+    """
+    with open(har_file_path, "rb") as file:
+        magic = file.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(har_file_path, "rt", encoding="utf-8")
+
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "Reading .har.zst files requires the zstandard package (pip install zstandard)"
+            ) from e
+        raw = open(har_file_path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+
+    return open(har_file_path, "r", encoding="utf-8")
+
+
+def _seek_entries_array(stream: IO[str], chunk_size: int) -> Optional[str]:
+    """
+    Reads the stream up to the opening bracket of log.entries and returns the
+    unread remainder of the buffer, or None if the HAR has no entries.
+    """
+    buffer = ""
+    position = 0
+    at_eof = False
+    depth = 0
+    keys: Dict[int, Optional[str]] = {}
+    last_string: Optional[str] = None
+
+    while True:
+        match = _STRUCTURE_PATTERN.match(buffer, position)
+        if match is None or (match.end() == len(buffer) and not at_eof):
+            if at_eof:
+                return None
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                at_eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        position = match.end()
+        string, structural = match.group(1), match.group(2)
+
+        if string is not None:
+            last_string = string
+        elif structural == ":":
+            keys[depth] = last_string
+        elif structural in ("{", "["):
+            if structural == "[" and depth == 2 and keys.get(1) == "log" and keys.get(2) == "entries":
+                return buffer[position:]
+            depth += 1
+            keys[depth] = None
+        elif structural in ("}", "]"):
+            depth -= 1
+        elif structural == ",":
+            last_string = None
+
+
+def iter_har_entries(har_file_path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the entries of a HAR file one at a time without loading the whole
+    document, so memory stays bounded by the largest single entry.
+    """
+    decoder = json.JSONDecoder()
+
+    with open_har_file(har_file_path) as stream:
+        buffer = _seek_entries_array(stream, chunk_size)
+        if buffer is None:
+            return
+
+        position = 0
+        read_size = chunk_size
+        while True:
+            position = _ENTRY_SEPARATOR_PATTERN.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Incomplete entry", buffer, position)
+                entry, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = stream.read(read_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                # Grow reads geometrically so very large entries are not re-parsed once per chunk
+                read_size = max(read_size, len(buffer))
+                continue
+
+            yield entry
+            position = end
+            read_size = chunk_size
+            if position > chunk_size:
+                buffer = buffer[position:]
+                position = 0
+
+
+def format_har_url(entry: Dict[str, Any]) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Returns the (method, URL, response format, response preview) tuple shown to the LLM
+    for a HAR entry, or None if the entry is filtered out.
+    """
+    request = entry.get("request", {})
+    response = entry.get("response", {})
+    url = request.get("url")
+    method = request.get("method", "GET")  # Default to 'GET' if method is missing
+    response_format = response.get("content", {}).get("mimeType", "")
+    response_text = response.get("content", {}).get("text", "")
+    response_preview = response_text[:30] if response_text else ""
+
+    if not url:
+        return None
+
+    parsed_url = urlparse(url)
+    path = parsed_url.path.lower()
+
+    _, extension = os.path.splitext(path)
+
+    request_text = url.lower()
+
+    headers = request.get("headers", [])
+    for header in headers:
+        request_text += header.get("name", "").lower()
+        request_text += header.get("value", "").lower()
+
+    postData = request.get("postData", {}).get("text", "").lower()
+    request_text += postData
+
+    # Exclude URLs with the specified extensions or if keywords are in the request
+    # this is done to reduce the number of requests we send to the LLM
+    if extension in excluded_extensions or any(
+        keyword.lower() in request_text for keyword in excluded_keywords
+    ):
+        return None
+
+    return (method, url, response_format, response_preview)
+
+
+def load_har(har_file_path: str, response_store: Optional[ResponseStore] = None) -> HarData:
+    """
+    Streams the HAR file once and builds the request/response map, the URL map
+    and the list of URLs shown to the LLM. With a response_store, large bodies
+    are kept on disk instead of in memory.
     """
     req_res_dict = {}
+    url_to_req_res_dict = {}
+    urls_with_details = []
 
-    with open(har_file_path, 'r', encoding='utf-8') as file:
-        har_data = json.load(file)
+    for entry in iter_har_entries(har_file_path):
+        formatted_request = format_request(entry.get("request", {}))
+        response_dict = format_response(entry.get("response", {}))
+        if response_store is not None and formatted_request not in req_res_dict:
+            response_dict = response_store.add(response_dict["text"], response_dict["type"], response_dict["headers"])
+
+        # Repeated identical calls share a key: keep the first call with its own response
+        response_dict = req_res_dict.setdefault(formatted_request, response_dict)
+        url_to_req_res_dict[formatted_request.url] = {
+            'request': formatted_request,
+            'response': response_dict
+        }
+
+        url_details = format_har_url(entry)
+        if url_details:
+            urls_with_details.append(url_details)
 
-    entries = har_data.get("log", {}).get("entries", [])
+    return HarData(req_res_dict, url_to_req_res_dict, urls_with_details)
 
-    for entry in entries:
-        request_data = entry.get("request", {})
-        response_data = entry.get("response", {})
 
-        formatted_request = format_request(request_data)
-        response_dict = format_response(response_data)
+def parse_har_file(har_file_path: str) -> Dict[Request, Dict[str, str]]:
+    """
+    Parses the HAR file and returns a dictionary mapping Request objects to response dictionaries.
+    """
+    req_res_dict = {}
 
-        req_res_dict[formatted_request] = response_dict
+    for entry in iter_har_entries(har_file_path):
+        formatted_request = format_request(entry.get("request", {}))
+        req_res_dict.setdefault(formatted_request, format_response(entry.get("response", {})))
 
     return req_res_dict
 
@@ -134,81 +374,12 @@ def get_har_urls(har_file_path: str) -> List[Tuple[str, str, str, str]]:
     Extracts and returns a list of tuples containing method, URL, response format, and response preview
     from a HAR file, excluding certain file types and keywords.
     """
-    # List to store tuples of URLs, request methods, response file formats, and response preview
     urls_with_details = []
 
-    # Define a tuple of file extensions to exclude
-    excluded_extensions = (
-        ".png",
-        ".jpg",
-        ".jpeg",
-        ".gif",
-        ".webp",
-        ".svg",
-        ".ico",  # Image files
-        ".css",  # Stylesheets
-        # ".js",
-        # ".map",  # JavaScript files
-        ".woff",
-        ".woff2",
-        ".ttf",
-        ".otf",
-        ".eot",  # Font files
-        ".mp3",
-        ".mp4",
-        ".wav",
-        ".avi",
-        ".mov",
-        ".flv",
-        ".wmv",
-        ".webm",  # Media files
-        # ".pdf",
-        # ".zip",
-        ".rar",
-        ".7z",
-        ".tar",
-        ".gz",
-        ".exe",
-        ".dmg",  # Other non-text files
-    )
-
-    # Read the HAR file
-    with open(har_file_path, "r", encoding="utf-8") as file:
-        har_data = json.load(file)
-
-    # Extract entries from the HAR data
-    entries = har_data.get("log", {}).get("entries", [])   
-    for entry in entries:
-        request = entry.get("request", {})
-        response = entry.get("response", {})
-        url = request.get("url")
-        method = request.get("method", "GET")  # Default to 'GET' if method is missing
-        response_format = response.get("content", {}).get("mimeType", "")
-        response_text = response.get("content", {}).get("text", "")
-        response_preview = response_text[:30] if response_text else ""
-
-        if url:
-            parsed_url = urlparse(url)
-            path = parsed_url.path.lower()
-
-            _, extension = os.path.splitext(path)
-
-            request_text = url.lower()
-
-            headers = request.get("headers", [])
-            for header in headers:
-                request_text += header.get("name", "").lower()
-                request_text += header.get("value", "").lower()
-
-            postData = request.get("postData", {}).get("text", "").lower()
-            request_text += postData
-
-            # Exclude URLs with the specified extensions or if keywords are in the request
-            # this is done to reduce the number of requests we send to the LLM
-            if extension not in excluded_extensions and not any(
-                keyword.lower() in request_text for keyword in excluded_keywords
-            ):
-                urls_with_details.append((method, url, response_format, response_preview))
+    for entry in iter_har_entries(har_file_path):
+        url_details = format_har_url(entry)
+        if url_details:
+            urls_with_details.append(url_details)
 
     return urls_with_details
     
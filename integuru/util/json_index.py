@@ -0,0 +1,157 @@
+import gc
+import json
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# A path is stored as a (parent, key) chain so that siblings share their prefix
+# instead of each copying it; it is only turned into a list when returned
+PathNode = Optional[Tuple["PathNode", Any]]
+
+# A scalar value and the path it was found at
+Leaf = Tuple[PathNode, Any]
+
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+# Separates string values in the haystack used for embedded matches
+HAYSTACK_SEPARATOR = "\x00"
+
+DEFAULT_CACHE_SIZE = 16
+
+
+def materialize(node: PathNode) -> List[Any]:
+    keys = []
+    while node is not None:
+        node, key = node
+        keys.append(key)
+    keys.reverse()
+    return keys
+
+
+class JsonValueIndex:
+    """
+    A JSON document flattened once into a map from scalar values to the paths
+    where they occur, in document order.
+
+    find() returns a {'key_path', 'value'} entry for every leaf equal to the
+    target, in O(1) per value. When there is no exact match it
+    falls back to values whose JSON text equals the target (e.g. "42" for 42)
+    and then to string values that contain the target, marked with 'match'.
+    """
+
+    def __init__(self, document: Any):
+        self.document = document
+        self.leaves: List[Leaf] = []
+        self.by_value: Dict[Hashable, List[Leaf]] = {}
+        self._by_text: Optional[Dict[str, List[Leaf]]] = None
+        self._haystack: Optional[str] = None
+
+        # The walk allocates a few tuples per value and none of them can form a cycle,
+        # so the cyclic GC is paused instead of rescanning them over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._flatten(document)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _flatten(self, document: Any) -> None:
+        # Pre-order walk without recursion, so deeply nested documents are fine
+        stack: List[Tuple[Any, PathNode]] = [(document, None)]
+        while stack:
+            value, node = stack.pop()
+            if isinstance(value, dict):
+                # Children are pushed in reverse so they are visited in document order
+                stack.extend(reversed([(child, (node, key)) for key, child in value.items()]))
+            elif isinstance(value, list):
+                stack.extend(reversed([(child, (node, position)) for position, child in enumerate(value)]))
+            elif isinstance(value, SCALAR_TYPES) and node is not None:
+                leaf = (node, value)
+                self.leaves.append(leaf)
+                self.by_value.setdefault(value, []).append(leaf)
+
+    @property
+    def by_text(self) -> Dict[str, List[Leaf]]:
+        """
+        Non-string scalars by their JSON text, built on first use.
+        """
+        if self._by_text is None:
+            self._by_text = {}
+            for leaf in self.leaves:
+                if not isinstance(leaf[1], str):
+                    self._by_text.setdefault(json.dumps(leaf[1]), []).append(leaf)
+        return self._by_text
+
+    def _build_haystack(self) -> None:
+        # All string values joined into one string, so an embedded search is a few str.find calls
+        self._string_leaves = [leaf for leaf in self.leaves if isinstance(leaf[1], str)]
+        self._starts: List[int] = []
+        offset = 0
+        for _, string in self._string_leaves:
+            self._starts.append(offset)
+            offset += len(string) + len(HAYSTACK_SEPARATOR)
+        self._haystack = HAYSTACK_SEPARATOR.join(string for _, string in self._string_leaves)
+
+    @classmethod
+    def from_text(cls, text: str) -> Optional["JsonValueIndex"]:
+        """
+        Returns the index of a JSON text, or None if it is not valid JSON.
+        """
+        try:
+            return cls(json.loads(text))
+        except (TypeError, ValueError):
+            return None
+
+    def _entries(self, leaves: List[Leaf], match: Optional[str] = None) -> List[Dict[str, Any]]:
+        entries = []
+        for node, value in leaves:
+            entry = {"key_path": materialize(node), "value": value}
+            if match is not None:
+                entry["match"] = match
+            entries.append(entry)
+        return entries
+
+    def find_exact(self, target: Any) -> List[Dict[str, Any]]:
+        if not isinstance(target, SCALAR_TYPES):
+            return []
+        # 1, 1.0 and True share a dict key, so they match each other as they do under ==
+        return self._entries(self.by_value.get(target, []))
+
+    def find_embedded(self, target: str) -> List[Dict[str, Any]]:
+        """
+        Returns the string values that contain target, each once, in document order.
+        """
+        if not target or HAYSTACK_SEPARATOR in target:
+            return []
+        if self._haystack is None:
+            self._build_haystack()
+        leaves = []
+        position = self._haystack.find(target)
+        while position != -1:
+            leaf = bisect_right(self._starts, position) - 1
+            leaves.append(self._string_leaves[leaf])
+            if leaf + 1 >= len(self._starts):
+                break
+            position = self._haystack.find(target, self._starts[leaf + 1])
+        return self._entries(leaves, match="embedded")
+
+    def find(self, target: Any) -> List[Dict[str, Any]]:
+        """
+        Returns the paths of target: exact matches, else matches of its JSON text, else embedded matches.
+        """
+        entries = self.find_exact(target)
+        if entries or not isinstance(target, str):
+            return entries
+        entries = self._entries(self.by_text.get(target, []), match="text")
+        if entries:
+            return entries
+        return self.find_embedded(target)
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def json_value_index(text: str) -> Optional[JsonValueIndex]:
+    """
+    Returns the (cached) index of a JSON response body, or None if it is not valid JSON.
+    """
+    return JsonValueIndex.from_text(text)
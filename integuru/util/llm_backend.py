@@ -0,0 +1,115 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from langchain_core.messages import BaseMessage
+from langchain_openai import ChatOpenAI
+
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_MAX_CONNECTIONS = 64
+# Retries with backoff are handled by LLMScheduler
+DEFAULT_MAX_RETRIES = 0
+
+
+class LLMBackend:
+    """
+    Builds the chat models used by LLMSingleton. One chat model is kept per
+    model name so that switching models does not rebuild clients.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def create_chat_model(self, model: str) -> Any:
+        raise NotImplementedError
+
+    def chat_model(self, model: str) -> Any:
+        """
+        Returns the chat model for the model name, creating it on first use.
+        """
+        with self._lock:
+            chat_model = self._models.get(model)
+            if chat_model is None:
+                chat_model = self.create_chat_model(model)
+                self._models[model] = chat_model
+            return chat_model
+
+    def invoke(self, model: str, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return self.chat_model(model).invoke(prompt, **kwargs)
+
+    async def ainvoke(self, model: str, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return await self.chat_model(model).ainvoke(prompt, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    async def aclose(self) -> None:
+        self.close()
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI-compatible backend. Every model shares one pooled sync and one async
+    HTTP client, pointed at base_url (the OpenAI API by default, or e.g. the
+    stub server in integuru.util.stub_llm_server).
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        api_key: Optional[str] = None,
+        temperature: float = 1,
+    ):
+        super().__init__()
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.temperature = temperature
+        # A local stand-in server does not check the key, but the client refuses to start without one
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY") or ("unused" if self.base_url else None)
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._closing: Optional[asyncio.Task] = None
+
+    def create_chat_model(self, model: str) -> ChatOpenAI:
+        options: Dict[str, Any] = {
+            "model": model,
+            "temperature": self.temperature,
+            "timeout": self.timeout,
+            "max_retries": self.max_retries,
+            "http_client": self.http_client,
+            "http_async_client": self.http_async_client,
+        }
+        if self.base_url:
+            options["base_url"] = self.base_url
+        if self.api_key:
+            options["api_key"] = self.api_key
+        return ChatOpenAI(**options)
+
+    def close(self) -> None:
+        """
+        Closes both pooled clients. From inside a running event loop the async
+        client is closed in a task on that loop; prefer awaiting aclose() there.
+        """
+        super().close()
+        self.http_client.close()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.http_async_client.aclose())
+        else:
+            self._closing = loop.create_task(self.http_async_client.aclose())
+
+    async def aclose(self) -> None:
+        LLMBackend.close(self)
+        self.http_client.close()
+        await self.http_async_client.aclose()
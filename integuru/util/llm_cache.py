@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache of LLM responses backed by SQLite.
+
+    Entries are keyed by a hash of the model, prompt, function schema and
+    temperature. Expired entries are dropped on read and the least recently
+    used entries are evicted once the entry or byte budget is exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        read_only: bool = False,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        uri = f"file:{os.path.abspath(path)}{'?mode=ro' if read_only else ''}"
+        self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+        if not read_only:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: Any,
+        temperature: Optional[float] = None,
+        **invoke_kwargs: Any,
+    ) -> str:
+        """
+        Returns the cache key for a call, covering the model, prompt, function
+        schema (functions/function_call) and temperature.
+        """
+        if isinstance(prompt, BaseMessage):
+            prompt = message_to_dict(prompt)
+        elif isinstance(prompt, list):
+            prompt = [message_to_dict(m) if isinstance(m, BaseMessage) else m for m in prompt]
+
+        material = json.dumps(
+            {
+                "model": model,
+                "prompt": prompt,
+                "temperature": temperature,
+                "kwargs": invoke_kwargs,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[BaseMessage]:
+        """
+        Returns the cached message for the key, or None on a miss.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            payload, created_at = row
+            now = time.time()
+            if self.ttl is not None and now - created_at > self.ttl:
+                if not self.read_only:
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._connection.commit()
+                self.misses += 1
+                return None
+
+            if not self.read_only:
+                self._connection.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._connection.commit()
+
+            self.hits += 1
+
+        return messages_from_dict([json.loads(payload)])[0]
+
+    def put(self, key: str, model: str, message: BaseMessage) -> None:
+        """
+        Stores a message under the key and evicts entries over budget.
+        """
+        if self.read_only:
+            return
+
+        payload = json.dumps(message_to_dict(message))
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, payload, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, payload, len(payload), now, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            self._connection.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+
+        if self.max_entries is not None:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+        if self.max_bytes is not None:
+            total = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._connection.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ).fetchall()
+                evicted = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def get_or_compute(self, key: str, model: str, compute: Callable[[], BaseMessage]) -> BaseMessage:
+        """
+        Returns the cached message for the key, computing and storing it on a miss.
+        Concurrent calls with the same key wait for a single computation.
+        """
+        return self.get_or_compute_with_status(key, model, compute)[0]
+
+    def get_or_compute_with_status(
+        self, key: str, model: str, compute: Callable[[], BaseMessage]
+    ) -> Tuple[BaseMessage, str]:
+        """
+        Same as get_or_compute, but also returns how the message was obtained:
+        "hit", "miss" or "coalesced".
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "hit"
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result(), "coalesced"
+
+        try:
+            message = compute()
+            self.put(key, model, message)
+            future.set_result(message)
+            return message, "miss"
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss counters and the number of stored entries.
+        Coalesced calls are misses that waited on an identical in-flight call.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class CachedChatModel:
+    """
+    Wraps a chat model so that invoke() goes through an LLMCache.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, cache: LLMCache):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def model_identifier(self) -> str:
+        return getattr(self.model, "model_name", None) or getattr(self.model, "model", "") or ""
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return self.invoke_with_status(prompt, **kwargs)[0]
+
+    def invoke_with_status(self, prompt: Any, **kwargs: Any) -> Tuple[BaseMessage, str]:
+        model_name = self.model_identifier
+        key = LLMCache.make_key(
+            model_name,
+            prompt,
+            temperature=getattr(self.model, "temperature", None),
+            **kwargs,
+        )
+        return self.cache.get_or_compute_with_status(key, model_name, lambda: self.model.invoke(prompt, **kwargs))
+
+    async def ainvoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return (await self.ainvoke_with_status(prompt, **kwargs))[0]
+
+    async def ainvoke_with_status(self, prompt: Any, **kwargs: Any) -> Tuple[BaseMessage, str]:
+        """
+        Async variant of invoke_with_status. Identical in-flight calls are not coalesced.
+        """
+        model_name = self.model_identifier
+        key = LLMCache.make_key(
+            model_name,
+            prompt,
+            temperature=getattr(self.model, "temperature", None),
+            **kwargs,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+        message = await self.model.ainvoke(prompt, **kwargs)
+        self.cache.put(key, model_name, message)
+        return message, "miss"
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
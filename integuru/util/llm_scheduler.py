@@ -0,0 +1,292 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from openai import APIConnectionError
+
+from integuru.util.tracing import token_usage, tracer
+
+# Lower values are admitted first when calls are waiting
+LANES = {"analysis": 0, "codegen": 1}
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Completion tokens assumed for a call before its real usage is known
+ESTIMATED_COMPLETION_TOKENS = 512
+
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("integuru_llm_lane", default="analysis")
+
+
+class TokenBucket:
+    """
+    Refills at per_minute / 60 units per second up to per_minute units.
+    The level may go negative when a call uses more than was reserved for it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """
+        Returns the seconds until amount can be taken (0 if it can be taken now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+def estimate_tokens(prompt: Any, **kwargs: Any) -> int:
+    """
+    Rough token count of a call (4 characters per token) plus a completion allowance.
+    """
+    text = prompt if isinstance(prompt, str) else json.dumps(prompt, default=str)
+    schema = json.dumps(kwargs.get("functions") or kwargs.get("tools") or [], default=str)
+    return (len(text) + len(schema)) // 4 + kwargs.get("max_tokens", ESTIMATED_COMPLETION_TOKENS)
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls under a requests-per-minute and a tokens-per-minute token
+    bucket and a concurrency cap, and retries 429s, 5xx responses and
+    connection errors with jittered exponential backoff.
+
+    Waiting calls are admitted by lane ("analysis" before "codegen", see lane())
+    and then in arrival order. All limits are off by default.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.calls_by_lane: Dict[str, int] = {lane: 0 for lane in LANES}
+
+    @staticmethod
+    @contextmanager
+    def lane(name: str) -> Iterator[None]:
+        """
+        Runs the LLM calls made inside the block (and in copies of its context) in the given lane.
+        """
+        if name not in LANES:
+            raise ValueError(f"Unknown LLM lane {name!r}, expected one of {tuple(LANES)}")
+        token = _current_lane.set(name)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    def _delay(self, tokens: int) -> float:
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.delay(tokens))
+        return max(delays)
+
+    def _acquire(self, lane: str, tokens: int) -> float:
+        """
+        Blocks until the call may start, reserves its request and tokens and returns the seconds waited.
+        """
+        start = time.monotonic()
+        with self._condition:
+            ticket = (LANES[lane], next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+            try:
+                while True:
+                    at_head = self._waiting[0] == ticket
+                    has_slot = self.max_concurrency is None or self._in_flight < self.max_concurrency
+                    if at_head and has_slot:
+                        delay = self._delay(tokens)
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            self._in_flight += 1
+            self.calls += 1
+            self.calls_by_lane[lane] += 1
+            waited = time.monotonic() - start
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self._condition.notify_all()
+        return waited
+
+    def _release(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if self.tokens is not None and used_tokens is not None:
+                # Settle the reservation against the real usage
+                if used_tokens < reserved_tokens:
+                    self.tokens.refund(reserved_tokens - used_tokens)
+                else:
+                    self.tokens.consume(used_tokens - reserved_tokens)
+            self._condition.notify_all()
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        Returns the seconds to wait before retrying after error, or None if it should not be retried.
+        """
+        status = getattr(error, "status_code", None)
+        retryable = status == 429 or (status is not None and status >= 500) or isinstance(error, APIConnectionError)
+        if not retryable or attempt >= self.max_retries:
+            return None
+        if status == 429:
+            with self._condition:
+                self.rate_limited += 1
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    def _record(self, waited: float, attempts: int) -> None:
+        span = tracer.current()
+        if span is not None:
+            span.set(queue_wait_ms=waited * 1e3, retries=attempts, lane=_current_lane.get())
+
+    def run(self, call: Callable[[], BaseMessage], tokens: int) -> BaseMessage:
+        """
+        Runs call once admitted, retrying retryable errors.
+        """
+        lane = _current_lane.get()
+        waited = 0.0
+        for attempt in itertools.count():
+            waited += self._acquire(lane, tokens)
+            try:
+                message = call()
+            except Exception as e:
+                self._release(tokens, None)
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                with self._condition:
+                    self.retries += 1
+                print(f"LLM call failed with {type(e).__name__}, retrying in {delay:.1f}s", flush=True)
+                time.sleep(delay)
+                continue
+            self._release(tokens, sum(token_usage(message)) or None)
+            self._record(waited, attempt)
+            return message
+
+    async def arun(self, call: Callable[[], Awaitable[BaseMessage]], tokens: int) -> BaseMessage:
+        """
+        Async variant of run; waiting for admission happens on a worker thread.
+        """
+        lane = _current_lane.get()
+        waited = 0.0
+        for attempt in itertools.count():
+            waited += await asyncio.to_thread(self._acquire, lane, tokens)
+            try:
+                message = await call()
+            except Exception as e:
+                self._release(tokens, None)
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                with self._condition:
+                    self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self._release(tokens, sum(token_usage(message)) or None)
+            self._record(waited, attempt)
+            return message
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns queue depth, in-flight calls, retry counts and wait times.
+        """
+        with self._condition:
+            return {
+                "calls": self.calls,
+                "calls_by_lane": dict(self.calls_by_lane),
+                "queue_depth": len(self._waiting),
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self._in_flight,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "wait_seconds_total": round(self.wait_seconds_total, 3),
+                "wait_seconds_max": round(self.wait_seconds_max, 3),
+            }
+
+
+class ScheduledChatModel:
+    """
+    Wraps a chat model so that invoke() and ainvoke() go through an LLMScheduler.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, scheduler: LLMScheduler):
+        self.model = model
+        self.scheduler = scheduler
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return self.scheduler.run(lambda: self.model.invoke(prompt, **kwargs), estimate_tokens(prompt, **kwargs))
+
+    async def ainvoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        return await self.scheduler.arun(lambda: self.model.ainvoke(prompt, **kwargs), estimate_tokens(prompt, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
@@ -0,0 +1,365 @@
+"""
+Declarative execution plans.
+
+A plan is the finished DAG as JSON: one step per request or cookie in dependency
+order. A request step holds the captured request as a template in which every
+dynamic part is a named placeholder, the bindings that fill the placeholders
+from earlier steps or input variables, and the rules that extract the values
+later steps need from its response:
+
+    {
+        "version": 2,
+        "input_variables": {"year": "2024"},
+        "result": "get_bills",
+        "steps": [
+            {"id": "cookie_sessionid", "type": "cookie", "depends_on": [], "cookie": "sessionid", "name": "sessionid"},
+            {"id": "post_api_login", "type": "request", "depends_on": [],
+             "request": {"method": "POST", "url": "https://ex.com/api/login", "headers": {...}, "json": {...}},
+             "bindings": {}, "extract": [{"name": "token", "json_path": ["data", "token"]}]},
+            {"id": "get_bills", "type": "request", "depends_on": ["cookie_sessionid", "post_api_login"],
+             "request": {"method": "GET", "url": "https://ex.com/bills?year={{year}}",
+                         "headers": {"Authorization": "Bearer {{token}}"}},
+             "bindings": {"token": {"step": "post_api_login"}, "year": {"input": "year"}},
+             "extract": [], "output": {"type": "file", "extension": ".pdf"}}
+        ]
+    }
+
+Placeholders are {{name}} inside text, or {"$param": name} in place of a
+non-string JSON value, which is filled with the value itself. A plan holds no
+captured tokens or cookies: the cookies are supplied when it is run.
+
+Extraction rules are a JSON key path or a regex whose first group is the value.
+Steps other than the result may have a "ttl": the seconds their values stay
+valid, as inferred by integuru.util.token_lifetime ("ttl_source" says from
+what). Plans are run by integuru.runtime and rendered as Python by
+integuru.util.code_emitter, which copies fill and parse_cookie_string into the
+generated code.
+"""
+import json
+import mimetypes
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import networkx as nx
+
+from integuru.models.request import Request
+from integuru.util.json_index import json_value_index
+from integuru.util.regex_synthesis import synthesize_extractors
+from integuru.util.token_lifetime import infer_lifetime
+
+PLAN_VERSION = 2
+
+BINARY_TYPES = ("application/octet-stream", "application/pdf", "application/zip", "image/jpeg", "image/png")
+
+# Recomputed by the HTTP client from the body it sends
+DROPPED_HEADERS = ("content-length",)
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+PARAM_KEY = "$param"
+
+# A captured value is only replaced where it is not part of a longer word or number (a
+# percent-encoded character such as %22 before it does not count)
+VALUE_BEFORE = r"(?:(?<![A-Za-z0-9_])|(?<=%[0-9A-Fa-f]{2}))"
+VALUE_AFTER = r"(?![A-Za-z0-9_])"
+
+
+def fill(template: Any, params: Dict[str, Any]) -> Any:
+    """
+    Replaces the placeholders in template with their values in params.
+    """
+    if isinstance(template, str):
+        def value_of(match):
+            name = match.group(1)
+            if name not in params:
+                return match.group(0)
+            # Non-string values (numbers, booleans) go into text as their JSON text
+            return params[name] if isinstance(params[name], str) else json.dumps(params[name])
+
+        return PLACEHOLDER_PATTERN.sub(value_of, template)
+    if isinstance(template, dict):
+        if len(template) == 1 and PARAM_KEY in template:
+            return params[template[PARAM_KEY]]
+        return {fill(key, params): fill(value, params) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill(item, params) for item in template]
+    return template
+
+
+def parse_cookie_string(cookie_string: str) -> Dict[str, str]:
+    cookies = {}
+    for pair in cookie_string.split(";"):
+        if "=" in pair:
+            key, value = pair.split("=", 1)
+            cookies[key.strip()] = value.strip()
+    return cookies
+
+
+def templatize(template: Any, names: Dict[str, str]) -> Any:
+    """
+    The inverse of fill: replaces the captured values in template (a request URL,
+    header or body) with placeholders for their names.
+    """
+    if not names:
+        return template
+    if isinstance(template, str):
+        if template in names:
+            return "{{%s}}" % names[template]
+        pattern = VALUE_BEFORE + "(" + "|".join(map(re.escape, sorted(names, key=len, reverse=True))) + ")" + VALUE_AFTER
+        return re.sub(pattern, lambda match: "{{%s}}" % names[match.group(1)], template)
+    if isinstance(template, dict):
+        return {templatize(key, names): templatize(value, names) for key, value in template.items()}
+    if isinstance(template, list):
+        return [templatize(item, names) for item in template]
+    if template is not None and not isinstance(template, bool) and json.dumps(template) in names:
+        return {PARAM_KEY: names[json.dumps(template)]}
+    return template
+
+
+def placeholder_name(suggestion: str, taken: set) -> str:
+    base = re.sub(r"[^A-Za-z0-9_]+", "_", suggestion).strip("_") or "value"
+    if base[0].isdigit():
+        base = f"value_{base}"
+    name, suffix = base, 2
+    while name in taken:
+        name, suffix = f"{base}_{suffix}", suffix + 1
+    taken.add(name)
+    return name
+
+
+def step_name(request: Request, taken: set) -> str:
+    path = re.sub(r"^https?://[^/]+", "", request.url).split("?")[0]
+    words = [word for word in re.split(r"[^A-Za-z0-9]+", path) if word and not word.isdigit()][-3:]
+    base = "_".join([request.method.lower()] + words).lower() or "request"
+    name, suffix = base, 2
+    while name in taken:
+        name, suffix = f"{base}_{suffix}", suffix + 1
+    taken.add(name)
+    return name
+
+
+def dynamic_parts_of(node_attrs: Dict[str, Any]) -> List[str]:
+    return [part for part in node_attrs.get("dynamic_parts") or [] if part and part != "None"]
+
+
+def extracted_parts_of(node_attrs: Dict[str, Any]) -> List[str]:
+    return [part for part in node_attrs.get("extracted_parts") or [] if part and part != "None"]
+
+
+def input_variables_of(node_attrs: Dict[str, Any]) -> Dict[str, str]:
+    """
+    The input variables found in a request, by name. Graphs from older checkpoints
+    record only their names, which cannot be bound.
+    """
+    input_variables = node_attrs.get("input_variables")
+    return input_variables if isinstance(input_variables, dict) else {}
+
+
+def extraction_rules(
+    request: Request,
+    response: Dict[str, Any],
+    extracted_parts: List[str],
+    related_responses: Optional[Callable[[Request], List[str]]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns a rule locating each extracted part in the response, or None if some part cannot be located.
+    """
+    response_type = response.get("type", "") or ""
+    response_text = response.get("text", "") or ""
+    if not extracted_parts:
+        return []
+
+    if "application/json" in response_type:
+        value_index = json_value_index(response_text)
+        if value_index is None:
+            return None
+        rules = []
+        for part in extracted_parts:
+            entries = value_index.find(part)
+            if not entries or entries[0].get("match") == "embedded":
+                return None
+            rules.append({"value": part, "json_path": entries[0]["key_path"]})
+        return rules
+
+    if any(binary_type in response_type for binary_type in BINARY_TYPES):
+        return None
+
+    other_texts = related_responses(request) if related_responses is not None else []
+    extractors, unresolved = synthesize_extractors(response_text, extracted_parts, other_texts)
+    if unresolved:
+        return None
+    return [{"value": extractor.value, "regex": extractor.pattern} for extractor in extractors]
+
+
+def output_of(response_type: str) -> Dict[str, str]:
+    """
+    Describes what the action request returns: a file to save, JSON or text.
+    """
+    if any(binary_type in response_type for binary_type in BINARY_TYPES):
+        extension = mimetypes.guess_extension(response_type.split(";")[0].strip()) or ".bin"
+        return {"type": "file", "extension": extension}
+    if "application/json" in response_type:
+        return {"type": "json"}
+    return {"type": "text"}
+
+
+def request_template(request: Request) -> Dict[str, Any]:
+    url = request.url
+    if request.query_params and "?" not in url:
+        url += "?" + "&".join(f"{key}={value}" for key, value in request.query_params.items())
+    template: Dict[str, Any] = {
+        "method": request.method,
+        "url": url,
+        "headers": {
+            key: value
+            for key, value in request.headers.items()
+            if not key.startswith(":") and key.lower() not in DROPPED_HEADERS
+        },
+    }
+    if isinstance(request.body, (dict, list)):
+        template["json"] = request.body
+    elif request.body:
+        template["data"] = request.body
+    return template
+
+
+def build_plan(
+    graph: nx.DiGraph,
+    node_order: List[str],
+    cookie_string: str = "",
+    related_responses: Optional[Callable[[Request], List[str]]] = None,
+    external_names: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    Turns the nodes of node_order (dependencies first) into plan steps. Nodes that
+    cannot be expressed as a step are listed under "unsupported" and the plan is
+    only runnable when that list is empty. cookie_string, the captured cookies, is
+    only used to check cookie nodes and is not stored. external_names (captured
+    value to name), e.g. the variables of LLM-generated code, names the values it
+    covers, and dynamic parts that no step produces are left to the caller as params
+    of those names.
+    """
+    external_names = external_names or {}
+    cookie_values = parse_cookie_string(cookie_string)
+    steps: List[Dict[str, Any]] = []
+    step_ids: Dict[str, str] = {}
+    # Captured values to their placeholder names and to the steps producing them
+    names: Dict[str, str] = {}
+    producers: Dict[str, str] = {}
+    unsupported: List[str] = []
+    input_variables: Dict[str, str] = {}
+    # Step ids double as function names in generated code
+    taken = {"main", "session", "fill", "parse_cookie_string"}
+    taken_names: set = set(external_names.values())
+    result = None
+
+    for node_id in node_order:
+        node_attrs = graph.nodes[node_id]
+        node_type = node_attrs.get("node_type", "")
+        content = node_attrs.get("content", {})
+
+        if node_type == "cookie":
+            cookie_name, cookie_value = content.get("key", ""), content.get("value", "")
+            # A value found inside a longer cookie needs parsing a plan cannot describe
+            if not cookie_name or cookie_values.get(cookie_name, cookie_value) != cookie_value:
+                unsupported.append(node_id)
+                continue
+            step_ids[node_id] = f"cookie_{re.sub(r'[^A-Za-z0-9]+', '_', cookie_name)}"
+            while step_ids[node_id] in taken:
+                step_ids[node_id] += "_"
+            taken.add(step_ids[node_id])
+            if cookie_value not in names:
+                names[cookie_value] = external_names.get(cookie_value) or placeholder_name(cookie_name, taken_names)
+                producers[cookie_value] = step_ids[node_id]
+            steps.append(
+                {
+                    "id": step_ids[node_id],
+                    "node_id": node_id,
+                    "type": "cookie",
+                    "depends_on": [],
+                    "cookie": cookie_name,
+                    "name": names[cookie_value],
+                }
+            )
+            continue
+
+        request = content.get("key")
+        if node_type not in ("curl", "master_curl") or not isinstance(request, Request):
+            unsupported.append(node_id)
+            continue
+
+        response = content.get("value") or {}
+        is_master = node_type == "master_curl"
+        rules = [] if is_master else extraction_rules(request, response, extracted_parts_of(node_attrs), related_responses)
+        if rules is None:
+            unsupported.append(node_id)
+            continue
+
+        step_ids[node_id] = step_name(request, taken)
+        bindings: Dict[str, Dict[str, str]] = {}
+        step_names: Dict[str, str] = {}
+        for part in dynamic_parts_of(node_attrs):
+            if part in producers:
+                step_names[part] = names[part]
+                bindings[names[part]] = {"step": producers[part]}
+            elif part in external_names:
+                step_names[part] = external_names[part]
+                bindings[external_names[part]] = {"external": part}
+        for variable_name, variable_value in input_variables_of(node_attrs).items():
+            input_variables.setdefault(variable_name, variable_value)
+            step_names[variable_value] = placeholder_name(variable_name, taken_names)
+            bindings[step_names[variable_value]] = {"input": variable_name}
+
+        step: Dict[str, Any] = {
+            "id": step_ids[node_id],
+            "node_id": node_id,
+            "type": "request",
+            "depends_on": sorted(
+                {step_ids[child_id] for child_id in graph.successors(node_id) if child_id in step_ids}
+                | {binding["step"] for binding in bindings.values() if "step" in binding}
+            ),
+            "request": templatize(request_template(request), step_names),
+            "bindings": bindings,
+            "extract": [],
+        }
+        if is_master:
+            step["output"] = output_of(response.get("type", "") or "")
+            result = step["id"]
+        else:
+            lifetime = infer_lifetime([rule["value"] for rule in rules], response.get("headers"))
+            if lifetime is not None:
+                step["ttl"] = lifetime.seconds
+                step["ttl_source"] = lifetime.source
+        for rule in rules:
+            captured = rule.pop("value")
+            if captured not in names:
+                suggestion = next((key for key in reversed(rule.get("json_path", [])) if isinstance(key, str)), "value")
+                names[captured] = external_names.get(captured) or placeholder_name(suggestion, taken_names)
+                producers[captured] = step["id"]
+            step["extract"].append({"name": names[captured], **rule})
+        steps.append(step)
+
+    return {
+        "version": PLAN_VERSION,
+        "input_variables": input_variables,
+        "result": result,
+        "steps": steps,
+        "unsupported": unsupported,
+    }
+
+
+def save_plan(plan: Dict[str, Any], path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(plan, file, indent=2)
+
+
+def load_plan(path: str) -> Dict[str, Any]:
+    """
+    Reads a plan, refusing plans of another version or with unsupported nodes.
+    """
+    with open(path, "r") as file:
+        plan = json.load(file)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{path} is a version {plan.get('version')} plan, expected version {PLAN_VERSION}")
+    if plan.get("unsupported"):
+        raise ValueError(f"{path} has {len(plan['unsupported'])} requests that need generated code")
+    return plan
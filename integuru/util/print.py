@@ -1,11 +1,21 @@
 from platform import node
 import matplotlib.pyplot as plt
 import networkx as nx
-from typing import Dict, Set, Optional, Any
+from typing import Callable, Dict, Set, Optional
 from integuru.util.LLM import llm
-import json
-from langchain_openai import ChatOpenAI
+from integuru.util.tracing import tracer
+from integuru.util.llm_scheduler import LLMScheduler
+from integuru.util.json_index import json_value_index
+from integuru.util.regex_synthesis import synthesize_extractors
+from integuru.util.code_emitter import PREAMBLE, EmittedCode, emit_code
+from integuru.util.plan import save_plan
+from integuru.util.token_lifetime import infer_lifetime
+from integuru.util.response_store import response_snippet
+from integuru.models.request import Request
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
 from openai import NotFoundError  # Add this import
 
 def print_dag(
@@ -68,7 +78,7 @@ def print_dag(
             )
 
 
-def visualize_dag(graph: nx.DiGraph) -> None:
+def visualize_dag(graph: nx.DiGraph, output_path: str = "dag_visualization.png") -> None:
     """
     Visualizes the DAG using Matplotlib with arrows indicating direction.
     """
@@ -89,55 +99,16 @@ def visualize_dag(graph: nx.DiGraph) -> None:
     nx.draw_networkx_edge_labels(graph, pos, edge_labels=edge_labels)
 
     plt.title("Directed Acyclic Graph (DAG)")
-    plt.savefig("dag_visualization.png")
+    plt.savefig(output_path)
     plt.close()
 
 
-def find_json_path(json_obj, target_value, current_path=None):
-    """
-    Finds the path(s) to a given value in a JSON object.
-    
-    Args:
-    json_obj (dict or list): The JSON object to search.
-    target_value: The value to find in the JSON object.
-    current_path (list): The current path being explored (used for recursion).
-
-    Returns:
-    list: A list of dictionaries, each containing 'key_path' and 'value' for each occurrence of the target value.
-    """
-    if current_path is None:
-        current_path = []
-
-    results = []
-
-    if isinstance(json_obj, dict):
-        for key, value in json_obj.items():
-            new_path = current_path + [key]
-            if value == target_value:
-                results.append({
-                    'key_path': new_path,
-                    'value': value
-                })
-            if isinstance(value, (dict, list)):
-                results.extend(find_json_path(value, target_value, new_path))
-    elif isinstance(json_obj, list):
-        for i, item in enumerate(json_obj):
-            new_path = current_path + [i]
-            if item == target_value:
-                results.append({
-                    'key_path': new_path,
-                    'value': item
-                })
-            if isinstance(item, (dict, list)):
-                results.extend(find_json_path(item, target_value, new_path))
-    
-    return results
-
-
-
-def generate_code(node_id: str, graph: nx.DiGraph) -> str:
+def generate_code(node_id: str, graph: nx.DiGraph,
+                  related_responses: Optional[Callable[[Request], List[str]]] = None) -> str:
     """
     Generates Python code for a given node in the graph based on its attributes.
+    related_responses(request) returns other captures of the same endpoint, used to
+    check locally synthesized regexes.
     """
 
     node_attrs = graph.nodes[node_id]
@@ -167,10 +138,9 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
         """
 
     if "application/json" in response_type:
-        key_paths = []
-        for extracted_part in extracted_parts:
-            key_path = find_json_path(json.loads(response_text), extracted_part)
-            key_paths.append(key_path)
+        # Parsed and flattened once per body, then one lookup per extracted part
+        value_index = json_value_index(response_text)
+        key_paths = [value_index.find(extracted_part) if value_index is not None else [] for extracted_part in extracted_parts]
 
         parse_response_prompt = f"""
             Response:
@@ -183,14 +153,17 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
         """
 
     if "text/html" in response_type or "application/javascript" in response_type:
-        if len(response_text) > 100000:
+        # Parts with a regex that works on the recorded response are not left to the LLM
+        other_texts = related_responses(curl) if related_responses is not None and isinstance(curl, Request) else []
+        extractors, extracted_parts = synthesize_extractors(response_text, extracted_parts or [], other_texts)
+
+        if not extracted_parts:
+            parse_response_prompt = ""
+        elif len(response_text) > 100000:
             context_snippets = []
             for part in extracted_parts:
-                index = response_text.find(part)
-                if index != -1:
-                    start = max(0, index - 50)
-                    end = min(len(response_text), index + len(part) + 50)
-                    snippet = response_text[start:end]
+                snippet = response_snippet(response, part, 50)
+                if snippet is not None:
                     context_snippets.append(f"{part}: {snippet}")
             
             parse_response_prompt = f"""
@@ -205,13 +178,21 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
                 Response:
                 {response_text}
             """
-        parse_response_prompt += f"""
+        if extracted_parts:
+            parse_response_prompt += f"""
             Parse out the variables following variables locations from the response using regex using locational context: 
 
             {extracted_parts}
             Do not include the variable in the regex filter as the variable will change. And do not be too specific with the regex.
 
         """
+        if extractors:
+            extractor_lines = chr(10).join(f"{extractor.value}: re.search({extractor.pattern!r}, text).group(1)" for extractor in extractors)
+            parse_response_prompt += f"""
+            Parse out these variables with exactly these regexes, which were checked against the captured responses (use the first capture group):
+
+            {extractor_lines}
+        """
 
     dynamic_parts_prompt = ""
     if dynamic_parts:
@@ -249,7 +230,8 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
     llm_model = llm.switch_to_alternate_model()
     try:
         response = llm_model.invoke(prompt)
-    except Exception as e:
+    except NotFoundError:
+        # Rate limits and server errors are retried by the LLM scheduler; only a missing model falls back
         print("Switching to default model")
         llm.revert_to_default_model()
         response = llm.switch_to_alternate_model().invoke(prompt)
@@ -263,6 +245,12 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
     if code.endswith("```"):
         code = code[:-3]
 
+    # Marks how long the parsed values can be cached, for aggregate_functions
+    if node_attrs.get("node_type", "") != "master_curl":
+        lifetime = infer_lifetime(extracted_parts or [], content.get("value", {}).get("headers"))
+        if lifetime is not None and lifetime.seconds > 0:
+            code = f"# cache_ttl: {lifetime.seconds:g} ({lifetime.source})\n{code}"
+
     return code
 
 def aggregate_functions(txt_path, output_path):
@@ -282,10 +270,11 @@ def aggregate_functions(txt_path, output_path):
     1. Fix up the functions if needed in the order they appear in the text.
     2. Leave everything that is hardcoded as is.
     3. Call each function in the order they appear in the text.
-    4. The cookies will be hard coded in the file in a string format of key=value;key=value. You will need to convert them to a dict to retrieve values from them.
+    4. Do not hard code cookies. Read the cookie string (key=value;key=value) when the code runs, from cookies.json (a JSON list of objects with "name" and "value") or else from the COOKIE_STRING environment variable, and convert it to a dict to retrieve values from it.
     5. Pass the return value of each function as an argument to the next function, if applicable.
     6. Ensure that the last function in the text is called last.
     7. Output the entire directly runnable code
+    8. Cache the return value of each function marked with a "# cache_ttl: N" comment for N seconds, keyed by its arguments, so calls made while the value is still valid skip the request. Keep a value that is a JWT only until its exp claim if that is sooner, and never cache the last function. If any request fails with status 401 or 403 after a cached value was used, clear the cache and run all the functions again once.
 
 
 
@@ -298,7 +287,8 @@ def aggregate_functions(txt_path, output_path):
     llm_model = llm.switch_to_alternate_model()
     try:
         response = llm_model.invoke(prompt)
-    except Exception as e:
+    except NotFoundError:
+        # Rate limits and server errors are retried by the LLM scheduler; only a missing model falls back
         print("Switching to default model")
         llm.revert_to_default_model()
         response = llm.switch_to_alternate_model().invoke(prompt)
@@ -336,10 +326,68 @@ def swap_string_using_obfuscation_map(input_string: str, obfuscation_map: Dict[s
         input_string = input_string.replace(key, value)
     return input_string
 
-def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_generate_code: bool = False) -> None:
+def get_codegen_levels(graph: nx.DiGraph, node_order: List[str]) -> List[List[str]]:
+    """
+    Groups nodes into topological levels: level 0 holds nodes without successors and
+    every other node sits one level above its deepest successor. Nodes on the same
+    level do not depend on each other. Within a level the order of node_order is kept.
+    """
+    node_levels: Dict[str, int] = {}
+    for node_id in node_order:
+        child_levels = [node_levels[child_id] for child_id in graph.successors(node_id) if child_id in node_levels]
+        node_levels[node_id] = max(child_levels) + 1 if child_levels else 0
+
+    levels: List[List[str]] = [[] for _ in range(max(node_levels.values(), default=-1) + 1)]
+    for node_id in node_order:
+        levels[node_levels[node_id]].append(node_id)
+    return levels
+
+
+def traced_generate_code(node_id: str, graph: nx.DiGraph,
+                         related_responses: Optional[Callable[[Request], List[str]]] = None) -> str:
+    with tracer.span("codegen", category="codegen", node_id=node_id, node_type=graph.nodes[node_id].get("node_type", "")):
+        return generate_code(node_id, graph, related_responses)
+
+
+def generate_code_by_level(graph: nx.DiGraph, node_order: List[str], max_concurrency: int = 4,
+                           related_responses: Optional[Callable[[Request], List[str]]] = None,
+                           emitted: Optional[Dict[str, str]] = None,
+                           obfuscation_map: Optional[Dict[str, str]] = None) -> str:
+    """
+    Generates code for the nodes one topological level at a time, running the nodes of a
+    level concurrently. Nodes with code in emitted are not sent to the LLM. The dynamic
+    parts in the LLM's snippets are swapped for their names in obfuscation_map. The
+    snippets are joined in node_order so the output matches a sequential run.
+    """
+    code_by_node: Dict[str, str] = dict(emitted or {})
+    # Worker threads start with an empty context; run each call in a copy of ours so its span nests
+    context = contextvars.copy_context()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        for level in get_codegen_levels(graph, node_order):
+            level = [node_id for node_id in level if node_id not in code_by_node]
+            for node_id, code in zip(level, executor.map(lambda node_id: context.copy().run(traced_generate_code, node_id, graph, related_responses), level)):
+                code_by_node[node_id] = swap_string_using_obfuscation_map(code, obfuscation_map or {})
+
+    return "".join(code_by_node[node_id] + "\n\n" for node_id in node_order)
+
+
+def print_dag_in_reverse(
+    graph: nx.DiGraph,
+    max_depth: Optional[int] = None,
+    to_generate_code: bool = False,
+    codegen_concurrency: int = 4,
+    output_dir: str = ".",
+    related_responses: Optional[Callable[[Request], List[str]]] = None,
+    cookie_string: str = "",
+) -> None:
     """
     Generates the order of requests to be made based on the DAG.
     Prints the DAG starting from source nodes and ending at sink nodes, traversing successors.
+    Generated code is written to output_dir. Nodes the code emitter can express are
+    written without the LLM, and when that is all of them so is the whole program.
+    When every node can be expressed the DAG is also saved as an execution plan
+    (execution_plan.json), with or without code generation.
     """
     if to_generate_code:
         print("--------------Generating code------------")
@@ -347,6 +395,7 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
     generated_code = ""
 
     dynamic_parts_list = []
+    codegen_order = []
 
     def _print_dag_recursive(
         current_node_id: str,
@@ -359,7 +408,7 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
         """
         Helper function to recursively print the DAG in reverse order.
         """
-        nonlocal generated_code, dynamic_parts_list
+        nonlocal dynamic_parts_list
         if visited is None:
             visited = set()
         if fully_processed is None:
@@ -398,8 +447,7 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
         # After all children have been processed, print the current node
         connector = "└── " if is_last else "├── "
         print(f"{prefix}{connector}{get_node_label(graph, current_node_id)}")
-        if to_generate_code:
-            generated_code += generate_code(current_node_id, graph) + "\n\n"
+        codegen_order.append(current_node_id)
         fully_processed.add(current_node_id)
         visited.remove(current_node_id)
     
@@ -441,14 +489,61 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
             depth=0,
         )
     
+    # The emitter and the plan are an optimization: if they fail, the LLM generates all the code
+    emitted = EmittedCode({}, None, None)
+    with tracer.span("emitCode", category="codegen") as span:
+        try:
+            emitted = emit_code(graph, codegen_order, cookie_string, related_responses)
+            if emitted.program is not None:
+                plan_path = os.path.join(output_dir, "execution_plan.json")
+                save_plan(emitted.plan, plan_path)
+                print(f"Saved the execution plan to '{plan_path}'")
+            else:
+                print(f"No execution plan: {len(emitted.plan['unsupported'])} requests need generated code")
+        except Exception as e:
+            print(f"Could not emit code or an execution plan: {type(e).__name__}: {e}")
+            span.set(error=f"{type(e).__name__}: {e}")
+        span.set(emitted_nodes=len(emitted.functions), complete=emitted.program is not None)
+
     if to_generate_code:
-        obfuscation_map = generate_obfuscation_map(dynamic_parts_list)
-        generated_code = swap_string_using_obfuscation_map(generated_code, obfuscation_map)
-        with open("generated_code.txt", "w") as f:
-            f.write(generated_code)
-        
-        aggregate_functions("generated_code.txt", "generated_code.py")
-        print("--------------Generated integration code in generated_code.py!!------------")
+        # Codegen calls queue behind analysis calls when the LLM scheduler is saturated
+        with LLMScheduler.lane("codegen"):
+            if emitted.program is not None:
+                print(f"Emitted code for all {len(emitted.functions)} requests without the LLM")
+                for file_name in ("generated_code.txt", "generated_code.py"):
+                    with open(os.path.join(output_dir, file_name), "w") as f:
+                        f.write(emitted.program)
+            else:
+                print(f"Emitted code for {len(emitted.functions)} requests; generating the rest with the LLM")
+                obfuscation_map = generate_obfuscation_map(dynamic_parts_list)
+                emitted_functions: Dict[str, str] = {}
+                try:
+                    # Emit again with the LLM's names for the values, so both kinds of functions agree on them
+                    emitted_functions = emit_code(
+                        graph, codegen_order, cookie_string, related_responses, external_names=obfuscation_map
+                    ).functions
+                except Exception as e:
+                    print(f"Could not emit code: {type(e).__name__}: {e}")
+                generated_code = generate_code_by_level(
+                    graph,
+                    codegen_order,
+                    max_concurrency=codegen_concurrency,
+                    related_responses=related_responses,
+                    emitted=emitted_functions,
+                    obfuscation_map=obfuscation_map,
+                )
+                if emitted_functions:
+                    # The emitted functions rely on these imports and helpers
+                    generated_code = PREAMBLE + "\n\n" + generated_code
+                with open(os.path.join(output_dir, "generated_code.txt"), "w") as f:
+                    f.write(generated_code)
+
+                with tracer.span("aggregateCode", category="codegen"):
+                    aggregate_functions(
+                        os.path.join(output_dir, "generated_code.txt"),
+                        os.path.join(output_dir, "generated_code.py"),
+                    )
+        print(f"--------------Generated integration code in {os.path.join(output_dir, 'generated_code.py')}!!------------")
 
 
 
@@ -0,0 +1,133 @@
+import re
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Left anchors grow from MIN_ANCHOR_LENGTH characters until the pattern picks out the value
+MIN_ANCHOR_LENGTH = 3
+MAX_ANCHOR_LENGTH = 48
+MAX_RIGHT_ANCHOR_LENGTH = 3
+
+# Occurrences of a value tried as the source of its anchors
+MAX_OCCURRENCES = 5
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+DIGIT_RUN_PATTERN = re.compile(r"\d{3,}")
+
+
+class Extractor(NamedTuple):
+    """
+    A regex whose first capture group, on the first match, is the value in the recorded response.
+    verified_on counts the other captures of the same endpoint that the pattern also matched.
+    """
+
+    value: str
+    pattern: str
+    verified_on: int
+
+
+def anchor_regex(anchor: str) -> str:
+    """
+    Escapes an anchor, letting any run of whitespace match any other (or none).
+    """
+    return r"\s*".join(re.escape(part) for part in WHITESPACE_PATTERN.split(anchor))
+
+
+def value_class(value: str) -> str:
+    """
+    Returns a character class covering the kinds of characters in value: letters,
+    digits and each punctuation character it contains.
+    """
+    parts = []
+    if any(character.isalpha() for character in value):
+        parts.append("A-Za-z")
+    if any(character.isdigit() for character in value):
+        parts.append("0-9")
+    punctuation = sorted({character for character in value if not character.isalnum()})
+    parts.extend("\\s" if character.isspace() else re.escape(character) for character in punctuation)
+    return f"[{''.join(parts)}]"
+
+
+def _is_word_start(text: str, position: int) -> bool:
+    character = text[position]
+    if character == "<":
+        return True
+    if not (character.isalnum() or character == "_"):
+        return False
+    return position == 0 or not (text[position - 1].isalnum() or text[position - 1] == "_")
+
+
+def _candidates(text: str, start: int, end: int, value: str) -> Iterable[str]:
+    """
+    Yields patterns from the shortest anchors to the longest. Left anchors begin at a
+    word or tag start (e.g. 'content="' or '"userId": ' rather than 't="') and skip
+    runs of digits, which are usually dynamic themselves.
+    """
+    character_class = value_class(value)
+    for right_length in range(1, MAX_RIGHT_ANCHOR_LENGTH + 1):
+        right = text[end:end + right_length]
+        if right.strip() == "" and end + right_length < len(text):
+            # Whitespace alone is a weak anchor; extend it to the next visible character
+            continue
+        capture = f"({character_class}+?)" if right else f"({character_class}+)$"
+        for left_start in range(start - MIN_ANCHOR_LENGTH, max(-1, start - MAX_ANCHOR_LENGTH - 1), -1):
+            if not _is_word_start(text, left_start):
+                continue
+            left = text[left_start:start]
+            if DIGIT_RUN_PATTERN.search(left):
+                break
+            yield anchor_regex(left) + capture + (anchor_regex(right) if right else "")
+
+
+def _extracts(pattern: str, text: str, value: Optional[str] = None) -> bool:
+    try:
+        match = re.search(pattern, text)
+    except re.error:
+        return False
+    if match is None:
+        return False
+    return match.group(1) == value if value is not None else bool(match.group(1))
+
+
+def synthesize_pattern(text: str, value: str, other_texts: Sequence[str] = ()) -> Optional[Extractor]:
+    """
+    Derives an anchor-based regex that extracts value from text. Patterns that also
+    match every text in other_texts (captures of the same endpoint, whose value may
+    differ) are preferred; otherwise the one matching most of them is returned.
+    Returns None if no pattern extracts value from text.
+    """
+    if not value or not text:
+        return None
+
+    best: Optional[Extractor] = None
+    start = text.find(value)
+    for _ in range(MAX_OCCURRENCES):
+        if start == -1:
+            break
+        end = start + len(value)
+        for pattern in _candidates(text, start, end, value):
+            if not _extracts(pattern, text, value):
+                continue
+            verified_on = sum(_extracts(pattern, other) for other in other_texts)
+            if verified_on == len(other_texts):
+                return Extractor(value, pattern, verified_on)
+            if best is None or verified_on > best.verified_on:
+                best = Extractor(value, pattern, verified_on)
+        start = text.find(value, start + 1)
+    return best
+
+
+def synthesize_extractors(
+    text: str, values: Iterable[str], other_texts: Sequence[str] = ()
+) -> Tuple[List[Extractor], List[str]]:
+    """
+    Returns the extractors found for values and the values left for the LLM.
+    """
+    extractors: List[Extractor] = []
+    unresolved: List[str] = []
+    for value in values:
+        extractor = synthesize_pattern(text, value, other_texts)
+        if extractor is None:
+            unresolved.append(value)
+        else:
+            extractors.append(extractor)
+    return extractors, unresolved
@@ -0,0 +1,89 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from integuru.models.request import Request
+from integuru.util.dynamic_value_classifier import (
+    HEX_PATTERN,
+    JWT_PATTERN,
+    UUID_PATTERN,
+    extract_request_values,
+    shannon_entropy,
+)
+
+METHOD_PENALTIES = {"GET": 0.0, "POST": 1.0}
+DEFAULT_METHOD_PENALTY = 2.0
+
+# Scores closer than this are considered a tie worth asking the LLM about
+TIE_MARGIN = 0.5
+
+
+def is_high_entropy_value(value: str) -> bool:
+    """
+    Whether a value looks like a token or ID rather than plain data.
+    """
+    if UUID_PATTERN.match(value) or JWT_PATTERN.match(value) or HEX_PATTERN.match(value):
+        return True
+    return len(value) >= 16 and shannon_entropy(value) >= 3.5
+
+
+def _body_size(body: Any) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body)
+    return len(json.dumps(body))
+
+
+def _content_type_penalty(response: Dict[str, Any]) -> float:
+    response_type = (response or {}).get("type", "") or ""
+    if "json" in response_type:
+        return 0.0
+    if "text" in response_type or "xml" in response_type:
+        return 1.0
+    return 2.0
+
+
+def score_request(request: Request, response: Dict[str, Any]) -> float:
+    """
+    Scores how complex a request is to reproduce; lower is simpler. Requests with
+    fewer headers, smaller bodies, fewer embedded tokens, a GET method and a JSON
+    response have fewer dependencies and are easier to parse.
+    """
+    high_entropy_values = sum(
+        1 for request_value in extract_request_values(request) if is_high_entropy_value(request_value.value)
+    )
+    return (
+        1.0 * len(request.headers)
+        + 2.0 * min(_body_size(request.body), 2000) / 1000
+        + 3.0 * high_entropy_values
+        + 2.0 * METHOD_PENALTIES.get(request.method.upper(), DEFAULT_METHOD_PENALTY)
+        + 1.0 * _content_type_penalty(response)
+    )
+
+
+def rank_requests(
+    requests: List[Request],
+    req_to_res_map: Dict[Request, Dict[str, Any]],
+    positions: Optional[Dict[Request, int]] = None,
+) -> List[Tuple[float, Request]]:
+    """
+    Returns (score, request) pairs sorted from simplest to most complex. Equal scores
+    are ordered by capture position so the ranking is deterministic.
+    """
+    positions = positions or {}
+    scored = [
+        (score_request(request, req_to_res_map.get(request, {})), positions.get(request, index), request)
+        for index, request in enumerate(requests)
+    ]
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [(score, request) for score, _, request in scored]
+
+
+def get_tied_requests(ranked: List[Tuple[float, Request]], top_k: int = 5) -> List[Request]:
+    """
+    Returns the top-ranked requests whose scores are within TIE_MARGIN of the best, capped at top_k.
+    """
+    if not ranked:
+        return []
+    best_score = ranked[0][0]
+    return [request for score, request in ranked[:top_k] if score - best_score <= TIE_MARGIN]
@@ -0,0 +1,252 @@
+import codecs
+import mmap
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Mapping, Optional, Sequence, Tuple, Union
+
+# Bodies at least this large are written to disk when spilling is enabled
+DEFAULT_SPILL_THRESHOLD = 64 * 1024
+
+# Number of decoded spilled bodies kept in memory
+DEFAULT_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=1024)
+def literal_pattern(needles: Tuple[str, ...], ignore_case: bool, binary: bool) -> "re.Pattern":
+    """
+    Returns a pattern matching any of the needles, over bytes (UTF-8) when binary.
+    Longer needles come first so that the longest one at a position is matched.
+    """
+    ordered = sorted(needles, key=len, reverse=True)
+    if binary:
+        pattern: Union[str, bytes] = b"|".join(re.escape(needle.encode("utf-8", "surrogatepass")) for needle in ordered)
+    else:
+        pattern = "|".join(re.escape(needle) for needle in ordered)
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+class ResponseStore:
+    """
+    Append-only store for response bodies.
+
+    Bodies at or above spill_threshold bytes are appended to a file (an
+    anonymous temporary file unless a path is given) and only their offset
+    and length are kept in memory. Reads go through an mmap of the file and
+    the most recently decoded bodies are kept in a small LRU cache.
+
+    With read_only, the bodies of an existing file (e.g. a HarIndex body blob)
+    are served without writing to it.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        read_only: bool = False,
+    ):
+        if read_only and not path:
+            raise ValueError("A read-only ResponseStore needs the path of an existing file")
+        self.path = path
+        self.read_only = read_only
+        self.spill_threshold = spill_threshold
+        self.cache_size = cache_size
+        self.spilled_bytes = 0
+
+        if read_only:
+            self._file = open(path, "rb")
+            self._end = os.fstat(self._file.fileno()).st_size
+        else:
+            self._file = open(path, "w+b") if path else tempfile.TemporaryFile()
+            self._end = 0
+        self._map: Optional[mmap.mmap] = None
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, text: Optional[str], mime_type: str, headers: Optional[Dict[str, str]] = None) -> Mapping[str, Any]:
+        """
+        Stores a response body and returns the response mapping ({"text", "type", "headers"})
+        to keep in place of it.
+        """
+        if self.read_only:
+            raise ValueError("Cannot add to a read-only ResponseStore")
+        text = text or ""
+        data = text.encode("utf-8", "surrogatepass")
+        if len(data) < self.spill_threshold:
+            return {"text": text, "type": mime_type, "headers": headers or {}}
+
+        with self._lock:
+            offset = self._end
+            self._file.seek(offset)
+            self._file.write(data)
+            self._end += len(data)
+            self.spilled_bytes += len(data)
+
+        return StoredResponse(self, offset, len(data), mime_type, headers)
+
+    def _view(self, end: int) -> mmap.mmap:
+        # Called with the lock held; remaps once the file has grown past the mapping
+        if self._map is None or len(self._map) < end:
+            self._file.flush()
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self, offset: int, length: int) -> str:
+        """
+        Returns the body stored at offset, decoding it at most once while it stays in the LRU cache.
+        """
+        if length == 0:
+            return ""
+
+        with self._lock:
+            text = self._cache.get(offset)
+            if text is not None:
+                self._cache.move_to_end(offset)
+                return text
+
+            data = self._view(offset + length)[offset:offset + length]
+
+        text = data.decode("utf-8", "surrogatepass")
+        with self._lock:
+            self._cache[offset] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def search(self, offset: int, length: int, needles: Sequence[str], ignore_case: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Returns the character span of the first match of any of the needles in the
+        body stored at offset, or None. A body that is not cached is searched in
+        the mmap and only the text before the match is decoded. On disk, case is
+        folded for ASCII letters only.
+        """
+        if not needles:
+            return None
+        if length == 0:
+            return (0, 0) if "" in needles else None
+
+        with self._lock:
+            text = self._cache.get(offset)
+            if text is None:
+                view = self._view(offset + length)
+                match = literal_pattern(tuple(needles), ignore_case, True).search(view, offset, offset + length)
+                if match is None:
+                    return None
+                prefix = view[offset:match.start()]
+                matched = view[match.start():match.end()]
+        if text is not None:
+            match = literal_pattern(tuple(needles), ignore_case, False).search(text)
+            return match.span() if match else None
+        start = len(prefix.decode("utf-8", "surrogatepass"))
+        return start, start + len(matched.decode("utf-8", "surrogatepass"))
+
+    def find(self, offset: int, length: int, needle: str, ignore_case: bool = False) -> int:
+        """
+        Returns the character index of needle in the body stored at offset, or -1,
+        without decoding the body when it is not cached.
+        """
+        span = self.search(offset, length, (needle,), ignore_case)
+        return -1 if span is None else span[0]
+
+    def snippet(self, offset: int, length: int, start: int, end: int) -> str:
+        """
+        Returns characters start to end of the body stored at offset. Only the
+        bytes up to end are decoded when the body is not cached.
+        """
+        with self._lock:
+            text = self._cache.get(offset)
+            if text is None:
+                # A UTF-8 character is at most 4 bytes, so end characters fit in 4 * end bytes
+                data = self._view(offset + length)[offset:offset + min(length, 4 * end)]
+        if text is None:
+            # The cut may fall inside a character after the end, which is left undecoded
+            text = codecs.getincrementaldecoder("utf-8")("surrogatepass").decode(data)
+        return text[start:end]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._cache.clear()
+            self._file.close()
+
+
+class StoredResponse(Mapping):
+    """
+    A response whose body lives in a ResponseStore. It behaves like the
+    {"text", "type", "headers"} dicts used for in-memory responses and reads the body on access.
+    Pickling (for checkpoints) turns it back into a plain dict.
+    """
+
+    __slots__ = ("store", "offset", "length", "type", "headers")
+
+    def __init__(self, store: ResponseStore, offset: int, length: int, mime_type: str, headers: Optional[Dict[str, str]] = None):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.type = mime_type
+        self.headers = headers or {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "text":
+            return self.store.read(self.offset, self.length)
+        if key == "type":
+            return self.type
+        if key == "headers":
+            return self.headers
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(("text", "type", "headers"))
+
+    def __len__(self) -> int:
+        return 3
+
+    def search(self, needles: Sequence[str], ignore_case: bool = False) -> Optional[Tuple[int, int]]:
+        return self.store.search(self.offset, self.length, needles, ignore_case)
+
+    def find(self, needle: str, ignore_case: bool = False) -> int:
+        return self.store.find(self.offset, self.length, needle, ignore_case)
+
+    def snippet(self, start: int, end: int) -> str:
+        return self.store.snippet(self.offset, self.length, start, end)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def __repr__(self) -> str:
+        return f"StoredResponse(type={self.type!r}, bytes={self.length})"
+
+
+def search_response(response: Mapping[str, Any], needles: Sequence[str], ignore_case: bool = False) -> Optional[Tuple[int, int]]:
+    """
+    Returns the character span of the first match of any of the needles in a
+    response's body, in memory or in a ResponseStore, or None.
+    """
+    if isinstance(response, StoredResponse):
+        return response.search(needles, ignore_case)
+    if not needles:
+        return None
+    match = literal_pattern(tuple(needles), ignore_case, False).search(response.get("text") or "")
+    return match.span() if match else None
+
+
+def response_snippet(response: Mapping[str, Any], needle: str, context: int) -> Optional[str]:
+    """
+    Returns the first occurrence of needle in a response's body with context
+    characters on each side, or None if the body does not contain it.
+    """
+    span = search_response(response, (needle,))
+    if span is None:
+        return None
+    start, end = max(0, span[0] - context), span[1] + context
+    if isinstance(response, StoredResponse):
+        return response.snippet(start, end)
+    return (response.get("text") or "")[start:end]
@@ -0,0 +1,178 @@
+"""
+OpenAI-compatible stand-in for /v1/chat/completions that replays canned responses.
+
+Point Integuru at it with --llm-base-url http://127.0.0.1:8000/v1 to run the whole
+pipeline offline, e.g. for load tests. Responses come from a JSON file of rules:
+
+    [
+        {"function": "identify_end_url", "arguments": {"url": {"$match": "https://[^'\\\\s]*/bills[^'\\\\s]*"}}},
+        {"function": "identify_dynamic_parts", "arguments": {"dynamic_parts": {"$findall": "syn_[0-9a-f]{16}"}}},
+        {"prompt": "Write a Python function", "content": "def request(params, cookie_string):\\n    return {}"}
+    ]
+
+The first rule whose "function" matches the requested function call and whose
+"prompt" regex (if any) matches the prompt is used. Argument values may be
+{"$match": regex} (the first match in the prompt, or "") or {"$findall": regex}
+(the distinct matches, sorted). Function calls without a rule get empty
+arguments built from the function schema.
+"""
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import click
+
+DEFAULT_CONTENT = "def request(params, cookie_string):\n    return {}\n"
+
+
+def load_rules(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return []
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def render_value(value: Any, prompt: str) -> Any:
+    if isinstance(value, dict) and "$match" in value:
+        match = re.search(value["$match"], prompt)
+        return match.group(0) if match else ""
+    if isinstance(value, dict) and "$findall" in value:
+        return sorted(set(re.findall(value["$findall"], prompt)))
+    if isinstance(value, dict):
+        return {key: render_value(item, prompt) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render_value(item, prompt) for item in value]
+    return value
+
+
+def empty_value(schema: Dict[str, Any]) -> Any:
+    """
+    Returns an empty value of the JSON schema type: "", 0, False, [] or an object of empty required properties.
+    """
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        return {name: empty_value(properties.get(name, {})) for name in schema.get("required", properties.keys())}
+    return {"array": [], "string": "", "integer": 0, "number": 0, "boolean": False}.get(schema_type)
+
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+def respond(body: Dict[str, Any], rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Builds a chat completion response for a request body.
+    """
+    prompt = prompt_text(body.get("messages", []))
+    function_call = body.get("function_call")
+    function_name = function_call.get("name") if isinstance(function_call, dict) else None
+    tool_choice = body.get("tool_choice")
+    if function_name is None and isinstance(tool_choice, dict):
+        function_name = tool_choice.get("function", {}).get("name")
+
+    rule = next(
+        (
+            rule for rule in rules
+            if rule.get("function") == function_name
+            and (not rule.get("prompt") or re.search(rule["prompt"], prompt))
+        ),
+        None,
+    )
+
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    if function_name is not None:
+        if rule is not None:
+            arguments = render_value(rule.get("arguments", {}), prompt)
+        else:
+            schemas = body.get("functions") or [tool.get("function", {}) for tool in body.get("tools", [])]
+            schema = next((schema for schema in schemas if schema.get("name") == function_name), {})
+            arguments = empty_value(schema.get("parameters", {"type": "object"}))
+        message["function_call"] = {"name": function_name, "arguments": json.dumps(arguments)}
+        finish_reason = "function_call"
+    else:
+        message["content"] = rule.get("content", DEFAULT_CONTENT) if rule is not None else DEFAULT_CONTENT
+        finish_reason = "stop"
+
+    completion_text = message["content"] or message["function_call"]["arguments"]
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion_text) // 4
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def make_handler(rules: List[Dict[str, Any]], latency: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if latency:
+                time.sleep(latency)
+            self._send(200, respond(body, rules))
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8000, rules: Optional[List[Dict[str, Any]]] = None,
+                latency: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Returns a threaded stub server; call serve_forever() on it, or run it in a thread.
+    Port 0 picks a free port, available as server.server_address[1].
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(rules or [], latency))
+    server.daemon_threads = True
+    return server
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Interface to listen on (default is 127.0.0.1)")
+@click.option("--port", default=8000, type=int, help="Port to listen on (default is 8000)")
+@click.option("--responses", default=None, help="JSON file of canned response rules")
+@click.option("--latency", default=0.0, type=float, help="Seconds to wait before each response (default is 0)")
+def main(host, port, responses, latency):
+    server = make_server(host, port, load_rules(responses), latency)
+    print(f"Stub LLM server listening on http://{host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import json
+import os
+import random
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Every dynamic value in a synthetic capture looks like syn_<16 hex digits>,
+# which lets a fake LLM recognise them without understanding the requests.
+TOKEN_PREFIX = "syn_"
+TOKEN_PATTERN = r"syn_[0-9a-f]{16}"
+
+HOST = "app.synthetic.test"
+ACTION_PATH = "/api/action/download"
+ACTION_PROMPT = "download the monthly report"
+
+THIRD_PARTY_HOSTS = (
+    "www.google-analytics.com",
+    "browser-intake-datadoghq.com",
+    "cdn.synthetic.test",
+)
+
+WORDS = (
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+)
+
+
+class SyntheticHarConfig(NamedTuple):
+    entries: int = 1000
+    body_size: int = 1024
+    chain_length: int = 5
+    cookies: int = 20
+    cookie_domains: int = 4
+    # Share of the noise that goes to analytics and CDN hosts instead of the app itself
+    third_party_ratio: float = 0.5
+    # Share of the app's own API noise that echoes a chain token, creating extra candidates
+    echo_ratio: float = 0.01
+    seed: int = 0
+
+
+class SyntheticCapture(NamedTuple):
+    har_path: str
+    cookie_path: str
+    prompt: str
+    action_url: str
+    chain_urls: List[str]
+    tokens: List[str]
+    session_value: str
+
+
+def _token(rng: random.Random) -> str:
+    return f"{TOKEN_PREFIX}{rng.getrandbits(64):016x}"
+
+
+def _filler(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def _entry(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    mime_type: str,
+    text: str,
+    post_data: Optional[str] = None,
+) -> Dict[str, Any]:
+    request: Dict[str, Any] = {
+        "method": method,
+        "url": url,
+        "httpVersion": "HTTP/1.1",
+        "headers": [{"name": name, "value": value} for name, value in headers.items()],
+        "queryString": [],
+        "cookies": [],
+    }
+    if post_data is not None:
+        request["postData"] = {"mimeType": headers.get("Content-Type", "application/json"), "text": post_data}
+
+    return {
+        "startedDateTime": "2024-01-01T00:00:00.000Z",
+        "time": 1,
+        "request": request,
+        "response": {
+            "status": 200,
+            "statusText": "OK",
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": "Content-Type", "value": mime_type}],
+            "cookies": [],
+            "content": {"size": len(text), "mimeType": mime_type, "text": text},
+        },
+    }
+
+
+def _json_body(rng: random.Random, size: int, values: Dict[str, Any]) -> str:
+    body = dict(values)
+    body["description"] = ""
+    padding = max(0, size - len(json.dumps(body)))
+    body["description"] = _filler(rng, padding)
+    return json.dumps(body)
+
+
+def _noise_entry(rng: random.Random, config: SyntheticHarConfig, index: int, tokens: List[str]) -> Dict[str, Any]:
+    if rng.random() < config.third_party_ratio:
+        host = rng.choice(THIRD_PARTY_HOSTS)
+        if host.startswith("cdn."):
+            return _entry("GET", f"https://{host}/static/img{index}.png", {}, "image/png", "")
+        return _entry(
+            "POST",
+            f"https://{host}/collect?v=1&tid={index}",
+            {"Content-Type": "text/plain"},
+            "text/plain",
+            "ok",
+            post_data=_filler(rng, 64),
+        )
+
+    if rng.random() < 0.4:
+        html = f"<html><body><p>{_filler(rng, config.body_size)}</p></body></html>"
+        return _entry("GET", f"https://{HOST}/pages/{index}", {"Accept": "text/html"}, "text/html", html)
+
+    values: Dict[str, Any] = {"id": index, "name": rng.choice(WORDS)}
+    if rng.random() < config.echo_ratio:
+        # A heavier request whose response also carries a chain token, so the real producer should win
+        values["ref"] = rng.choice(tokens)
+        return _entry(
+            "POST",
+            f"https://{HOST}/api/items/{index}/history",
+            {
+                "Content-Type": "application/json",
+                "X-Request-Id": str(index),
+                "X-Client-Version": "1.0.0",
+                "X-Trace": f"{rng.getrandbits(32):08x}",
+            },
+            "application/json",
+            _json_body(rng, config.body_size, values),
+            post_data=json.dumps({"page": index % 10, "filter": rng.choice(WORDS)}),
+        )
+    return _entry(
+        "GET",
+        f"https://{HOST}/api/items/{index}",
+        {"Accept": "application/json", "X-Request-Id": str(index)},
+        "application/json",
+        _json_body(rng, config.body_size, values),
+    )
+
+
+def generate_capture(directory: str, config: SyntheticHarConfig = SyntheticHarConfig()) -> SyntheticCapture:
+    """
+    Writes network_requests.har and cookies.json for a synthetic capture into directory.
+
+    The capture contains a login request followed by chain_length - 1 requests that each
+    need the token returned by the previous one, then the action request, which needs the
+    last token and a session cookie. The rest of the entries are noise: analytics beacons,
+    images, HTML pages and unrelated API calls. Entries are streamed to disk, so large
+    captures do not need to fit in memory.
+    """
+    rng = random.Random(config.seed)
+    os.makedirs(directory, exist_ok=True)
+    har_path = os.path.join(directory, "network_requests.har")
+    cookie_path = os.path.join(directory, "cookies.json")
+
+    chain_length = max(1, config.chain_length)
+    tokens = [_token(rng) for _ in range(chain_length)]
+    session_value = _token(rng)
+
+    chain_entries = []
+    chain_urls = []
+    for step, token in enumerate(tokens):
+        if step == 0:
+            url = f"https://{HOST}/api/session/login"
+            entry = _entry(
+                "POST",
+                url,
+                {"Content-Type": "application/json"},
+                "application/json",
+                _json_body(rng, config.body_size, {"data": {"token": token}}),
+                post_data=json.dumps({"username": "synthetic", "password": "hunter2"}),
+            )
+        else:
+            url = f"https://{HOST}/api/step/{step}"
+            entry = _entry(
+                "GET",
+                url,
+                {"Authorization": f"Bearer {tokens[step - 1]}", "Accept": "application/json"},
+                "application/json",
+                _json_body(rng, config.body_size, {"step": step, "next": {"token": token}}),
+            )
+        chain_urls.append(url)
+        chain_entries.append(entry)
+
+    action_url = f"https://{HOST}{ACTION_PATH}?ref={tokens[-1]}"
+    chain_entries.append(
+        _entry(
+            "GET",
+            action_url,
+            {"X-Session": session_value, "Cookie": f"session={session_value}"},
+            "application/pdf",
+            "%PDF-1.4 synthetic",
+        )
+    )
+
+    # Spread the chain evenly through the capture, keeping it in order
+    total = max(config.entries, len(chain_entries))
+    stride = total // len(chain_entries)
+    chain_positions = {position * stride: entry for position, entry in enumerate(chain_entries)}
+
+    with open(har_path, "w") as file:
+        file.write('{"log": {"version": "1.2", "creator": {"name": "integuru-synthetic", "version": "1"}, "entries": [\n')
+        for index in range(total):
+            entry = chain_positions.get(index) or _noise_entry(rng, config, index, tokens)
+            if index:
+                file.write(",\n")
+            json.dump(entry, file)
+        file.write("\n]}}\n")
+
+    domains = [HOST] + [f"sso{index}.synthetic.test" for index in range(1, max(1, config.cookie_domains))]
+    cookies = [
+        {
+            "name": "session",
+            "value": session_value,
+            "domain": f".{HOST}",
+            "path": "/",
+            "expires": 1999999999,
+            "httpOnly": True,
+            "secure": True,
+            "sameSite": "Lax",
+        }
+    ]
+    for index in range(max(0, config.cookies - 1)):
+        cookies.append(
+            {
+                "name": f"pref_{index % 50}",
+                "value": f"ck{rng.getrandbits(64):016x}",
+                "domain": f".{domains[index % len(domains)]}",
+                "path": "/",
+                "expires": 1999999999,
+                "httpOnly": False,
+                "secure": True,
+                "sameSite": "Lax",
+            }
+        )
+    with open(cookie_path, "w") as file:
+        json.dump(cookies, file)
+
+    return SyntheticCapture(
+        har_path=har_path,
+        cookie_path=cookie_path,
+        prompt=ACTION_PROMPT,
+        action_url=action_url,
+        chain_urls=chain_urls,
+        tokens=tokens,
+        session_value=session_value,
+    )
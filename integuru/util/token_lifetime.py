@@ -0,0 +1,117 @@
+"""
+Infers how long the values extracted from a response stay valid.
+
+The evidence, most specific first: the exp claim of a JWT among the values,
+the Max-Age or Expires of the cookies the response set, and the response's
+own Cache-Control / Expires headers. Lifetimes are durations measured from
+the capture, since the absolute times in a HAR are in the past by the time
+the generated code runs.
+"""
+import base64
+import json
+import re
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+MAX_AGE_PATTERN = re.compile(r"(?:^|[,\s])(?:s-maxage|max-age)\s*=\s*\"?(\d+)", re.IGNORECASE)
+NO_CACHE_PATTERN = re.compile(r"\b(?:no-store|no-cache)\b", re.IGNORECASE)
+COOKIE_MAX_AGE_PATTERN = re.compile(r";\s*max-age\s*=\s*(-?\d+)", re.IGNORECASE)
+COOKIE_EXPIRES_PATTERN = re.compile(r";\s*expires\s*=\s*([^;]+)", re.IGNORECASE)
+
+
+class Lifetime(NamedTuple):
+    seconds: float
+    source: str
+
+
+def parse_http_date(value: str) -> Optional[float]:
+    """
+    Returns the POSIX time of an HTTP date or an ISO 8601 timestamp (as HAR cookies use), or None.
+    """
+    value = value.strip()
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def jwt_claims(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Returns the payload of a JWT, or None if value is not one.
+    """
+    if not isinstance(value, str) or value.count(".") != 2:
+        return None
+    payload = value.split(".")[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def jwt_lifetime(values: Iterable[Any], captured_at: Optional[float]) -> Optional[Lifetime]:
+    """
+    The shortest lifetime of the JWTs among values: exp - iat, or exp - captured_at without iat.
+    """
+    lifetimes = []
+    for value in values:
+        claims = jwt_claims(value)
+        if claims is None or not isinstance(claims.get("exp"), (int, float)):
+            continue
+        issued_at = claims.get("iat") if isinstance(claims.get("iat"), (int, float)) else captured_at
+        if issued_at is not None:
+            lifetimes.append(claims["exp"] - issued_at)
+    return Lifetime(max(0.0, float(min(lifetimes))), "JWT exp") if lifetimes else None
+
+
+def cookie_lifetime(headers: Dict[str, str], captured_at: Optional[float]) -> Optional[Lifetime]:
+    """
+    The shortest lifetime of the cookies set by the response. Session cookies (neither Max-Age nor Expires) give none.
+    """
+    lifetimes = []
+    for set_cookie in headers.get("set-cookie", "").split("\n"):
+        max_age = COOKIE_MAX_AGE_PATTERN.search(set_cookie)
+        if max_age:
+            lifetimes.append(float(max_age.group(1)))
+            continue
+        expires = COOKIE_EXPIRES_PATTERN.search(set_cookie)
+        expires_at = parse_http_date(expires.group(1)) if expires else None
+        if expires_at is not None and captured_at is not None:
+            lifetimes.append(expires_at - captured_at)
+    return Lifetime(max(0.0, min(lifetimes)), "cookie expiry") if lifetimes else None
+
+
+def cache_header_lifetime(headers: Dict[str, str], captured_at: Optional[float]) -> Optional[Lifetime]:
+    """
+    The freshness lifetime of the response itself, from Cache-Control (less Age) or Expires.
+    """
+    cache_control = headers.get("cache-control", "")
+    if NO_CACHE_PATTERN.search(cache_control):
+        return Lifetime(0.0, "Cache-Control")
+    max_age = MAX_AGE_PATTERN.search(cache_control)
+    if max_age:
+        age = float(headers["age"]) if headers.get("age", "").strip().isdigit() else 0.0
+        return Lifetime(max(0.0, float(max_age.group(1)) - age), "Cache-Control")
+    expires_at = parse_http_date(headers["expires"]) if headers.get("expires") else None
+    if expires_at is not None and captured_at is not None:
+        return Lifetime(max(0.0, expires_at - captured_at), "Expires")
+    return None
+
+
+def infer_lifetime(values: Iterable[Any], headers: Optional[Dict[str, str]]) -> Optional[Lifetime]:
+    """
+    Returns how long values extracted from a response with these headers stay
+    valid, from the most specific evidence available, or None without any.
+    """
+    headers = headers or {}
+    captured_at = parse_http_date(headers["date"]) if headers.get("date") else None
+    return (
+        jwt_lifetime(values, captured_at)
+        or cookie_lifetime(headers, captured_at)
+        or cache_header_lifetime(headers, captured_at)
+    )
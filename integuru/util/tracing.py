@@ -0,0 +1,249 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from langchain_core.messages import BaseMessage
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("integuru_span", default=None)
+
+# Counters that LLM calls add to every enclosing span
+LLM_COUNTERS = ("llm_calls", "prompt_tokens", "completion_tokens", "cache_hits")
+
+
+class Span:
+    """
+    A timed section of the pipeline. Attributes end up in the trace event args
+    and in the metrics line written when the span ends.
+    """
+
+    __slots__ = ("name", "category", "attributes", "parent", "start", "thread_id")
+
+    def __init__(self, name: str, category: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class _NullSpan:
+    """Returned by Tracer.span when tracing is disabled."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Records spans for the LangGraph nodes, code generation and LLM calls.
+
+    Finished spans are written as Chrome trace events (load the file in
+    chrome://tracing or Perfetto) and/or streamed as JSON lines. Tracing is off
+    until configure() is called with at least one output file.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_file: Optional[str] = None
+        self._metrics: Optional[TextIO] = None
+        self._events: List[Dict[str, Any]] = []
+        self._thread_ids: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._origin_epoch = time.time()
+
+    def configure(self, trace_file: Optional[str] = None, metrics_file: Optional[str] = None) -> None:
+        self.close()
+        self.trace_file = trace_file
+        if metrics_file:
+            self._metrics = open(metrics_file, "a", buffering=1)
+        self._events = []
+        self._thread_ids = {}
+        self._origin = time.perf_counter()
+        self._origin_epoch = time.time()
+        self.enabled = bool(trace_file or metrics_file)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, category: str = "pipeline", **attributes: Any) -> Iterator[Any]:
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+
+        span = Span(name, category, attributes, _current_span.get())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def record_llm_call(self, span: Span, message: BaseMessage, model: str, cache_status: str) -> None:
+        """
+        Adds the model, token usage and cache status of an LLM response to its span
+        and to the counters of every enclosing span.
+        """
+        prompt_tokens, completion_tokens = token_usage(message)
+        span.set(
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cache=cache_status,
+        )
+        counters = {
+            "llm_calls": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cache_hits": 1 if cache_status == "hit" else 0,
+        }
+        with self._lock:
+            parent = span.parent
+            while parent is not None:
+                for counter in LLM_COUNTERS:
+                    parent.attributes[counter] = parent.attributes.get(counter, 0) + counters[counter]
+                parent = parent.parent
+
+    def _finish(self, span: Span) -> None:
+        end = time.perf_counter()
+        with self._lock:
+            thread_id = self._thread_ids.setdefault(span.thread_id, len(self._thread_ids) + 1)
+            if self.trace_file:
+                self._events.append(
+                    {
+                        "name": span.name,
+                        "cat": span.category,
+                        "ph": "X",
+                        "ts": (span.start - self._origin) * 1e6,
+                        "dur": (end - span.start) * 1e6,
+                        "pid": os.getpid(),
+                        "tid": thread_id,
+                        "args": dict(span.attributes),
+                    }
+                )
+            if self._metrics is not None:
+                record = {
+                    "timestamp": self._origin_epoch + (span.start - self._origin),
+                    "name": span.name,
+                    "category": span.category,
+                    "parent": span.parent.name if span.parent is not None else None,
+                    "duration_ms": (end - span.start) * 1e3,
+                    "thread": thread_id,
+                }
+                record.update(span.attributes)
+                self._metrics.write(json.dumps(record, default=str) + "\n")
+
+    def close(self) -> None:
+        """
+        Writes the Chrome trace file and closes the metrics stream.
+        """
+        with self._lock:
+            if self.trace_file:
+                with open(self.trace_file, "w") as file:
+                    json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, file)
+            if self._metrics is not None:
+                self._metrics.close()
+                self._metrics = None
+            self.enabled = False
+
+
+def token_usage(message: BaseMessage) -> Tuple[int, int]:
+    """
+    Returns the (prompt, completion) token counts reported for a response, or zeros.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class TracedChatModel:
+    """
+    Wraps a chat model so that every invoke() is recorded as an "llm" span.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any):
+        self.model = model
+
+    @property
+    def model_identifier(self) -> str:
+        return getattr(self.model, "model_identifier", None) or getattr(self.model, "model_name", None) or ""
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        if not tracer.enabled:
+            return self.model.invoke(prompt, **kwargs)
+
+        function_name = (kwargs.get("function_call") or {}).get("name", "completion")
+        with tracer.span(function_name, category="llm") as span:
+            if hasattr(self.model, "invoke_with_status"):
+                message, cache_status = self.model.invoke_with_status(prompt, **kwargs)
+            else:
+                message, cache_status = self.model.invoke(prompt, **kwargs), "disabled"
+            tracer.record_llm_call(span, message, self.model_identifier, cache_status)
+        return message
+
+    async def ainvoke(self, prompt: Any, **kwargs: Any) -> BaseMessage:
+        if not tracer.enabled:
+            return await self.model.ainvoke(prompt, **kwargs)
+
+        function_name = (kwargs.get("function_call") or {}).get("name", "completion")
+        with tracer.span(function_name, category="llm") as span:
+            if hasattr(self.model, "ainvoke_with_status"):
+                message, cache_status = await self.model.ainvoke_with_status(prompt, **kwargs)
+            else:
+                message, cache_status = await self.model.ainvoke(prompt, **kwargs), "disabled"
+            tracer.record_llm_call(span, message, self.model_identifier, cache_status)
+        return message
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+def traced(name: str, function: Callable[..., Any], category: str = "graph",
+           describe: Optional[Callable[[], Dict[str, Any]]] = None) -> Callable[..., Any]:
+    """
+    Wraps a sync or async function so each call runs in a span. describe() is
+    called when the function returns and its result is added to the span.
+    """
+    if asyncio.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def traced_coroutine(*args: Any, **kwargs: Any) -> Any:
+            with tracer.span(name, category=category) as span:
+                result = await function(*args, **kwargs)
+                if describe is not None and tracer.enabled:
+                    span.set(**describe())
+                return result
+
+        return traced_coroutine
+
+    @functools.wraps(function)
+    def traced_function(*args: Any, **kwargs: Any) -> Any:
+        with tracer.span(name, category=category) as span:
+            result = function(*args, **kwargs)
+            if describe is not None and tracer.enabled:
+                span.set(**describe())
+            return result
+
+    return traced_function
+
+
+tracer = Tracer()
@@ -0,0 +1,209 @@
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+HarUrl = Tuple[str, str, str, str]
+
+# Placeholders for path segments and query values whose shape marks them as identifiers
+SEGMENT_SHAPES = (
+    ("{uuid}", re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")),
+    ("{int}", re.compile(r"^\d+$")),
+    ("{hex}", re.compile(r"^(?=.*\d)[0-9a-fA-F]{8,}$")),
+    ("{token}", re.compile(r"^(?=.*\d)(?=.*[A-Za-z])[A-Za-z0-9_\-.~=+]{16,}$")),
+)
+
+# A path position whose siblings (same method, host and other segments) take at
+# least this many distinct values, most of them value-like, is treated as a parameter
+VARIABLE_SEGMENT_MIN = 4
+
+VARIABLE = "{var}"
+
+MAX_SAMPLES = 3
+
+
+def segment_shape(segment: str) -> str:
+    """
+    Returns the placeholder for an identifier-like segment, or the segment itself.
+    """
+    for placeholder, pattern in SEGMENT_SHAPES:
+        if pattern.match(segment):
+            return placeholder
+    return segment
+
+
+def looks_like_value(segment: str) -> bool:
+    """
+    Returns whether a path segment reads like data (a slug, a dated name, a long key)
+    rather than like an endpoint name such as "items" or "orders".
+    """
+    return len(segment) >= 12 or any(character.isdigit() or character in "-_.~" for character in segment)
+
+
+def _split(url: str) -> Tuple[str, List[str], List[Tuple[str, str]]]:
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split("/") if segment]
+    return (parts.hostname or "").lower(), segments, parse_qsl(parts.query, keep_blank_values=True)
+
+
+class UrlCluster:
+    """
+    HAR URLs that share a method and a URL template, such as GET app.example.com/api/items/{int}.
+    """
+
+    __slots__ = ("template", "method", "members", "samples")
+
+    def __init__(self, template: str, method: str):
+        self.template = template
+        self.method = method
+        self.members: List[HarUrl] = []
+        self.samples: List[HarUrl] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+    @property
+    def latest(self) -> HarUrl:
+        return self.members[-1]
+
+    def add(self, har_url: HarUrl) -> None:
+        self.members.append(har_url)
+        # Keep distinct URLs as samples, the first ones seen plus the latest
+        if all(sample[1] != har_url[1] for sample in self.samples):
+            if len(self.samples) < MAX_SAMPLES:
+                self.samples.append(har_url)
+            else:
+                self.samples[-1] = har_url
+
+    def as_har_url(self) -> Tuple:
+        """
+        Returns the entry shown to the LLM: the latest member, followed by the
+        template, call count and other sample URLs when the cluster has more than one member.
+        """
+        if self.count == 1:
+            return self.latest
+        summary = f"{self.count} calls to {self.template}"
+        other_samples = [sample[1] for sample in self.samples if sample[1] != self.latest[1]]
+        if other_samples:
+            summary += f", e.g. {', '.join(other_samples)}"
+        return self.latest + (summary,)
+
+    def __repr__(self) -> str:
+        return f"UrlCluster({self.template!r}, count={self.count})"
+
+
+class UrlClusterIndex:
+    """
+    Groups HAR URLs under inferred path and query templates.
+
+    Path segments shaped like identifiers (numbers, UUIDs, hex strings, opaque
+    tokens) become placeholders. Positions that take many distinct, value-like
+    values among otherwise identical URLs become {var}. Query values are generalized the same
+    way, and query keys are sorted.
+    """
+
+    def __init__(self, har_urls: Sequence[HarUrl]):
+        self.har_urls = list(har_urls)
+        self.variable_positions: Dict[Tuple[str, str, int, Tuple[str, ...]], Set[int]] = defaultdict(set)
+        self._infer_variable_positions()
+
+        self.captured_urls: Set[str] = {har_url[1] for har_url in self.har_urls}
+        self.clusters: List[UrlCluster] = []
+        self.by_template: Dict[str, UrlCluster] = {}
+        self.template_by_url: Dict[Tuple[str, str], str] = {}
+        for har_url in self.har_urls:
+            template = self.template(har_url[0], har_url[1])
+            cluster = self.by_template.get(template)
+            if cluster is None:
+                cluster = UrlCluster(template, har_url[0])
+                self.by_template[template] = cluster
+                self.clusters.append(cluster)
+            cluster.add(har_url)
+
+    def _infer_variable_positions(self) -> None:
+        siblings: Dict[Tuple[str, str, int, int, Tuple[str, ...]], Set[str]] = defaultdict(set)
+        for method, url, _, _ in self.har_urls:
+            host, segments, _ = _split(url)
+            shaped = [segment_shape(segment) for segment in segments]
+            for position, segment in enumerate(shaped):
+                if segment.startswith("{"):
+                    continue
+                others = tuple(shaped[:position] + shaped[position + 1:])
+                siblings[(method.upper(), host, len(shaped), position, others)].add(segment)
+
+        for (method, host, length, position, others), values in siblings.items():
+            if len(values) >= VARIABLE_SEGMENT_MIN and 2 * sum(map(looks_like_value, values)) >= len(values):
+                self.variable_positions[(method, host, length, others)].add(position)
+
+    def template(self, method: str, url: str) -> str:
+        """
+        Returns the template of a URL, e.g. "GET app.example.com/api/items/{int}?page={int}".
+        """
+        key = (method, url)
+        template = self.template_by_url.get(key)
+        if template is not None:
+            return template
+
+        host, segments, query = _split(url)
+        shaped = [segment_shape(segment) for segment in segments]
+        for position, segment in enumerate(shaped):
+            if segment.startswith("{"):
+                continue
+            others = tuple(shaped[:position] + shaped[position + 1:])
+            if position in self.variable_positions.get((method.upper(), host, len(shaped), others), ()):
+                shaped[position] = VARIABLE
+
+        template = f"{method.upper()} {host}/{'/'.join(shaped)}"
+        if query:
+            query_template = "&".join(sorted(f"{name}={segment_shape(value) if value else ''}" for name, value in query))
+            template += f"?{query_template}"
+
+        self.template_by_url[key] = template
+        return template
+
+    def cluster_of(self, method: str, url: str) -> Optional[UrlCluster]:
+        return self.by_template.get(self.template(method, url))
+
+    def resolve(self, url: str) -> Optional[str]:
+        """
+        Maps a URL or template returned by the LLM to a captured URL: the URL itself
+        if it was captured, otherwise the latest member of the matching cluster.
+        """
+        if url in self.captured_urls:
+            return url
+        for cluster in self.clusters:
+            if cluster.template.split(" ", 1)[-1] == url:
+                return cluster.latest[1]
+        for cluster in self.clusters:
+            if cluster.template == self.template(cluster.method, url):
+                return cluster.latest[1]
+        return None
+
+    def prompt_entries(self) -> List[Tuple]:
+        return [cluster.as_har_url() for cluster in self.clusters]
+
+
+def related_response_texts(
+    url_clusters: UrlClusterIndex,
+    req_to_res_map: Mapping[Any, Mapping[str, Any]],
+    url_to_req_res_map: Mapping[str, Mapping[str, Any]],
+    request: Any,
+    limit: int = 5,
+) -> List[str]:
+    """
+    Returns the bodies of up to limit other captured calls to the request's URL
+    template, used to check that generated extractors are not tied to one response.
+    """
+    cluster = url_clusters.cluster_of(request.method, request.url)
+    if cluster is None:
+        return []
+    own_text = (req_to_res_map.get(request) or {}).get("text") or ""
+    texts: List[str] = []
+    for har_url in reversed(cluster.members):
+        text = (url_to_req_res_map.get(har_url[1], {}).get("response") or {}).get("text") or ""
+        if text and text != own_text and text not in texts:
+            texts.append(text)
+            if len(texts) == limit:
+                break
+    return texts
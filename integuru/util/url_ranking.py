@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# Splits identifiers such as getMonthlyReport, monthly_report or monthly-report into words
+WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+STOP_WORDS = frozenset(
+    (
+        "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in", "is", "it",
+        "me", "my", "of", "on", "or", "that", "the", "this", "to", "want", "with", "www", "com",
+        "http", "https",
+    )
+)
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def normalize_word(word: str) -> str:
+    """
+    Lower-cases a word and strips a plural suffix so that "bills" matches "bill".
+    """
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def text_terms(text: str) -> List[str]:
+    """
+    Returns the search terms of free text, such as the user's prompt.
+    """
+    terms = []
+    for word in WORD_PATTERN.findall(text or ""):
+        if word.isdigit() or len(word) < 2:
+            continue
+        term = normalize_word(word)
+        if term not in STOP_WORDS:
+            terms.append(term)
+    return terms
+
+
+def har_url_terms(har_url: Tuple[str, ...]) -> List[str]:
+    """
+    Returns the search terms of a (method, URL, response format, response preview) tuple:
+    host labels, path segments, query keys, the mime type and the response preview.
+    Anything after the response preview (such as a cluster summary) is ignored.
+    """
+    method, url, response_format, response_preview = har_url[:4]
+    parts = urlsplit(url)
+    query_keys = " ".join(key for key, _ in parse_qsl(parts.query, keep_blank_values=True))
+    return text_terms(
+        " ".join((method, parts.hostname or "", parts.path, query_keys, response_format or "", response_preview or ""))
+    )
+
+
+class UrlRanker:
+    """
+    BM25 index over the URLs shown to the LLM, used to shortlist the ones most
+    relevant to the user's prompt before asking the model to pick the action URL.
+    """
+
+    def __init__(self, har_urls: Sequence[Tuple[str, ...]]):
+        self.har_urls = list(har_urls)
+        self.term_frequencies: List[Counter] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+
+        for position, har_url in enumerate(self.har_urls):
+            terms = har_url_terms(har_url)
+            frequencies = Counter(terms)
+            self.term_frequencies.append(frequencies)
+            self.lengths.append(len(terms))
+            for term in frequencies:
+                self.postings.setdefault(term, []).append(position)
+
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        document_frequency = len(self.postings.get(term, ()))
+        count = len(self.har_urls)
+        return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """
+        Returns the BM25 score of every URL that shares at least one term with the query.
+        """
+        scores: Dict[int, float] = {}
+        for term in set(text_terms(query)):
+            positions = self.postings.get(term)
+            if not positions:
+                continue
+            idf = self.idf(term)
+            for position in positions:
+                frequency = self.term_frequencies[position][term]
+                normalization = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / (self.average_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + normalization)
+        return scores
+
+    def rank(self, query: str) -> List[int]:
+        """
+        Returns the positions of all URLs, best match first. URLs that do not
+        match the query at all follow in capture order, latest first, since the
+        action usually happens near the end of a capture.
+        """
+        scores = self.scores(query)
+        matched = sorted(scores, key=lambda position: (-scores[position], position))
+        unmatched = [position for position in reversed(range(len(self.har_urls))) if position not in scores]
+        return matched + unmatched
+
+    def shortlist(self, query: str, k: int) -> List[Tuple[str, ...]]:
+        """
+        Returns the k best matching URLs in their original capture order.
+        """
+        positions = sorted(self.rank(query)[:k])
+        return [self.har_urls[position] for position in positions]
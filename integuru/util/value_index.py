@@ -0,0 +1,160 @@
+import base64
+import json
+import re
+from urllib.parse import quote
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Any
+
+from integuru.models.request import Request
+from integuru.util.response_store import search_response
+
+# Characters that separate values in JSON, HTML, JS, headers and URLs.
+# Everything else (letters, digits, "-", "_", ".", "~", "+", "%") is kept
+# inside a token so that IDs, JWTs and base64 strings stay in one piece.
+TOKEN_SPLIT_PATTERN = re.compile(r"[^\s\"'<>(){}\[\],;:=&?/\\|`!*#@$^]+")
+
+# Values shorter than this are too common to be worth indexing and are
+# answered with a linear scan instead.
+MIN_TOKEN_LENGTH = 4
+
+# When bodies not matched through the index are scanned for a value: only when
+# the index matched nothing, always (the exact substring semantics of a plain
+# scan), or never
+SUBSTRING_SCAN_MODES = ("miss", "always", "never")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into the tokens used by the value index.
+    """
+    return TOKEN_SPLIT_PATTERN.findall(text)
+
+
+def encoded_variants(value: str) -> List[str]:
+    """
+    Returns the value together with the encodings it commonly takes inside
+    response bodies: URL-encoded, JSON-escaped and base64.
+    """
+    variants = [value]
+
+    url_encoded = quote(value, safe="")
+    variants.append(url_encoded)
+
+    json_escaped = json.dumps(value)[1:-1]
+    variants.append(json_escaped)
+    variants.append(json_escaped.replace("/", "\\/"))
+
+    raw = value.encode("utf-8")
+    variants.append(base64.b64encode(raw).decode("ascii").rstrip("="))
+    variants.append(base64.urlsafe_b64encode(raw).decode("ascii").rstrip("="))
+
+    # Keep the original order but drop duplicates and empty strings
+    return [variant for variant in dict.fromkeys(variants) if variant]
+
+
+class ValueIndex:
+    """
+    Inverted index from lower-cased response-body tokens to the requests that
+    produced them.
+
+    Built once per HAR so that looking up which responses contain a dynamic
+    value costs roughly O(matches) instead of a scan over every body. Prebuilt
+    postings (e.g. from a HarIndex) can be passed in to skip the build.
+
+    The index only finds a value where it starts and ends on token boundaries
+    (or its inner tokens are whole tokens). Bodies that contain it inside a
+    larger token are found by scanning the bodies the index did not match, as
+    substring_scan says: "miss" scans only when the index matched nothing, so a
+    value found on token boundaries somewhere is not looked for inside larger
+    tokens elsewhere; "always" scans on every lookup and returns exactly the
+    bodies a plain substring search would; "never" does not scan. Bodies kept
+    in a ResponseStore are searched in place, folding the case of ASCII only.
+    """
+
+    def __init__(self, req_to_res_map: Dict[Request, Dict[str, Any]],
+                 postings: Optional[Mapping[str, List[int]]] = None,
+                 substring_scan: str = "miss"):
+        if substring_scan not in SUBSTRING_SCAN_MODES:
+            raise ValueError(f"substring_scan must be one of {SUBSTRING_SCAN_MODES}, got {substring_scan!r}")
+        self.substring_scan: str = substring_scan
+        self.requests: List[Request] = list(req_to_res_map.keys())
+        self.responses: List[Dict[str, Any]] = list(req_to_res_map.values())
+        self.positions: Dict[Request, int] = {request: position for position, request in enumerate(self.requests)}
+        if postings is not None:
+            self.postings: Mapping[str, List[int]] = postings
+            return
+
+        self.postings = {}
+        for position, response in enumerate(self.responses):
+            text = response.get("text") or ""
+            for token in set(tokenize(text.lower())):
+                if len(token) >= MIN_TOKEN_LENGTH:
+                    self.postings.setdefault(token, []).append(position)
+
+    def _body_contains(self, position: int, needles: Tuple[str, ...]) -> bool:
+        # Searched case-insensitively for all needles at once, in place for bodies in a ResponseStore
+        return search_response(self.responses[position], needles, ignore_case=True) is not None
+
+    def _candidate_positions(self, needle: str) -> Optional[Set[int]]:
+        """
+        Returns the positions whose bodies may contain the lower-cased needle,
+        or None when the index cannot narrow the search down.
+        """
+        tokens = tokenize(needle)
+        if not tokens:
+            return None
+
+        # Strict: every token of the needle is a whole token in the body
+        strict = [token for token in tokens if len(token) >= MIN_TOKEN_LENGTH]
+        if len(strict) == len(tokens):
+            candidates = self._intersect(strict)
+            if candidates:
+                return candidates
+
+        # Relaxed: the first and last tokens may be cut off by the match
+        # boundaries, but the ones in between must be whole tokens
+        interior = [token for token in tokens[1:-1] if len(token) >= MIN_TOKEN_LENGTH]
+        if interior:
+            return self._intersect(interior)
+
+        return None
+
+    def _intersect(self, tokens: Iterable[str]) -> Set[int]:
+        candidates: Optional[Set[int]] = None
+        for token in sorted(tokens, key=lambda token: len(self.postings.get(token, ()))):
+            positions = self.postings.get(token)
+            if not positions:
+                return set()
+            candidates = set(positions) if candidates is None else candidates & set(positions)
+            if not candidates:
+                return candidates
+        return candidates or set()
+
+    def find_positions(self, value: str, substring_scan: Optional[str] = None) -> List[int]:
+        """
+        Returns the capture positions of responses containing the value or one
+        of its encoded variants, case-insensitively. substring_scan overrides
+        the index's mode for this lookup.
+        """
+        substring_scan = substring_scan or self.substring_scan
+        needles = tuple(variant.lower() for variant in encoded_variants(value))
+
+        candidates: Set[int] = set()
+        for needle in needles:
+            candidates.update(self._candidate_positions(needle) or ())
+        # Each body is searched once, for every variant at the same time
+        matches = {position for position in candidates if self._body_contains(position, needles)}
+
+        if substring_scan == "always" or (substring_scan == "miss" and not matches):
+            # Values that only appear inside larger tokens are not in the index
+            matches.update(
+                position for position in range(len(self.responses))
+                if position not in candidates and self._body_contains(position, needles)
+            )
+
+        return sorted(matches)
+
+    def find_requests(self, value: str) -> List[Request]:
+        """
+        Returns the requests whose responses contain the value, in capture order.
+        """
+        return [self.requests[position] for position in self.find_positions(value)]
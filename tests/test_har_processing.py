@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+from integuru.util.har_processing import iter_har_entries
+
+
+def entry(index, text="ok"):
+    return {
+        "request": {"method": "GET", "url": f"https://app.example.com/api/items/{index}", "headers": []},
+        "response": {"status": 200, "content": {"mimeType": "application/json", "text": text}},
+    }
+
+
+ENTRIES = [
+    entry(0),
+    # Quotes, braces, brackets and separators inside strings must not end an entry
+    entry(1, '{"say": "he said \\"hi\\"", "close": "}]", "open": "{[", "comma": ",:"}'),
+    entry(2, "back\\slash \\\\\" and unicode é中 😀"),
+    entry(3, "x" * 5000),
+]
+
+
+def write_har(path, document, opener=open):
+    with opener(path, "wt", encoding="utf-8") as file:
+        file.write(json.dumps(document))
+    return str(path)
+
+
+def expected_entries(path, opener=open):
+    with opener(path, "rt", encoding="utf-8") as file:
+        return json.load(file)["log"]["entries"]
+
+
+@pytest.mark.parametrize(
+    "log",
+    [
+        {"entries": ENTRIES},
+        {"version": "1.2", "creator": {"name": "entries", "version": "[{"}, "pages": [{"id": "p", "entries": []}], "entries": ENTRIES},
+        {"entries": ENTRIES, "version": "1.2", "pages": [{"title": "\"entries\": ["}]},
+    ],
+    ids=["only_entries", "entries_last", "entries_first"],
+)
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 20])
+def test_yields_the_entries_json_load_returns(tmp_path, log, chunk_size):
+    path = write_har(tmp_path / "capture.har", {"comment": {"log": {"entries": [1]}}, "log": log})
+
+    assert list(iter_har_entries(path, chunk_size=chunk_size)) == expected_entries(path)
+
+
+def test_pretty_printed_har(tmp_path):
+    path = tmp_path / "capture.har"
+    path.write_text(json.dumps({"log": {"version": "1.2", "entries": ENTRIES}}, indent=2), encoding="utf-8")
+
+    assert list(iter_har_entries(str(path), chunk_size=16)) == expected_entries(path)
+
+
+@pytest.mark.parametrize("chunk_size", [5, 1 << 20])
+def test_empty_entries(tmp_path, chunk_size):
+    path = write_har(tmp_path / "capture.har", {"log": {"version": "1.2", "entries": [], "pages": []}})
+
+    assert list(iter_har_entries(path, chunk_size=chunk_size)) == []
+
+
+def test_missing_entries(tmp_path):
+    path = write_har(tmp_path / "capture.har", {"log": {"version": "1.2", "pages": [{"entries": [entry(0)]}]}})
+
+    assert list(iter_har_entries(path)) == []
+
+
+def test_gzip(tmp_path):
+    path = write_har(tmp_path / "capture.har.gz", {"log": {"version": "1.2", "entries": ENTRIES}}, opener=gzip.open)
+
+    assert list(iter_har_entries(path, chunk_size=32)) == expected_entries(path, opener=gzip.open)
+
+
+def test_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "capture.har.zst"
+    document = {"log": {"version": "1.2", "entries": ENTRIES}}
+    path.write_bytes(zstandard.ZstdCompressor().compress(json.dumps(document).encode("utf-8")))
+
+    assert list(iter_har_entries(str(path), chunk_size=32)) == document["log"]["entries"]
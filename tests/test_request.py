@@ -0,0 +1,77 @@
+import pickle
+
+import pytest
+
+from integuru.models.request import Request
+
+
+def test_param_order_and_headers_do_not_change_the_fingerprint():
+    first = Request("GET", "https://App.example.com:443/api/items?b=2&a=1", {"Authorization": "Bearer one"})
+    second = Request("get", "https://app.example.com/api/items?a=1&b=2", {"User-Agent": "other"})
+
+    assert first.fingerprint == second.fingerprint
+    assert first == second
+    assert hash(first) == hash(second)
+    assert len({first: 1, second: 2}) == 1
+
+
+def test_query_params_without_a_query_string():
+    first = Request("GET", "https://app.example.com/api/items", {}, query_params={"b": "2", "a": "1"})
+    second = Request("GET", "https://app.example.com/api/items?a=1&b=2", {})
+
+    assert first == second
+
+
+@pytest.mark.parametrize(
+    "first_body, second_body",
+    [
+        ({"query": "{ a }"}, {"query": "{ b }"}),
+        ("a=1", "a=2"),
+        (None, ""),
+    ],
+)
+def test_body_changes_the_fingerprint(first_body, second_body):
+    first = Request("POST", "https://app.example.com/graphql", {}, body=first_body)
+    second = Request("POST", "https://app.example.com/graphql", {}, body=second_body)
+
+    assert first.fingerprint != second.fingerprint
+    assert first != second
+
+
+def test_json_body_key_order_does_not_change_the_fingerprint():
+    first = Request("POST", "https://app.example.com/graphql", {}, body={"a": 1, "b": 2})
+    second = Request("POST", "https://app.example.com/graphql", {}, body={"b": 2, "a": 1})
+
+    assert first == second
+
+
+def test_immutable():
+    request = Request("GET", "https://app.example.com/api", {"Accept": "*/*"}, query_params={"a": "1"})
+
+    with pytest.raises(AttributeError):
+        request.url = "https://other.example.com"
+    with pytest.raises(AttributeError):
+        del request.method
+    with pytest.raises(TypeError):
+        request.headers["Accept"] = "text/html"
+    with pytest.raises(TypeError):
+        request.query_params["a"] = "2"
+
+
+def test_pickle_round_trip_keeps_equality():
+    request = Request(
+        "POST",
+        "https://app.example.com/api?x=1",
+        {"Content-Type": "application/json"},
+        query_params={"x": "1"},
+        body={"id": 7},
+    )
+    request.to_curl_command()
+
+    restored = pickle.loads(pickle.dumps(request))
+
+    assert restored == request
+    assert hash(restored) == hash(request)
+    assert {request: "node"}[restored] == "node"
+    assert restored.to_curl_command() == request.to_curl_command()
+    assert dict(restored.headers) == dict(request.headers)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from integuru.runtime import PlanRunner
+
+ORIGIN = "https://app.example.com"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    A login endpoint returning a token and a bills endpoint that requires it.
+    """
+
+    logins = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path != "/api/login" or body != {"username": "user"}:
+            return self._send(404, {})
+        Handler.logins += 1
+        self._send(200, {"data": {"token": "live-token"}})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/api/bills":
+            return self._send(404, {})
+        if self.headers.get("Authorization") != "Bearer live-token" or self.headers.get("Cookie") != "sessionid=abc":
+            return self._send(403, {})
+        year = parse_qs(url.query)["year"][0]
+        self._send(200, {"year": year, "bills": [f"{year}-01"]})
+
+
+@pytest.fixture
+def server_origin():
+    Handler.logins = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def plan():
+    return {
+        "version": 2,
+        "input_variables": {"year": "2023"},
+        "result": "get_api_bills",
+        "steps": [
+            {
+                "id": "post_api_login",
+                "type": "request",
+                "depends_on": [],
+                "request": {
+                    "method": "POST",
+                    "url": f"{ORIGIN}/api/login",
+                    "headers": {"Content-Type": "application/json"},
+                    "json": {"username": "user"},
+                },
+                "bindings": {},
+                "extract": [{"name": "token", "json_path": ["data", "token"]}],
+            },
+            {
+                "id": "get_api_bills",
+                "type": "request",
+                "depends_on": ["post_api_login"],
+                "request": {
+                    "method": "GET",
+                    "url": f"{ORIGIN}/api/bills?year={{{{year}}}}",
+                    "headers": {"Authorization": "Bearer {{token}}"},
+                },
+                "bindings": {"token": {"step": "post_api_login"}, "year": {"input": "year"}},
+                "extract": [],
+                "output": {"type": "json"},
+            },
+        ],
+        "unsupported": [],
+    }
+
+
+def runner(plan, origin):
+    return PlanRunner(plan, cookie_string="sessionid=abc", origins={ORIGIN: origin})
+
+
+def test_run(plan, server_origin):
+    assert runner(plan, server_origin).run() == {"year": "2023", "bills": ["2023-01"]}
+    assert runner(plan, server_origin).run({"year": "2024"}) == {"year": "2024", "bills": ["2024-01"]}
+
+
+def test_run_many_logs_in_once(plan, server_origin):
+    results = runner(plan, server_origin).run_many([{"year": "2022"}, {"year": "2024"}])
+
+    assert results == [
+        {"inputs": {"year": "2022"}, "result": {"year": "2022", "bills": ["2022-01"]}},
+        {"inputs": {"year": "2024"}, "result": {"year": "2024", "bills": ["2024-01"]}},
+    ]
+    assert Handler.logins == 1
+
+
+def test_arun_many_logs_in_once(plan, server_origin):
+    results = asyncio.run(runner(plan, server_origin).arun_many([{"year": "2022"}, {"year": "2024"}]))
+
+    assert [result["result"]["year"] for result in results] == ["2022", "2024"]
+    assert Handler.logins == 1
+
+
+def test_run_many_reports_failed_inputs(plan, server_origin):
+    plan["steps"][1]["request"]["headers"]["Authorization"] = "Bearer {{token}}x"
+
+    results = runner(plan, server_origin).run_many([{"year": "2022"}])
+
+    assert "returned 403" in results[0]["error"]
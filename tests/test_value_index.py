@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from integuru.util.har_processing import load_har
+from integuru.util.response_store import ResponseStore
+from integuru.util.value_index import ValueIndex, encoded_variants
+
+BODIES = [
+    ("application/json", json.dumps({"token": "abc123token456", "user": "u-1001"})),
+    ("application/json", json.dumps({"header": "Bearer abc123token456xyz"})),
+    ("text/html", '<a href="/login?next=https%3A%2F%2Fapp.example.com%2Fcb%3Fid%3Du-1001">Sign in</a>'),
+    ("application/json", '{"path": "\\/files\\/report-2024.pdf", "size": 1024}'),
+    ("text/plain", "session=SeSsIoN9876 expires soon"),
+    ("application/javascript", "var cached='prefixabc123token456';"),
+    ("application/json", json.dumps({"items": [], "page": 1})),
+]
+
+# Responses each lookup returns when bodies are only scanned if the index
+# matches nothing ("miss") or never scanned ("never")
+CASES = {
+    # A whole token in one body and inside larger tokens in two others
+    "abc123token456": {"miss": [0], "never": [0]},
+    # Inside the URL-encoded token of body 2
+    "u-1001": {"miss": [0], "never": [0]},
+    # URL-encoded in body 2
+    "https://app.example.com/cb?id=u-1001": {"miss": [2], "never": [2]},
+    # JSON-escaped in body 3
+    "/files/report-2024.pdf": {"miss": [3], "never": [3]},
+    # Different case
+    "sEssIon9876": {"miss": [4], "never": [4]},
+    # Only inside a larger token
+    "123token": {"miss": [0, 1, 5], "never": []},
+    "zzz-not-there": {"miss": [], "never": []},
+}
+
+
+def write_har(path):
+    entries = [
+        {
+            "request": {"method": "GET", "url": f"https://app.example.com/api/{index}", "headers": []},
+            "response": {"status": 200, "headers": [], "content": {"mimeType": mime_type, "text": text}},
+        }
+        for index, (mime_type, text) in enumerate(BODIES)
+    ]
+    path.write_text(json.dumps({"log": {"version": "1.2", "entries": entries}}), encoding="utf-8")
+    return str(path)
+
+
+def baseline_scan(req_to_res_map, value):
+    """
+    The linear scan the index replaced: every body containing the value, case-insensitively.
+    """
+    return [request for request, response in req_to_res_map.items() if value.lower() in response["text"].lower()]
+
+
+def encoded_scan(req_to_res_map, value):
+    """
+    The linear scan extended to the encoded variants the index looks for.
+    """
+    needles = [variant.lower() for variant in encoded_variants(value)]
+    return [
+        request
+        for request, response in req_to_res_map.items()
+        if any(needle in response["text"].lower() for needle in needles)
+    ]
+
+
+@pytest.fixture(params=["memory", "spilled"])
+def req_to_res_map(request, tmp_path):
+    response_store = ResponseStore(spill_threshold=0) if request.param == "spilled" else None
+    yield load_har(write_har(tmp_path / "capture.har"), response_store=response_store).req_to_res_map
+    if response_store is not None:
+        response_store.close()
+
+
+@pytest.mark.parametrize("value", CASES)
+def test_always_matches_the_linear_scan(req_to_res_map, value):
+    found = ValueIndex(req_to_res_map, substring_scan="always").find_requests(value)
+
+    assert found == encoded_scan(req_to_res_map, value)
+    assert set(baseline_scan(req_to_res_map, value)) <= set(found)
+
+
+@pytest.mark.parametrize("substring_scan", ["miss", "never"])
+@pytest.mark.parametrize("value", CASES)
+def test_miss_and_never(req_to_res_map, value, substring_scan):
+    requests = list(req_to_res_map)
+    found = ValueIndex(req_to_res_map, substring_scan=substring_scan).find_requests(value)
+
+    assert found == [requests[position] for position in CASES[value][substring_scan]]
+    # Both only drop bodies where the value is inside a larger token
+    assert set(found) <= set(encoded_scan(req_to_res_map, value))
+
+
+def test_lookup_mode_overrides_the_index_mode(req_to_res_map):
+    value_index = ValueIndex(req_to_res_map, substring_scan="never")
+
+    assert value_index.find_positions("123token") == []
+    assert value_index.find_positions("123token", substring_scan="always") == [0, 1, 5]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ValueIndex({}, substring_scan="sometimes")